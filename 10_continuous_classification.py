@@ -1,5 +1,5 @@
-import os, time, json, csv, math, tempfile, shutil
-from collections import deque, defaultdict
+import os, time, json, csv, tempfile
+from collections import deque
 
 import cv2
 import numpy as np
@@ -8,6 +8,12 @@ import joblib
 from datetime import datetime
 import mediapipe as mp
 
+from hud import Hud
+from event_logic import EventEngine, EventParams, write_stream_header, append_stream_row
+from event_store import EventStore
+from clip_capture import ClipRecorder
+from pose_features import align_features, compute_features, interpolate_nans, normalize_per_frame
+
 # ---------- CONFIG ----------
 WINDOW_SEC      = 2.0          # sliding window size
 STEP_SEC        = 0.20         # how often to run classification
@@ -16,18 +22,33 @@ MIN_VIS         = 0.5
 
 ON_THRESH       = 0.60         # probability to consider a gesture "on"
 OFF_THRESH      = 0.55         # below this we consider it "off" (hysteresis)
+HYSTERESIS      = False        # True: reset the "on" timer below OFF_THRESH instead of ON_THRESH
 MIN_EVENT_SEC   = 0.40         # must persist above ON_THRESH this long to emit an event
 COOLDOWN_SEC    = 0.60         # ignore same label again for this long after an event
 
 CAM_INDEX       = 4            # 4 is the coachbot computer index 6 is my laptop index 
 FRAME_SIZE      = (640, 480)   # width, height
 POSE_DRAW       = True
+HEADLESS        = os.environ.get("HEADLESS", "0") == "1"   # HEADLESS=1: no drawing, no window
+HUD_REDRAW_EPS  = 0.01         # only re-render HUD bars when ema moves more than this
 
 SESSION_TS      = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 OUT_DIR         = os.path.join("live_stream_logs", SESSION_TS)
 os.makedirs(OUT_DIR, exist_ok=True)
 EVENT_CSV       = os.path.join(OUT_DIR, "events.csv")
 RAW_MP4         = os.path.join(OUT_DIR, "raw.mp4")
+PROBS_CSV       = os.path.join(OUT_DIR, "probs.csv")   # raw per-step probabilities, for sweep_events.py
+RECORD_PROBS    = os.environ.get("RECORD_PROBS", "0") == "1"  # RECORD_PROBS=1: keep classifying (record only) during the pause so replays see every step
+
+# recording: the continuous raw.mp4 and/or a short clip around every event (clip_capture.py)
+RECORD_RAW      = os.environ.get("RECORD_RAW", "1") == "1"    # RECORD_RAW=0: no raw.mp4 at all
+RAW_EVERY       = int(os.environ.get("RAW_EVERY", "1"))        # raw.mp4 keeps every Nth frame (FPS_TARGET/N fps)
+RAW_SCALE       = float(os.environ.get("RAW_SCALE", "1.0"))    # raw.mp4 frame size factor, e.g. 0.5
+CLIPS           = os.environ.get("CLIPS", "0") == "1"          # CLIPS=1: <session>/clips/<label>_<t_start>-<t_end>.mp4
+PRE_ROLL_SEC    = 5.0          # clip starts this long before the event is emitted ...
+POST_ROLL_SEC   = 3.0          # ... and runs this long after
+CLIP_JPEG       = None         # e.g. 85: ring keeps frames as JPEG (~30x less memory, ~2 ms/frame in the loop)
+CLIP_DIR        = os.path.join(OUT_DIR, "clips")
 
 
 # map pose label -> (mode, extras)
@@ -43,6 +64,10 @@ label_to_mode = {
 }
 
 PAUSE_AFTER_EVENT_SEC = 15.0   # <—  “don’t look for poses” window
+EMA_ALPHA = 0.4  # smoothing factor (0..1)
+
+HINT_THRESH      = 0.45        # publish a "likely next mode" hint once the top EMA passes this
+HINT_REFRESH_SEC = 1.0         # re-publish an unchanged hint at most this often (keeps it fresh)
 
 # ---------- MODEL LOAD ----------
 THIS_DIR   = os.path.abspath(os.path.dirname(__file__))
@@ -51,104 +76,10 @@ clf = joblib.load(MODEL_PATH)
 print("Loaded model:", MODEL_PATH)
 print("Classes:", list(clf.classes_))
 
-# ---------- FEATURE EXTRACTOR (must match training) ----------
-I = {
-    "left_shoulder":11, "right_shoulder":12,
-    "left_wrist":15, "right_wrist":16,
-    "left_hip":23, "right_hip":24,
-    "left_ankle":27, "right_ankle":28
-}
-RANGE_LMS = {"left_wrist":15,"right_wrist":16,"left_ankle":27,"right_ankle":28}
-
-def normalize_per_frame(A):
-    out = A.copy()
-    for t in range(out.shape[0]):
-        lhip = out[t, I["left_hip"]*3:I["left_hip"]*3+3]
-        rhip = out[t, I["right_hip"]*3:I["right_hip"]*3+3]
-        center = (lhip + rhip) / 2.0
-        scale = np.linalg.norm(lhip - rhip) or 1.0
-        for j in range(33):
-            s = j*3; e = s+3
-            out[t, s:e] = (out[t, s:e] - center) / scale
-    return out
-
-def joint_xy(A, idx):
-    return A[:, idx*3+0], A[:, idx*3+1]
-
-def start_end_xy(A, idx):
-    x, y = joint_xy(A, idx)
-    return x[0], y[0], x[-1], y[-1]
-
-def path_len(A, idx):
-    x, y = joint_xy(A, idx)
-    return float(np.sum(np.sqrt(np.diff(x)**2 + np.diff(y)**2)))
-
-def straightness(A, idx):
-    x0, y0, x1, y1 = start_end_xy(A, idx)
-    L = path_len(A, idx) + 1e-9
-    return float(np.hypot(x1 - x0, y1 - y0) / L)
-
-def compute_features(positions, dt):
-    # positions shape: (T, 99) after interpolation and normalization
-    vel  = np.gradient(positions, dt, axis=0)
-    acc  = np.gradient(vel,       dt, axis=0)
-    jerk = np.gradient(acc,       dt, axis=0)
-    vel_mag  = np.linalg.norm(vel,  axis=1)
-    acc_mag  = np.linalg.norm(acc,  axis=1)
-    jerk_mag = np.linalg.norm(jerk, axis=1)
-
-    feat = {
-        "mean_velocity": float(np.mean(vel_mag)),
-        "max_velocity":  float(np.max(vel_mag)),
-        "std_velocity":  float(np.std(vel_mag)),
-        "mean_acceleration": float(np.mean(acc_mag)),
-        "max_acceleration":  float(np.max(acc_mag)),
-        "std_acceleration":  float(np.std(acc_mag)),
-        "mean_jerk": float(np.mean(jerk_mag)),
-        "max_jerk":  float(np.max(jerk_mag)),
-        "std_jerk":  float(np.std(jerk_mag)),
-    }
-    for name, idx in RANGE_LMS.items():
-        x_vals = positions[:, idx*3+0]
-        y_vals = positions[:, idx*3+1]
-        feat[f"range_x_{name}"] = float(np.ptp(x_vals))
-        feat[f"range_y_{name}"] = float(np.ptp(y_vals))
-
-    # body reference levels
-    LSh_y = float(np.mean(positions[:, I["left_shoulder"]*3+1]))
-    RSh_y = float(np.mean(positions[:, I["right_shoulder"]*3+1]))
-    shoulder_y = 0.5*(LSh_y + RSh_y)
-    LH_y = float(np.mean(positions[:, I["left_hip"]*3+1]))
-    RH_y = float(np.mean(positions[:, I["right_hip"]*3+1]))
-    hip_y = 0.5*(LH_y + RH_y)
-    def rel_levels(y): return float(y - shoulder_y), float(y - hip_y)
-
-    for tag, jidx in [("lw", I["left_wrist"]), ("rw", I["right_wrist"]),
-                      ("la", I["left_ankle"]), ("ra", I["right_ankle"])]:
-        x0, y0, x1, y1 = start_end_xy(positions, jidx)
-        dx, dy = (x1 - x0), (y1 - y0)
-        y0_sh, y0_hip = rel_levels(y0)
-        y1_sh, y1_hip = rel_levels(y1)
-        L = path_len(positions, jidx)
-        St = straightness(positions, jidx)
-        feat[f"{tag}_x0"] = x0;  feat[f"{tag}_y0"] = y0
-        feat[f"{tag}_x1"] = x1;  feat[f"{tag}_y1"] = y1
-        feat[f"{tag}_dx"] = dx;  feat[f"{tag}_dy"] = dy
-        feat[f"{tag}_y0_minus_sh"]  = y0_sh
-        feat[f"{tag}_y0_minus_hip"] = y0_hip
-        feat[f"{tag}_y1_minus_sh"]  = y1_sh
-        feat[f"{tag}_y1_minus_hip"] = y1_hip
-        feat[f"{tag}_path_len"]     = L
-        feat[f"{tag}_straight"]     = St
-
-    feat["wrist_y_diff_start"] = float(positions[0, I["right_wrist"]*3+1] - positions[0, I["left_wrist"]*3+1])
-    feat["wrist_y_diff_end"]   = float(positions[-1, I["right_wrist"]*3+1] - positions[-1, I["left_wrist"]*3+1])
-    return feat
-
 # align to model columns
 MODEL_COLS = list(getattr(clf, "feature_names_in_", []))
 
-def write_debug_json(*, label, true_label, feat, X_df, session_folder, raw_video_path):
+def write_debug_json(*, label, true_label, feat, X_df, session_folder, raw_video_path, clip_path=None):
     """Writes prediction.json in the session folder using your structure."""
     ts = datetime.now().isoformat(timespec="seconds")
     mapped_mode, mapped_extras = label_to_mode.get(label, ("unknown", {}))
@@ -161,6 +92,7 @@ def write_debug_json(*, label, true_label, feat, X_df, session_folder, raw_video
         "timestamp": ts,
         "session_folder": session_folder,
         "raw_video": raw_video_path,
+        "clip": clip_path,
         # helpful extras:
         "mapped_mode": mapped_mode,
         "mapped_extras": mapped_extras
@@ -194,6 +126,21 @@ def write_swarm_config(label, session_folder, raw_video_path):
     print(f"[SWARM CONFIG] wrote {out_path}")
 
 
+def write_swarm_hint(label, prob):
+    """Atomically writes swarm_hint.json: the mode the dispatcher may pre-stage (label=None clears it)."""
+    mode = label_to_mode.get(label, ("unknown", {}))[0] if label else None
+    data = {
+        "mode": mode,
+        "label": label,
+        "prob": round(float(prob), 4),
+        "timestamp": time.time(),
+    }
+    out_dir = os.path.dirname(os.path.abspath(__file__))
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, os.path.join(out_dir, "swarm_hint.json"))
+
 
 # ---------- MEDIA PIPE ----------
 mp_pose = mp.solutions.pose
@@ -207,7 +154,10 @@ cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_SIZE[1])
 cap.set(cv2.CAP_PROP_FPS, FPS_TARGET)
 
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-writer = cv2.VideoWriter(RAW_MP4, fourcc, FPS_TARGET, FRAME_SIZE)
+RAW_SIZE = (int(FRAME_SIZE[0] * RAW_SCALE), int(FRAME_SIZE[1] * RAW_SCALE))
+writer = cv2.VideoWriter(RAW_MP4, fourcc, FPS_TARGET / RAW_EVERY, RAW_SIZE) if RECORD_RAW else None
+clips = ClipRecorder(FPS_TARGET, FRAME_SIZE, PRE_ROLL_SEC, POST_ROLL_SEC, CLIP_JPEG) if CLIPS else None
+RAW_VIDEO = RAW_MP4 if RECORD_RAW else None
 
 # ---------- BUFFERS ----------
 win_frames   = int(round(WINDOW_SEC * FPS_TARGET))
@@ -218,23 +168,32 @@ deque_time   = deque(maxlen=win_frames)
 frame_idx = 0
 last_run_idx = -10**9
 
-# EMA state
-ema = np.zeros(len(clf.classes_), dtype=float)
-EMA_ALPHA = 0.4  # smoothing factor (0..1)
-pause_until_time = -1e9   # wall-clock seconds since t0 when we resume checking
-
+# event state: EMA + hysteresis + min duration + cooldown + global pause (see event_logic.py)
+engine = EventEngine(clf.classes_, EventParams(
+    on_thresh=ON_THRESH,
+    off_thresh=OFF_THRESH if HYSTERESIS else ON_THRESH,
+    min_event_sec=MIN_EVENT_SEC,
+    cooldown_sec=COOLDOWN_SEC,
+    ema_alpha=EMA_ALPHA,
+    pause_after_event_sec=PAUSE_AFTER_EVENT_SEC,
+))
 
-# event state: per label timing + cooldown
-last_above = {c: None for c in clf.classes_}
-last_event_time = {c: -1e9 for c in clf.classes_}
+hud = None if HEADLESS else Hud(clf.classes_, ON_THRESH, FRAME_SIZE, redraw_eps=HUD_REDRAW_EPS)
 
 # write event header
 with open(EVENT_CSV, "w", newline="") as f:
     w = csv.writer(f)
-    w.writerow(["t_start", "t_end", "label", "peak_prob"])
+    w.writerow(["t_start", "t_end", "label", "peak_prob", "clip"])
+if RECORD_PROBS:
+    write_stream_header(PROBS_CSV, clf.classes_)
+
+last_hint = (None, -1e9)   # (label, time published)
 
 t0 = time.time()
-print("Press 'q' to quit.")
+# every event also goes to the cross-session store (event_store.py), with its features
+store = EventStore()
+store.open_session(SESSION_TS, t0, folder=OUT_DIR)
+print("Headless: press Ctrl-C to quit." if HEADLESS else "Press 'q' to quit.")
 try:
     while True:
         ok, frame = cap.read()
@@ -242,14 +201,10 @@ try:
             break
         now = time.time() - t0
 
-        # --- GLOBAL PAUSE GATE: skip classification while paused, still record video
-        is_paused = (now < pause_until_time)
-        if is_paused:
-            # optional HUD
-            remaining = pause_until_time - now
-            cv2.putText(frame, f"PAUSED {remaining:0.0f}s", (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.1, (0, 180, 255), 3)
-
+        # --- GLOBAL PAUSE GATE: no events while paused (only probs are recorded), still record video
+        is_paused = engine.is_paused(now)
+        if is_paused and hud is not None:
+            hud.paused(engine.pause_until - now)
 
         # pose
         rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -263,7 +218,7 @@ try:
                     vec.extend([lm.x, lm.y, lm.z])
                 else:
                     vec.extend([np.nan, np.nan, np.nan])
-            if POSE_DRAW:
+            if POSE_DRAW and not HEADLESS:
                 mp_draw.draw_landmarks(frame, res.pose_landmarks, mp_pose.POSE_CONNECTIONS)
         else:
             vec = [np.nan]*99
@@ -274,69 +229,49 @@ try:
         deque_time.append(now)
 
         # classification step?
-        # classification step?
-        if (not is_paused) and len(deque_xyv) == win_frames and (frame_idx - last_run_idx) >= step_frames:
-
+        if (RECORD_PROBS or not is_paused) and len(deque_xyv) == win_frames and (frame_idx - last_run_idx) >= step_frames:
 
             last_run_idx = frame_idx
             A = np.stack(deque_xyv, axis=0)  # (T, 99)
 
-            # interpolate NaNs per column
-            for d in range(A.shape[1]):
-                s = A[:, d]
-                m = np.isnan(s)
-                if not np.all(m):
-                    s[m] = np.interp(np.flatnonzero(m), np.flatnonzero(~m), s[~m])
-                A[:, d] = s
-            A = np.nan_to_num(A, nan=0.0)
-
-            # normalize
-            A = normalize_per_frame(A)
+            # interpolate NaNs per column, then normalize
+            A = normalize_per_frame(interpolate_nans(A))
 
             # features
             feat = compute_features(A, 1.0/FPS_TARGET)
 
             # align to model columns
             cols = MODEL_COLS if MODEL_COLS else list(feat.keys())
-            for c in cols:
-                if c not in feat:
-                    feat[c] = 0.0
-            X = pd.DataFrame([[feat[c] for c in cols]], columns=cols)
+            X = pd.DataFrame([align_features(feat, cols)], columns=cols)
 
-            # predict proba + EMA smoothing
+            # predict proba, record the raw stream, then EMA + event logic
             probs = clf.predict_proba(X)[0]
-            ema = EMA_ALPHA * probs + (1.0 - EMA_ALPHA) * ema
-
-            # event logic per class with hysteresis + min duration + cooldown
-            top_idx = int(np.argmax(ema))
-            top_label = clf.classes_[top_idx]
-            top_prob  = float(ema[top_idx])
-
-            # update above-threshold timers
-            for i, cls in enumerate(clf.classes_):
-                if ema[i] >= ON_THRESH:
-                    if last_above[cls] is None:
-                        last_above[cls] = deque_time[0]  # mark start at beginning of window
-                else:
-                    last_above[cls] = None  # reset if falls below ON
-
-            # decide events (only for the top class to reduce overlaps)
-            cls = top_label
-            t_last = last_above.get(cls, None)
-            recently = (deque_time[-1] - last_event_time[cls]) < COOLDOWN_SEC
-
-            # === your existing event block ===
-            if (t_last is not None) and (deque_time[-1] - t_last >= MIN_EVENT_SEC) and (top_prob >= ON_THRESH) and not recently:
-                t_start = t_last
-                t_end   = deque_time[-1]
-                last_event_time[cls] = deque_time[-1]
-                last_above[cls] = None
+            if RECORD_PROBS:
+                append_stream_row(PROBS_CSV, deque_time[0], deque_time[-1], probs)
+            event = engine.step(deque_time[0], deque_time[-1], probs)
+            top_label, top_prob = engine.top()
+
+            # speculative hint: the top class is rising but no event yet
+            if event is None and not engine.is_paused(now):
+                hint_label = top_label if top_prob >= HINT_THRESH else None
+                if hint_label != last_hint[0] or (hint_label and now - last_hint[1] >= HINT_REFRESH_SEC):
+                    write_swarm_hint(hint_label, top_prob)
+                    last_hint = (hint_label, now)
+
+            if event is not None:
+                cls, t_start, t_end = event.label, event.t_start, event.t_end
+                clip = None
+                if clips is not None:
+                    clip = clips.trigger(os.path.join(CLIP_DIR, f"{cls}_{t_start:.2f}-{t_end:.2f}.mp4"))
 
                 # write event to CSV
                 with open(EVENT_CSV, "a", newline="") as f:
                     w = csv.writer(f)
-                    w.writerow([f"{t_start:.2f}", f"{t_end:.2f}", cls, f"{top_prob:.3f}"])
+                    w.writerow([f"{t_start:.2f}", f"{t_end:.2f}", cls, f"{top_prob:.3f}", clip or ""])
                 print(f"[EVENT] {cls:10s} {t_start:.2f}–{t_end:.2f}  peak≈{top_prob:.2f}")
+                store.append(t_start, t_end, cls, top_prob,
+                             mode=label_to_mode.get(cls, ("unknown", {}))[0],
+                             features=[feat[c] for c in cols], columns=cols, clip=clip)
 
                 # === NEW: write prediction.json ===
                 # true_label is unknown in live mode; use None or "".
@@ -346,59 +281,59 @@ try:
                     feat=feat,
                     X_df=X,                         # the aligned DataFrame 
                     session_folder=OUT_DIR,
-                    raw_video_path=RAW_MP4
+                    raw_video_path=RAW_VIDEO,
+                    clip_path=clip
                 )
 
                 # also update global swarm_config.json
                 write_swarm_config(
                     label=cls,
                     session_folder=OUT_DIR,
-                    raw_video_path=RAW_MP4
+                    raw_video_path=RAW_VIDEO
                 )
+                if last_hint[0] is not None:
+                    write_swarm_hint(None, 0.0)
+                    last_hint = (None, now)
 
-
-                # === NEW: start global pause ===
-                pause_until_time = now + PAUSE_AFTER_EVENT_SEC
-
-
-            # HUD
-            if not is_paused:
-                txt = f"{top_label}  {top_prob:0.2f}"
-                cv2.putText(frame, txt, (20, 40),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1.1,
-                            (0,255,0) if top_prob>=ON_THRESH else (0,200,200), 3)
-
-                # tiny class bar chart
-                x0, y0, w, h = 20, 60, 220, 16
-                for i, cls in enumerate(clf.classes_):
-                    p = float(ema[i])
-                    cv2.rectangle(frame, (x0, y0 + i*(h+6)),
-                                (x0 + int(w*p), y0 + i*(h+6) + h),
-                                (50,200,50), -1)
-                    cv2.putText(frame, f"{cls[:10]:10s} {p:0.2f}",
-                                (x0 + w + 10, y0 + i*(h+6) + h - 2),
-                                cv2.FONT_HERSHEY_PLAIN, 1.1, (240,240,240), 1)
-            else:
-                # show paused banner in the same spot
-                remaining = pause_until_time - now
-                cv2.putText(frame, f"PAUSED {remaining:0.0f}s", (20, 40),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1.1, (0, 180, 255), 3)
+            # HUD (cached; only re-rendered when the bars visibly move)
+            if hud is not None and not engine.is_paused(now):
+                hud.update(engine.ema, top_label, top_prob)
 
         # show & record
-        cv2.imshow("Live Sliding-Window Classify", frame)
-        writer.write(frame)
+        if hud is not None:
+            hud.composite(frame)
+            cv2.imshow("Live Sliding-Window Classify", frame)
+        if writer is not None and frame_idx % RAW_EVERY == 0:
+            writer.write(frame if RAW_SCALE == 1.0 else cv2.resize(frame, RAW_SIZE, interpolation=cv2.INTER_AREA))
+        if clips is not None:
+            clips.push(frame)
         frame_idx += 1
 
-        k = cv2.waitKey(1) & 0xFF
-        if k == ord('q'):
-            break
+        if not HEADLESS:
+            k = cv2.waitKey(1) & 0xFF
+            if k == ord('q'):
+                break
 
+except KeyboardInterrupt:
+    pass
 finally:
     cap.release()
-    writer.release()
-    cv2.destroyAllWindows()
+    if writer is not None:
+        writer.release()
+    if clips is not None:
+        clips.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
     pose.close()
+    store.close()   # also rebuilds the store's index
 
 print("\nSaved:")
-print("  video:", RAW_MP4)
+if RECORD_RAW:
+    print(f"  video: {RAW_MP4} ({os.path.getsize(RAW_MP4) / 1e6:.1f} MB)")
+if clips is not None:
+    print(f"  clips: {len(clips.done)} in {CLIP_DIR} ({clips.clip_bytes() / 1e6:.1f} MB), "
+          f"pre-roll ring peak {clips.peak_ring_bytes / 1e6:.1f} MB")
 print("  events:", EVENT_CSV)
+if RECORD_PROBS:
+    print("  probs:", PROBS_CSV)
+print(f"  event store: {store.appended} events -> {store.root}")
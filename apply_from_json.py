@@ -1,9 +1,17 @@
 #!/usr/bin/env python3.8
-import asyncio, json, os
-from cctl import cli
-from cctl.conf import Configuration
+import asyncio, json, os, time
+from build_usr_code import BUILD_DIR, BuildError, build_all
+from cctl_client import CctlClient
+from clock_sync import ClockSync
+from deploy_cache import DeployCache
+from dispatch_metrics import DispatchMetrics
+from fanout import fan_out, with_retries
+from liveness import Liveness
+from mode_delivery import ModeDelivery
+from transitions import TransitionScheduler
 
-ROBOTS = [4, 5]
+ROBOTS = [int(r) for r in os.environ.get("ROBOTS", "4 5").split()]   # ROBOTS="3 4 5" ./apply_from_json.py
+# uploaded from build/ (build_usr_code.py, run at startup)
 MODE_TO_FILE = {
     "float":            "usr_code_filler.py",
     "glide":            "usr_code_filler.py",
@@ -15,9 +23,45 @@ MODE_TO_FILE = {
     "encircling":       "usr_code_encircling.py",
 }
 
+# how long a started script keeps the robots busy (warm-up + max runtime);
+# None = runs until paused. Robots are only pre-staged when idle.
+SCRIPT_RUNTIME_SEC = {
+    "usr_code_filler.py":     3.0 + 55.0,
+    "usr_code_move_left.py":  3.0 + 55.0,
+    "usr_code_move_right.py": 3.0 + 55.0,
+    "usr_code_glitch.py":     3.0 + 55.0,
+    "usr_code_encircling.py": None,
+    "usr_code_bundle.py":     None,
+}
+
 HERE = os.path.abspath(os.path.dirname(__file__))
-JSON_PATH = os.path.join(HERE, "swarm_config.json")
+JSON_PATH = os.environ.get("SWARM_CONFIG", os.path.join(HERE, "swarm_config.json"))
+HINT_PATH = os.environ.get("SWARM_HINT", os.path.join(HERE, "swarm_hint.json"))   # written by 10_continuous_classification.py
 POLL = 1.0  # seconds
+LOG_DIR = os.environ.get("DISPATCH_LOGS", os.path.join(HERE, "dispatch_logs"))
+TRANSITION_LOG = os.path.join(LOG_DIR, "transitions.csv")
+METRICS_SUMMARY = os.path.join(LOG_DIR, "metrics_summary.txt")
+SKEW_LOG = os.path.join(LOG_DIR, "start_skew.csv")   # METRICS_PORT / METRICS_FILE: see dispatch_metrics.py
+MODE_LOG = os.path.join(LOG_DIR, "mode_delivery.csv")
+
+CMD_DEADLINE    = 5.0     # per-robot deadline for on / pause / start
+UPDATE_DEADLINE = 120.0   # swarm-wide `cctl update`
+CMD_RETRIES     = 3       # bounded retries (exponential backoff) for stragglers / update
+# mode changes go only to robots the liveness table considers healthy (see liveness.py)
+
+# BUNDLE=1: upload usr_code_bundle.py once, then switch behaviors with a "mode" signal
+USE_BUNDLE      = os.environ.get("BUNDLE", "0") == "1"
+BUNDLE_FILE     = "usr_code_bundle.py"
+# the mode signal is acknowledged per robot and retransmitted only to robots
+# that have not acked (mode_delivery.py); this also covers bundles still booting
+
+# behaviors that honor a shared start instant (clock_sync.py); SYNC_START=0 measures the baseline
+SYNC_SCRIPTS    = {"usr_code_filler.py", "usr_code_move_left.py", "usr_code_move_right.py"}
+SCRIPT_BOOT_SEC = 3.0     # their warm-up (robot.delay(3000)) before they arm
+
+PRESTAGE           = True   # upload the hinted script to idle robots before the event fires
+PRESTAGE_MIN_PROB  = 0.45   # ignore weaker hints
+HINT_MAX_AGE       = 3.0    # seconds; older hints are stale
 
 def read_mode_ts():
     try:
@@ -27,63 +71,339 @@ def read_mode_ts():
     except Exception:
         return "", ""
 
-async def exec_cctl(conf, *argv):
-    parser = cli.create_parser()
-    args = parser.parse_args(list(map(str, argv)))
-    return await cli.exec_command(args, conf)
+def read_hint():
+    """Returns (mode, prob) of a fresh hint, or ("", 0.0)."""
+    try:
+        with open(HINT_PATH) as f:
+            d = json.load(f)
+        if time.time() - float(d.get("timestamp", 0)) > HINT_MAX_AGE:
+            return "", 0.0
+        return (d.get("mode") or "").strip().lower(), float(d.get("prob") or 0.0)
+    except Exception:
+        return "", 0.0
+
+def script_for(mode):
+    script_rel = MODE_TO_FILE.get(mode)
+    if not script_rel:
+        return None
+    script_abs = os.path.abspath(os.path.join(BUILD_DIR, script_rel))
+    return script_abs if os.path.exists(script_abs) else None
+
+
+class SwarmState:
+    """What the dispatcher believes the robots are doing, plus pre-stage counters."""
+
+    def __init__(self):
+        self.loaded = None        # abs path of the script last uploaded
+        self.staged = False       # loaded by a pre-stage and not started yet
+        self.prestage_task = None # background pre-stage upload, if one is running
+        self.staging = None       # abs path that upload is sending
+        self.busy_until = 0.0     # time.time() until which the started script runs (inf = until paused)
+        self.stragglers = None    # FanoutResult of the last start, still retrying in the background
+        self.sync_task = None     # shared-start / skew measurement of the last start
+        self.late_report = None   # task printing its summary once the retries settle
+        self.metrics = {"prestage_uploads": 0, "prestage_hits": 0, "prestage_wasted": 0}
+        self.cache = DeployCache()  # per-robot hash of the deployed script (persisted)
+        self.health = Liveness(ROBOTS)
+        self.mode = ""              # last mode a transition was started for
+        self.clock = None           # ClockSync, set up in main()
+        self.delivery = None        # ModeDelivery, set up in main()
+
+    def targets(self):
+        """Robots a mode change goes to: the healthy ones."""
+        return self.health.healthy(ROBOTS)
+
+    def idle(self):
+        return time.time() >= self.busy_until
+
+    def started(self, script_abs):
+        runtime = SCRIPT_RUNTIME_SEC.get(os.path.basename(script_abs))
+        self.busy_until = float("inf") if runtime is None else time.time() + runtime
+        self.staged = False
+
+    def restage(self, script_abs):
+        if self.staged and self.loaded != script_abs:
+            self.metrics["prestage_wasted"] += 1   # staged script replaced before it was used
+        self.loaded = script_abs
+        self.staged = True
+        self.metrics["prestage_uploads"] += 1
+
+    def report(self):
+        m = self.metrics
+        print("[METRICS] prestage uploads=%d hits=%d wasted=%d | %s" %
+              (m["prestage_uploads"], m["prestage_hits"], m["prestage_wasted"], self.cache.summary()))
+
+
+async def prestage(client, state, current_mode):
+    """Upload the hinted script to idle robots without starting it."""
+    mode, prob = read_hint()
+    if not mode or mode == current_mode or prob < PRESTAGE_MIN_PROB or not state.idle():
+        return
+    script_abs = script_for(mode)
+    if not script_abs or script_abs == state.loaded or not state.cache.stale(state.targets(), script_abs):
+        return
+    print(f"[INFO] Pre-staging {os.path.basename(script_abs)} for likely '{mode}' (p≈{prob:.2f})")
+    state.staging = script_abs
+    try:
+        await with_retries("pre-stage update", lambda: client.update(script_abs),
+                           UPDATE_DEADLINE, retries=0)
+    except asyncio.CancelledError:
+        # robots may hold half an upload: make the next deploy send it in full
+        print(f"[INFO] Pre-stage of {os.path.basename(script_abs)} cancelled")
+        state.cache.invalidate(powered(client, ROBOTS))
+        state.loaded = None
+        raise
+    except Exception as e:
+        print("[WARN] pre-stage 'cctl update' failed:", e)
+        state.cache.invalidate(ROBOTS)
+        return
+    finally:
+        state.staging = None
+    state.cache.record(powered(client, state.targets()), script_abs)
+    state.restage(script_abs)
+
+def start_prestage(client, state, current_mode):
+    """Run prestage() in the background so dispatch_loop keeps polling (one at a time)."""
+    if state.prestage_task is None or state.prestage_task.done():
+        state.prestage_task = asyncio.ensure_future(prestage(client, state, current_mode))
+
+def cancel_prestage(state, tr):
+    """Scheduler on_submit hook: drop a running pre-stage unless it uploads tr's script."""
+    task = state.prestage_task
+    if task is None or task.done():
+        return
+    if USE_BUNDLE or state.staging != script_for(tr.mode):
+        task.cancel()
+
+def powered(client, robots):
+    """Robots that received a swarm-wide `cctl update` (it goes to all ON bots)."""
+    return [r for r in robots if str(r) in client.powered]
+
+async def report_late(result):
+    await result.wait_retries()
+    print("[INFO]", result.summary())
+
+async def start_robots(client, state, script_abs):
+    """Fan `cctl start` out per robot; stragglers keep retrying in the background."""
+    res = await fan_out("start", lambda r: client.start([r]), state.targets(),
+                        deadline=CMD_DEADLINE, retries=CMD_RETRIES, observer=state.health.observe)
+    print("[INFO]", res.summary())
+    if os.path.basename(script_abs) in SYNC_SCRIPTS:
+        synced_start(state, len(res.robots), SCRIPT_BOOT_SEC)
+    if res.ok:
+        state.started(script_abs)
+    if res.stragglers:
+        state.stragglers = res
+        state.late_report = asyncio.ensure_future(report_late(res))
+    return res
+
+def synced_start(state, n_robots, boot):
+    """Broadcast a shared start instant and log the skew (background; cancelled if superseded)."""
+    state.sync_task = asyncio.ensure_future(state.clock.start(n_robots, state.mode, boot))
+
+async def deploy(client, state, script_abs, tr):
+    """PAUSE → UPDATE → START. Returns False if the update failed (retried by the scheduler).
+
+    The update is skipped when every robot already holds this exact script.
+    Stops at the safe points between steps if `tr` has been superseded.
+    """
+    targets = state.targets()
+    cached = state.cache.check(targets, script_abs)
+    if cached:
+        print(f"[INFO] robots already hold {os.path.basename(script_abs)} → restart only")
+    # 2) Pause the running user code on selected robots (per robot, concurrently)
+    res = await fan_out("pause", lambda r: client.pause([r]), targets,
+                        deadline=CMD_DEADLINE, retries=0, observer=state.health.observe)
+    if res.failed:
+        print("[WARN] 'cctl pause' failed (continuing):", res.summary())
+
+    # (tiny debounce helps some BLE stacks)
+    await asyncio.sleep(0.2)
+    tr.checkpoint("before update")
+
+    # 3) Push new user code (unless cached)
+    if not cached:
+        try:
+            await with_retries("cctl update", lambda: client.update(script_abs),
+                               UPDATE_DEADLINE, retries=CMD_RETRIES)   # cctl update /abs/path.py
+        except Exception as e:
+            print("[ERROR] 'cctl update' failed after retries:", e)
+            state.cache.invalidate(ROBOTS)   # unknown what the robots hold now
+            return False
+        state.cache.record(powered(client, targets), script_abs)
+    state.loaded = script_abs
+
+    # Another tiny delay before restart
+    await asyncio.sleep(0.2)
+    tr.checkpoint("before start")
+
+    # 4) Start on selected robots
+    await start_robots(client, state, script_abs)
+    return True
+
+async def send_mode(state, mode, tr):
+    """Broadcast the mode on the robots' "mode" slot (a few bytes, no upload), then
+    retransmit to the robots that have not acked until they do or tr is superseded."""
+    await state.delivery.deliver(mode, state.targets(), superseded=lambda: tr.superseded)
+
+async def apply_bundle(client, state, tr):
+    """Bundle mode: make sure usr_code_bundle.py runs, then just signal the mode."""
+    mode = tr.mode
+    bundle_abs = os.path.join(BUILD_DIR, BUNDLE_FILE)
+    if state.loaded != bundle_abs or state.idle():
+        print(f"[INFO] Mode → {mode} | deploying {BUNDLE_FILE} once")
+        if not await deploy(client, state, bundle_abs, tr):
+            return False
+        tr.checkpoint("before signal")
+    else:
+        print(f"[INFO] Mode → {mode} | SIGNAL")
+    await send_mode(state, mode, tr)
+    if MODE_TO_FILE.get(mode) in SYNC_SCRIPTS:
+        synced_start(state, len(state.targets()), 0.0)
+    return True
+
+async def probe(client, robot):
+    """Heartbeat probe: `cctl on <id>` is cheap and also powers up a robot that rebooted."""
+    await client.run("on", robot)
+    client.powered.add(str(robot))
+
+async def catch_up(client, state, robot):
+    """A re-admitted robot rejoins the current mode if it already holds the script;
+    otherwise it is brought along by the next mode change's update."""
+    if not state.loaded or state.idle() or state.cache.stale([robot], state.loaded):
+        print(f"[HEALTH] robot {robot} rejoins at the next mode change")
+        return
+    res = await fan_out("start", lambda r: client.start([r]), [robot],
+                        deadline=CMD_DEADLINE, retries=0, observer=state.health.observe)
+    if res.ok and USE_BUNDLE and state.mode:
+        await state.delivery.deliver(state.mode, [robot], broadcast=False)
+    print(f"[HEALTH] robot {robot} catch-up:", res.summary())
+
+async def apply_mode(client, state, tr):
+    """One scheduled transition to tr.mode; raises if it failed."""
+    mode = tr.mode
+    state.mode = mode
+    if len(state.targets()) < len(ROBOTS):
+        print(f"[HEALTH] routing around suspect robots {state.health.suspects()}")
+    if state.stragglers is not None:
+        state.stragglers.cancel()   # don't start the previous script late
+        state.stragglers = None
+    if state.sync_task is not None:
+        state.sync_task.cancel()
+        state.sync_task = None
+
+    if USE_BUNDLE:
+        if not await apply_bundle(client, state, tr):
+            raise RuntimeError("bundle deploy failed")
+        return
+
+    if state.prestage_task is not None and not state.prestage_task.done():
+        # cancel_prestage() let it run: it is uploading this script, so finish it instead of restarting
+        print(f"[INFO] Mode → {mode} | waiting for the pre-stage upload")
+        await asyncio.wait([state.prestage_task])
+        tr.checkpoint("after pre-stage")
+
+    script_abs = script_for(mode)
+    if state.staged and state.loaded == script_abs:
+        # pre-staged on idle robots: only the fast start is left
+        print(f"[INFO] Mode → {mode} | pre-staged → START")
+        tr.checkpoint("before start")
+        state.metrics["prestage_hits"] += 1
+        await start_robots(client, state, script_abs)
+    else:
+        if state.staged:
+            state.metrics["prestage_wasted"] += 1
+            state.staged = False
+        print(f"[INFO] Mode → {mode} | PAUSE → UPDATE → START")
+        if not await deploy(client, state, script_abs, tr):
+            raise RuntimeError("cctl update failed")
+    state.report()
+
+def register_metrics(metrics, state, sched):
+    metrics.gauge("transition_backlog", lambda: sched.backlog,
+                  "mode transitions running or waiting (0-2, latest wins)")
+    metrics.gauge("transitions_total", sched.counts, "finished transitions by outcome",
+                  kind="counter", label="outcome")
+    metrics.gauge("prestage_total", lambda: {k[len("prestage_"):]: v for k, v in state.metrics.items()},
+                  "pre-stage uploads / hits / wasted uploads", kind="counter", label="result")
+    metrics.gauge("deploy_cache_total", lambda: {"hit": state.cache.hits, "miss": state.cache.misses},
+                  "deploys skipped (hit) or uploaded (miss)", kind="counter", label="result")
+    metrics.gauge("robots", state.health.counts, "robots by liveness state", label="state")
+    metrics.gauge("mode_sends_total", lambda: {"first": state.delivery.sends_total - state.delivery.retransmits_total,
+                                               "retransmit": state.delivery.retransmits_total},
+                  "mode signals sent per robot, first sends vs retransmits to unacked robots",
+                  kind="counter", label="kind")
+    metrics.gauge("stragglers", lambda: len(state.stragglers.stragglers) if state.stragglers else 0,
+                  "robots whose last start is still being retried")
 
 async def main():
-    conf = Configuration()
+    try:
+        build_all(quiet=True)   # robot programs → build/
+    except BuildError as e:
+        raise SystemExit(f"[ERROR] {e}")
+    metrics = DispatchMetrics()
+    client = CctlClient(metrics=metrics)   # one Configuration / parser for the whole run
+    state = SwarmState()
+    state.clock = ClockSync(client, SKEW_LOG)
+    state.clock.attach()
+    state.delivery = ModeDelivery(client, MODE_LOG)
+    state.delivery.attach()
+
+    def finished(tr):
+        metrics.observe_transition(tr.outcome, tr.finished_at - tr.requested_at)
+        metrics.write()
+
+    sched = TransitionScheduler(lambda tr: apply_mode(client, state, tr),
+                                retry_failed_after=POLL, log_path=TRANSITION_LOG,
+                                on_finish=finished, on_submit=lambda tr: cancel_prestage(state, tr))
+    register_metrics(metrics, state, sched)
+    metrics.serve()
 
     # 1) Power on / select robots once
     print("[INFO] Powering on / selecting robots:", ROBOTS)
+    # (robots that miss both tries start out suspect and are probed in the background)
+    res = await fan_out("on", lambda r: client.on([r]), ROBOTS, deadline=CMD_DEADLINE,
+                        retries=1, background=False, observer=state.health.observe)
+    print("[INFO]", res.summary())
+
+    catchups = set()
+
+    def readmitted(robot):
+        t = asyncio.ensure_future(catch_up(client, state, robot))
+        catchups.add(t)
+        t.add_done_callback(catchups.discard)
+
+    state.health.on_readmit = readmitted
+    prober = asyncio.ensure_future(state.health.run_probes(lambda r: probe(client, r)))
+    worker = asyncio.ensure_future(sched.run())
     try:
-        await exec_cctl(conf, "on", *ROBOTS)  # cctl on 4 5
-    except Exception as e:
-        print("[WARN] 'cctl on' failed:", e)
+        await dispatch_loop(client, state, sched)
+    finally:
+        worker.cancel()
+        prober.cancel()
+        if state.prestage_task is not None:
+            state.prestage_task.cancel()
+        state.report()
+        print(state.health.report())
+        print("[METRICS] transitions:", sched.counts())
+        metrics.shutdown(METRICS_SUMMARY)
 
+async def dispatch_loop(client, state, sched):
+    """Poll swarm_config.json; the scheduler always targets the newest mode."""
     last_mode, last_ts = "", ""
     while True:
         mode, ts = read_mode_ts()
         if mode and (mode != last_mode or ts != last_ts):
+            last_mode, last_ts = mode, ts
             script_rel = MODE_TO_FILE.get(mode)
             if not script_rel:
                 print(f"[WARN] No script mapped for mode '{mode}'.")
+            elif not USE_BUNDLE and not script_for(mode):
+                print(f"[WARN] Script file missing: {os.path.join(BUILD_DIR, script_rel)}")
             else:
-                script_abs = os.path.abspath(os.path.join(HERE, script_rel))
-                if not os.path.exists(script_abs):
-                    print(f"[WARN] Script file missing: {script_abs}")
-                else:
-                    print(f"[INFO] Mode → {mode} | PAUSE → UPDATE → START")
-                    # 2) Pause the running user code on selected robots
-                    try:
-                        await exec_cctl(conf, "pause", *ROBOTS)       # cctl pause 4 5
-                    except Exception as e:
-                        print("[WARN] 'cctl pause' failed (continuing):", e)
-
-                    # (tiny debounce helps some BLE stacks)
-                    await asyncio.sleep(0.2)
-
-                    # 3) Push new user code
-                    try:
-                        await exec_cctl(conf, "update", script_abs)   # cctl update /abs/path.py
-                    except Exception as e:
-                        print("[ERROR] 'cctl update' failed:", e)
-                        # don't advance last_* so we retry on next poll
-                        await asyncio.sleep(POLL)
-                        continue
-
-                    # Another tiny delay before restart
-                    await asyncio.sleep(0.2)
-
-                    # 4) Start on selected robots
-                    try:
-                        await exec_cctl(conf, "start", *ROBOTS)       # cctl start 4 5
-                        print("[INFO] Started:", ROBOTS)
-                    except Exception as e:
-                        print("[WARN] 'cctl start' failed:", e)
-
-            last_mode, last_ts = mode, ts
+                sched.submit(mode, ts)
+        elif PRESTAGE and not USE_BUNDLE and not sched.busy:
+            start_prestage(client, state, last_mode)
         await asyncio.sleep(POLL)
 
 if __name__ == "__main__":
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3.8
+"""
+Group-aware dispatcher: several robot groups run different modes at once
+(e.g. an inner ring encircling while the outer group glitches).
+
+`cctl update` is swarm-wide, so groups cannot hold different scripts.
+Instead usr_code_bundle.py (every behavior in one program) is uploaded
+once, and each group is switched by sending its mode to its robots with
+direct signals on the "mode" slot. Every group has its own latest-wins
+TransitionScheduler, so groups switch concurrently and a slow group never
+holds up the others.
+
+Groups come from swarm_groups.json:
+
+    {"groups": {"inner": [1, 2, 3], "outer": [4, 5, 6]},
+     "choreography": {"encircling": {"inner": "encircling", "outer": "glitch"}}}
+
+A swarm_config.json with a "groups" object ({"inner": "glitch", ...})
+sets group modes directly; otherwise its "mode" is expanded through
+"choreography" (groups without an entry take the mode itself).
+
+A group counts as switched once every robot in it acked the new mode
+(mode_delivery.py). Each config change is logged to dispatch_logs/group_changes.csv with the
+total time until every changed group switched and the sum of the group
+times (what one-group-at-a-time dispatch would have cost); the shutdown
+report groups these by how many groups changed.
+"""
+import asyncio, csv, json, os, time
+from collections import defaultdict
+
+from build_usr_code import BUILD_DIR, BuildError, build_all
+from cctl_client import CctlClient
+from deploy_cache import DeployCache
+from dispatch_metrics import DispatchMetrics
+from fanout import fan_out, with_retries
+from liveness import Liveness
+from mode_delivery import ModeDelivery
+from transitions import APPLIED, TransitionScheduler
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+JSON_PATH = os.environ.get("SWARM_CONFIG", os.path.join(HERE, "swarm_config.json"))
+GROUPS_PATH = os.environ.get("SWARM_GROUPS", os.path.join(HERE, "swarm_groups.json"))
+BUNDLE_FILE = "usr_code_bundle.py"
+POLL = 1.0  # seconds
+
+LOG_DIR = os.environ.get("DISPATCH_LOGS", os.path.join(HERE, "dispatch_logs"))
+CHANGE_LOG = os.path.join(LOG_DIR, "group_changes.csv")
+METRICS_SUMMARY = os.path.join(LOG_DIR, "metrics_summary_groups.txt")
+MODE_LOG = os.path.join(LOG_DIR, "mode_delivery.csv")
+
+CMD_DEADLINE    = 5.0     # per-robot deadline for on / pause / start / signal
+UPDATE_DEADLINE = 120.0   # swarm-wide `cctl update`
+CMD_RETRIES     = 3
+BUNDLE_BOOT     = 0.5     # after a catch-up start, before the bundle has registered its slot
+# mode signals are acked per robot and retransmitted to unacked robots only (mode_delivery.py)
+
+def load_groups(path=GROUPS_PATH):
+    """Returns ({group: [robot ids]}, {mode: {group: mode}})."""
+    with open(path) as f:
+        d = json.load(f)
+    groups = {str(g): [int(r) for r in ids] for g, ids in d.get("groups", {}).items()}
+    seen = set()
+    for g, ids in groups.items():
+        dup = seen.intersection(ids)
+        if dup:
+            raise ValueError(f"robots {sorted(dup)} are in more than one group")
+        seen.update(ids)
+    return groups, d.get("choreography", {})
+
+def read_config():
+    try:
+        with open(JSON_PATH) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def group_modes(cfg, groups, choreography):
+    """{group: mode} requested by a swarm_config.json."""
+    explicit = cfg.get("groups")
+    if isinstance(explicit, dict):
+        return {g: str(m).strip().lower() for g, m in explicit.items() if g in groups and m}
+    mode = (cfg.get("mode") or "").strip().lower()
+    if not mode:
+        return {}
+    table = choreography.get(mode, {})
+    return {g: table.get(g, mode) for g in groups}
+
+
+class Change:
+    """One config change: the group transitions it started and when they ended."""
+
+    def __init__(self, ts, groups):
+        self.ts = ts
+        self.t0 = time.time()
+        self.pending = set(groups)
+        self.n_groups = len(groups)
+        self.ran = {}          # group -> seconds its transition ran
+        self.outcome = APPLIED
+        self.total = None
+
+
+class GroupDispatcher:
+    def __init__(self, client, groups, choreography, metrics):
+        self.client = client
+        self.groups = groups
+        self.choreography = choreography
+        self.metrics = metrics
+        self.robots = sorted(r for ids in groups.values() for r in ids)
+        self.health = Liveness(self.robots, on_readmit=self.readmitted)
+        self.cache = DeployCache()
+        self.delivery = ModeDelivery(client, MODE_LOG)
+        self.ready = asyncio.Event()   # set once the bundle runs
+        self.modes = {}                # group -> last requested mode
+        self.changes = []
+        self._tasks = set()
+        self.scheds = {
+            g: TransitionScheduler(self._applier(g), retry_failed_after=POLL,
+                                   log_path=os.path.join(LOG_DIR, f"transitions_{g}.csv"),
+                                   on_finish=self.finished)
+            for g in groups
+        }
+
+    def _spawn(self, coro):
+        t = asyncio.ensure_future(coro)
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+        return t
+
+    # ---- bundle deploy ----
+    async def bootstrap(self):
+        """Power on every group, upload the bundle once (unless cached) and start it."""
+        print("[INFO] Powering on / selecting robots:", self.robots)
+        res = await fan_out("on", lambda r: self.client.on([r]), self.robots, deadline=CMD_DEADLINE,
+                            retries=1, background=False, observer=self.health.observe)
+        print("[INFO]", res.summary())
+        bundle_abs = os.path.join(BUILD_DIR, BUNDLE_FILE)
+        delay = POLL
+        while True:
+            targets = self.health.healthy(self.robots)
+            if self.cache.check(targets, bundle_abs):
+                print(f"[INFO] robots already hold {BUNDLE_FILE} → restart only")
+                break
+            await fan_out("pause", lambda r: self.client.pause([r]), targets,
+                          deadline=CMD_DEADLINE, retries=0, observer=self.health.observe)
+            try:
+                await with_retries("cctl update", lambda: self.client.update(bundle_abs),
+                                   UPDATE_DEADLINE, retries=CMD_RETRIES)
+            except Exception as e:
+                print(f"[ERROR] bundle upload failed: {e}; retrying in {delay:.0f}s")
+                self.cache.invalidate(self.robots)
+                await asyncio.sleep(delay)
+                delay = min(30.0, delay * 2.0)
+                continue
+            self.cache.record([r for r in targets if str(r) in self.client.powered], bundle_abs)
+            break
+        res = await fan_out("start", lambda r: self.client.start([r]), self.health.healthy(self.robots),
+                            deadline=CMD_DEADLINE, retries=CMD_RETRIES, observer=self.health.observe)
+        print("[INFO]", res.summary())
+        self.ready.set()
+
+    # ---- per-group transitions ----
+    def _applier(self, group):
+        async def apply(tr):
+            await self.ready.wait()
+            tr.checkpoint("before signal")
+            targets = self.health.healthy(self.groups[group])
+            skipped = len(self.groups[group]) - len(targets)
+            print(f"[INFO] group {group} → {tr.mode} ({len(targets)} robots"
+                  f"{f', {skipped} suspect skipped' if skipped else ''})")
+            await self.signal(targets, tr.mode, superseded=lambda: tr.superseded)
+        return apply
+
+    async def signal(self, robots, mode, superseded=None):
+        """Direct-signal the mode to the robots until each acked (or superseded / deadline)."""
+        return await self.delivery.deliver(mode, robots, broadcast=False, superseded=superseded)
+
+    def readmitted(self, robot):
+        group = next(g for g, ids in self.groups.items() if robot in ids)
+        self._spawn(self.catch_up(robot, group))
+
+    async def catch_up(self, robot, group):
+        if not self.ready.is_set():
+            return
+        if self.cache.stale([robot], os.path.join(BUILD_DIR, BUNDLE_FILE)):
+            print(f"[HEALTH] robot {robot} does not hold {BUNDLE_FILE}; restart the dispatcher to re-upload")
+            return
+        res = await fan_out("start", lambda r: self.client.start([r]), [robot],
+                            deadline=CMD_DEADLINE, retries=0, observer=self.health.observe)
+        if res.ok and self.modes.get(group):
+            await asyncio.sleep(BUNDLE_BOOT)   # let the bundle register its slot (unacked sends are retried anyway)
+            await self.signal([robot], self.modes[group])
+        print(f"[HEALTH] robot {robot} ({group}) catch-up:", res.summary())
+
+    # ---- config changes ----
+    def submit(self, cfg):
+        wanted = group_modes(cfg, self.groups, self.choreography)
+        ts = cfg.get("timestamp", "")
+        if isinstance(cfg.get("groups"), dict):
+            # explicit per-group modes: only the groups whose mode changed
+            changed = {g: m for g, m in wanted.items() if m != self.modes.get(g)}
+        else:
+            # a classified event re-triggers every group, like a repeated label does
+            changed = wanted
+        if not changed:
+            return
+        change = Change(ts, changed)
+        self.changes.append(change)
+        for g, mode in changed.items():
+            self.modes[g] = mode
+            tr = self.scheds[g].submit(mode, ts)
+            tr.change, tr.group = change, g
+
+    def finished(self, tr):
+        self.metrics.observe_transition(tr.outcome, tr.finished_at - tr.requested_at)
+        change = getattr(tr, "change", None)
+        if change is None or tr.group not in change.pending:
+            return
+        change.pending.discard(tr.group)
+        change.ran[tr.group] = tr.timings()[1]
+        if tr.outcome != APPLIED:
+            change.outcome = tr.outcome
+        if not change.pending:
+            change.total = tr.finished_at - change.t0
+            self.log_change(change)
+        self.metrics.write()
+
+    def log_change(self, c):
+        serial = sum(c.ran.values())
+        print(f"[GROUPS] {c.n_groups} group(s) {c.outcome} in {c.total:.2f}s "
+              f"(sum of group times {serial:.2f}s)")
+        new = not os.path.exists(CHANGE_LOG)
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(CHANGE_LOG, "a", newline="") as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(["t0", "config_ts", "n_groups", "outcome", "total_sec", "sum_group_sec", "max_group_sec"])
+            w.writerow([f"{c.t0:.3f}", c.ts, c.n_groups, c.outcome, f"{c.total:.3f}",
+                        f"{serial:.3f}", f"{max(c.ran.values()):.3f}"])
+
+    def scaling_report(self):
+        by_n = defaultdict(list)
+        for c in self.changes:
+            if c.total is not None and c.outcome == APPLIED:
+                by_n[c.n_groups].append(c)
+        lines = ["%8s %7s %10s %14s %8s" % ("groups", "changes", "total (s)", "serial eq. (s)", "speedup")]
+        for n in sorted(by_n):
+            cs = by_n[n]
+            total = sum(c.total for c in cs) / len(cs)
+            serial = sum(sum(c.ran.values()) for c in cs) / len(cs)
+            lines.append("%8d %7d %10.3f %14.3f %7.1fx" % (n, len(cs), total, serial,
+                                                         serial / total if total else float("nan")))
+        return "\n".join(lines)
+
+    def register_metrics(self):
+        m = self.metrics
+        m.gauge("transition_backlog", lambda: {g: s.backlog for g, s in self.scheds.items()},
+                "group transitions running or waiting", label="group")
+        m.gauge("robots", self.health.counts, "robots by liveness state", label="state")
+        m.gauge("mode_sends_total", lambda: {"first": self.delivery.sends_total - self.delivery.retransmits_total,
+                                             "retransmit": self.delivery.retransmits_total},
+                "mode signals sent per robot, first sends vs retransmits to unacked robots",
+                kind="counter", label="kind")
+        m.gauge("deploy_cache_total", lambda: {"hit": self.cache.hits, "miss": self.cache.misses},
+                "deploys skipped (hit) or uploaded (miss)", kind="counter", label="result")
+
+
+async def main():
+    try:
+        build_all(quiet=True)   # robot programs → build/
+    except BuildError as e:
+        raise SystemExit(f"[ERROR] {e}")
+    groups, choreography = load_groups()
+    print("[INFO] groups:", ", ".join(f"{g}={ids}" for g, ids in groups.items()))
+    metrics = DispatchMetrics()
+    client = CctlClient(metrics=metrics)
+    disp = GroupDispatcher(client, groups, choreography, metrics)
+    disp.delivery.attach()
+    disp.register_metrics()
+    metrics.serve()
+
+    workers = [asyncio.ensure_future(s.run()) for s in disp.scheds.values()]
+    workers.append(asyncio.ensure_future(disp.health.run_probes(lambda r: probe(client, r))))
+    workers.append(asyncio.ensure_future(disp.bootstrap()))
+    try:
+        last_ts = None
+        while True:
+            cfg = read_config()
+            ts = (cfg.get("timestamp"), json.dumps(cfg.get("groups"), sort_keys=True), cfg.get("mode"))
+            if cfg and ts != last_ts:
+                last_ts = ts
+                disp.submit(cfg)
+            await asyncio.sleep(POLL)
+    finally:
+        for w in workers:
+            w.cancel()
+        print(disp.health.report())
+        print(disp.scaling_report())
+        metrics.shutdown(METRICS_SUMMARY)
+
+async def probe(client, robot):
+    await client.run("on", robot)
+    client.powered.add(str(robot))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Benchmark a dispatcher against the simulated fleet in fakefleet/.
+
+Replays an events.csv timeline (or a synthetic one) into a scratch
+swarm_config.json while apply_from_json.py / watch_from_json.py runs on the
+fake cctl, then reads the fleet log to measure, per event, how long until
+every robot ran the new mode (switch latency), and overall throughput.
+
+    python3 bench_dispatch.py live_stream_logs/<session>/events.csv --robots 2,10,100
+    python3 bench_dispatch.py --synthetic 20 --gap 6 --robots 2,10,100 --bundle
+    python3 bench_dispatch.py --synthetic 20 --dispatcher groups --robots 100 --groups 1,2,4,8
+    FAKECCTL_CONFIG=fleet.json python3 bench_dispatch.py ...   # latency / failure model
+
+Results go to bench_logs/<timestamp>/ (one row per fleet size in results.csv).
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+FAKE = os.path.join(HERE, "fakefleet")
+sys.path.insert(0, FAKE)   # MODE_TO_FILE comes from the dispatcher, which imports cctl
+
+# same mapping as label_to_mode in 10_continuous_classification.py
+LABEL_TO_MODE = {
+    "float": "float", "glide": "glide", "handsup": "glitch", "lefthand": "directional_left",
+    "righthand": "directional_right", "punch": "punch", "slash": "slash", "stillness": "encircling",
+}
+DISPATCHERS = {"apply": "apply_from_json.py", "watch": "watch_from_json.py", "groups": "apply_groups.py"}
+BUNDLE_MODES = sorted(set(LABEL_TO_MODE.values()))
+STARTUP_TIMEOUT = 60.0
+
+
+def load_events(path, speed, limit):
+    """[(offset_sec, mode)] from events.csv (t_start,t_end,label,...), time-compressed by `speed`."""
+    rows = []
+    with open(path) as f:
+        for r in csv.DictReader(f):
+            mode = LABEL_TO_MODE.get(r["label"])
+            if mode:
+                rows.append((float(r["t_end"]), mode))
+    if not rows:
+        return []
+    t0 = rows[0][0]
+    return [((t - t0) / speed, m) for t, m in rows[:limit or None]]
+
+
+def synthetic_events(n, gap, seed):
+    rng = random.Random(seed)
+    modes = sorted(set(LABEL_TO_MODE.values()))
+    return [(i * gap, rng.choice(modes)) for i in range(n)]
+
+
+def write_config(path, mode, groups=None):
+    tmp = path + ".tmp"
+    cfg = {"mode": mode, "timestamp": time.time(), "version": 1, "source": {"type": "bench_dispatch"}}
+    if groups is not None:
+        cfg["groups"] = groups
+    with open(tmp, "w") as f:
+        json.dump(cfg, f)
+    os.replace(tmp, path)
+
+
+def split_groups(robots, k):
+    return {f"g{i}": robots[i::k] for i in range(k)}
+
+
+def group_timeline(events, groups, seed):
+    """Per event, a new mode for every group (each differs from that group's last one)."""
+    rng = random.Random(seed)
+    last, out = {}, []
+    for offset, mode in events:
+        step = {}
+        for g in groups:
+            step[g] = rng.choice([m for m in BUNDLE_MODES if m != last.get(g)])
+        last = step
+        out.append((offset, mode, step))
+    return out
+
+
+def expectations(mode, robots, args, groups=None, step=None):
+    """robot -> (fleet log event, field, value) that means it switched."""
+    if groups is not None:
+        return {r: ("signal", "payload", step[g]) for g, ids in groups.items() for r in ids}
+    if args.bundle:
+        return {r: ("signal", "payload", mode) for r in robots}
+    import apply_from_json   # needs fakefleet on sys.path (cctl import)
+    script = os.path.basename(apply_from_json.MODE_TO_FILE.get(mode, ""))
+    return {r: ("start", "script", script) for r in robots}
+
+
+def read_log(path):
+    out = []
+    try:
+        with open(path) as f:
+            for line in f:
+                out.append(json.loads(line))
+    except OSError:
+        pass
+    return out
+
+
+def wait_for(pred, timeout, step=0.1):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        if pred():
+            return True
+        time.sleep(step)
+    return False
+
+
+def run_one(n, events, args, out_dir, k=None):
+    robots = list(range(1, n + 1))
+    tag = f"{n}" if k is None else f"{n}x{k}"
+    work = tempfile.mkdtemp(prefix=f"bench_{tag}_")
+    cfg_path = os.path.join(work, "swarm_config.json")
+    log_path = os.path.join(work, "fleet.jsonl")
+    env = dict(os.environ,
+               PYTHONPATH=FAKE + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               PATH=os.path.join(FAKE, "bin") + os.pathsep + os.environ.get("PATH", ""),
+               ROBOTS=" ".join(map(str, robots)),
+               FAKECCTL_ROBOTS=str(n),
+               FAKECCTL_STATE=os.path.join(work, "fleet_state.json"),
+               FAKECCTL_LOG=log_path,
+               SWARM_CONFIG=cfg_path,
+               SWARM_HINT=os.path.join(work, "swarm_hint.json"),
+               DEPLOY_CACHE=os.path.join(work, "deploy_cache.json"),
+               DISPATCH_LOGS=os.path.join(out_dir, f"dispatch_{tag}"),
+               METRICS_PORT="0",
+               PYTHONUNBUFFERED="1")
+    if args.bundle:
+        env["BUNDLE"] = "1"
+    if args.seed is not None:
+        env.setdefault("FAKECCTL_SEED", str(args.seed))
+    groups = None
+    if k is not None:
+        groups = split_groups(robots, k)
+        env["SWARM_GROUPS"] = os.path.join(work, "swarm_groups.json")
+        with open(env["SWARM_GROUPS"], "w") as f:
+            json.dump({"groups": groups}, f)
+        timeline = group_timeline(events, groups, args.seed)
+    else:
+        timeline = [(offset, mode, None) for offset, mode in events]
+
+    stdout = open(os.path.join(out_dir, f"dispatcher_{tag}.log"), "w")
+    proc = subprocess.Popen([sys.executable, DISPATCHERS[args.dispatcher]], cwd=HERE, env=env,
+                            stdout=stdout, stderr=subprocess.STDOUT)
+    try:
+        if args.dispatcher != "watch":
+            # apply_from_json powers everything on before it polls; apply_groups also starts the bundle
+            ready = "start" if args.dispatcher == "groups" else "on"
+            ok = wait_for(lambda: sum(e["event"] == ready for e in read_log(log_path)) >= n, STARTUP_TIMEOUT)
+            if not ok:
+                print(f"[WARN] {tag}: fleet not ready after {STARTUP_TIMEOUT:.0f}s")
+        sent = []
+        t0 = time.time()
+        for offset, mode, step in timeline:
+            time.sleep(max(0.0, t0 + offset - time.time()))
+            write_config(cfg_path, mode, step)
+            sent.append((time.time(), expectations(mode, robots, args, groups, step)))
+        time.sleep(args.tail)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        stdout.close()
+    row = analyze(sent, read_log(log_path), robots)
+    row["groups"] = k or 1
+    return row
+
+
+def analyze(sent, log, robots):
+    latencies, missed = [], 0
+    ends = [t for t, _ in sent[1:]] + [float("inf")]
+    for (t_sent, expect), t_next in zip(sent, ends):
+        done = {}
+        for e in log:
+            if not (t_sent <= e["t"] < t_next) or e["robot"] in done:
+                continue
+            want = expect.get(e["robot"])
+            if want and e["event"] == want[0] and e.get(want[1]) == want[2]:
+                done[e["robot"]] = e["t"]
+        if len(done) == len(robots):
+            latencies.append(max(done.values()) - t_sent)
+        else:
+            missed += 1   # superseded before every robot switched, or failed
+    span = (sent[-1][0] - sent[0][0]) if len(sent) > 1 else 0.0
+    cmds = [e for e in log if e["event"] in ("on", "pause", "start", "update", "signal")]
+    cmd_span = (cmds[-1]["t"] - cmds[0]["t"]) if len(cmds) > 1 else 0.0
+    latencies.sort()
+
+    def q(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+
+    return {
+        "robots": len(robots),
+        "events": len(sent),
+        "switched": len(latencies),
+        "missed": missed,
+        "lat_p50": q(0.5),
+        "lat_p90": q(0.9),
+        "lat_max": latencies[-1] if latencies else float("nan"),
+        "switches_per_min": 60.0 * len(latencies) / span if span else float("nan"),
+        "robot_cmds_per_sec": len(cmds) / cmd_span if cmd_span else float("nan"),
+        "upload_mb": sum(e.get("bytes", 0) for e in log if e["event"] == "update") / 1e6,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("events", nargs="?", help="events.csv from a live_stream_logs session")
+    ap.add_argument("--robots", default="2,10,100", help="fleet sizes to run, comma separated")
+    ap.add_argument("--dispatcher", choices=sorted(DISPATCHERS), default="apply")
+    ap.add_argument("--bundle", action="store_true", help="run apply_from_json with BUNDLE=1")
+    ap.add_argument("--groups", default="1", help="group counts for --dispatcher groups, comma separated")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed-up for events.csv")
+    ap.add_argument("--max-events", type=int, default=0)
+    ap.add_argument("--synthetic", type=int, default=0, help="N random modes instead of events.csv")
+    ap.add_argument("--gap", type=float, default=5.0, help="seconds between synthetic events")
+    ap.add_argument("--tail", type=float, default=8.0, help="seconds to wait after the last event")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    if args.bundle and args.dispatcher != "apply":
+        ap.error("--bundle needs --dispatcher apply")
+
+    if args.synthetic:
+        events = synthetic_events(args.synthetic, args.gap, args.seed)
+    elif args.events:
+        events = load_events(args.events, args.speed, args.max_events)
+    else:
+        ap.error("give an events.csv or --synthetic N")
+    if not events:
+        sys.exit("no replayable events")
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    ks = [int(x) for x in args.groups.split(",")] if args.dispatcher == "groups" else [None]
+    runs = [(n, k) for n in [int(x) for x in args.robots.split(",")] for k in ks if k is None or k <= n]
+    for n, k in runs:
+        print(f"[BENCH] {args.dispatcher}{' (bundle)' if args.bundle else ''}: "
+              f"{len(events)} events on {n} robots{f' in {k} groups' if k else ''} ...")
+        rows.append(run_one(n, events, args, out_dir, k))
+        r = rows[-1]
+        print(f"[BENCH]   switched {r['switched']}/{r['events']}  latency p50 {r['lat_p50']:.2f}s "
+              f"p90 {r['lat_p90']:.2f}s max {r['lat_max']:.2f}s  {r['switches_per_min']:.1f} switches/min")
+
+    with open(os.path.join(out_dir, "results.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+    print()
+    print("%7s %7s %7s %9s %8s %8s %8s %12s %10s" % ("robots", "groups", "events", "switched", "p50", "p90",
+                                                     "max", "switch/min", "upload MB"))
+    for r in rows:
+        print("%7d %7d %7d %9d %8.2f %8.2f %8.2f %12.1f %10.2f" % (
+            r["robots"], r["groups"], r["events"], r["switched"], r["lat_p50"], r["lat_p90"], r["lat_max"],
+            r["switches_per_min"], r["upload_mb"]))
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
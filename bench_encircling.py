@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Time-to-even-spacing of usr_code_encircling.py, slots vs pairwise repulsion.
+
+Runs the behavior on N robots in swarm_sim.py (virtual time), from random
+starts around the dancer, and measures how long until every ring is evenly
+spaced (sampled every swarm_sim.TRACE_DT):
+
+    spacing error = max over ring gaps of |gap - 2*pi/n| / (2*pi/n)
+    time to even  = first time the error drops below --tol and stays there
+
+    python3 bench_encircling.py                    # 4, 6, 10, 16 robots, 3 seeds
+    python3 bench_encircling.py --robots 10 --seeds 10 --seconds 60
+    python3 bench_encircling.py --layout field     # start anywhere on the field
+
+Also reports the behavior's own CPU per tick (µs of usr() between two delays)
+and the closest approach of two robots on the same ring.
+
+Results go to bench_logs/<timestamp>/encircling.csv.
+"""
+import argparse
+import contextlib
+import csv
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import usr_code_encircling as enc
+from robot_lib import OBST_CX, OBST_CY
+from swarm_sim import Swarm, start_poses
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+
+
+def ring_of(vid):
+    return enc.R_INNER if vid % 2 == 0 else enc.R_OUTER
+
+
+def spacing_error(rows):
+    """Worst relative gap error over both rings, and the closest same-ring pair (m), for one trace instant."""
+    worst, closest = 0.0, float("inf")
+    for R in (enc.R_INNER, enc.R_OUTER):
+        ring = [(x, y) for vid, x, y in rows if ring_of(vid) == R]
+        if len(ring) < 2:
+            continue
+        angles = sorted(math.atan2(y - OBST_CY, x - OBST_CX) for x, y in ring)
+        ideal = 2.0 * math.pi / len(angles)
+        gaps = [b - a for a, b in zip(angles, angles[1:])] + [angles[0] + 2.0 * math.pi - angles[-1]]
+        worst = max(worst, max(abs(g - ideal) for g in gaps) / ideal)
+        for k, (x, y) in enumerate(ring):
+            for x2, y2 in ring[k + 1:]:
+                closest = min(closest, math.hypot(x - x2, y - y2))
+    return worst, closest
+
+
+def run(n, spacing, layout, seed, seconds, tol):
+    enc.SPACING = spacing
+    swarm = Swarm(start_poses(n, layout, random.Random(seed), enc.OBST_RADIUS), dancer_radius=enc.OBST_RADIUS)
+    report = swarm.run(enc.usr, seconds, trace=True)
+
+    by_t = {}
+    for t, vid, x, y in (row[:4] for row in swarm.trace):
+        by_t.setdefault(t, []).append((vid, x, y))
+    trace = [(t,) + spacing_error(rows) for t, rows in sorted(by_t.items())]
+
+    settled = None
+    for t, err, _ in trace:
+        if err >= tol:
+            settled = None
+        elif settled is None:
+            settled = t
+    return {"robots": n, "spacing": spacing, "layout": layout, "seed": seed,
+            "time_to_even_s": settled, "final_error": trace[-1][1],
+            "closest_same_ring_m": min(c for t, _, c in trace if t > 5.0),
+            "collisions": report["collisions"],
+            "usr_us_per_tick": report["usr_us_per_tick"],
+            "wall_s": report["wall_s"]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--robots", default="4,6,10,16", help="swarm sizes, comma separated")
+    ap.add_argument("--spacing", default="repulsion,slots")
+    ap.add_argument("--layout", default="near", choices=["near", "field"], help="start positions")
+    ap.add_argument("--seeds", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=55.0, help="virtual seconds per run")
+    ap.add_argument("--tol", type=float, default=0.2, help="'even' = every gap within this fraction of 2*pi/n")
+    args = ap.parse_args()
+
+    rows = []
+    cwd = os.getcwd()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for n in [int(x) for x in args.robots.split(",")]:
+            for spacing in args.spacing.split(","):
+                for seed in range(1, args.seeds + 1):
+                    # a fresh directory per run: the behavior appends to ./experiment_log.txt,
+                    # and the previous run's warm-start records would skip this one's warm-up
+                    with tempfile.TemporaryDirectory() as scratch:
+                        os.chdir(scratch)
+                        try:
+                            rows.append(run(n, spacing, args.layout, seed, args.seconds, args.tol))
+                        finally:
+                            os.chdir(cwd)
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "encircling.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("%7s %10s %8s %15s %12s %14s %12s" % ("robots", "spacing", "settled", "time to even s",
+                                                "final err", "closest m", "usr µs/tick"))
+    for n in sorted(set(r["robots"] for r in rows)):
+        for spacing in args.spacing.split(","):
+            rs = [r for r in rows if r["robots"] == n and r["spacing"] == spacing]
+            done = [r["time_to_even_s"] for r in rs if r["time_to_even_s"] is not None]
+            print("%7d %10s %5d/%-2d %15s %12.2f %14.3f %12.1f" % (
+                n, spacing, len(done), len(rs),
+                ("%.1f" % statistics.median(done)) if done else "never",
+                statistics.median(r["final_error"] for r in rs),
+                min(r["closest_same_ring_m"] for r in rs),
+                statistics.mean(r["usr_us_per_tick"] for r in rs)))
+    print("time to even: median over the runs that settled within %.0f s" % args.seconds)
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Golden outputs and timings for the classifier's feature and inference path.
+
+The live loop turns each landmark window into model input with
+pose_features.py (NaN interpolation, per-frame normalization,
+compute_features, column alignment) and then calls clf.predict_proba.
+golden/ pins that path:
+
+    windows.npz    16 landmark windows (40 frames x 99, float32 as MediaPipe
+                   gives them), one clean and one with visibility dropouts
+                   per gesture; synthetic, made by `windows`
+    expected.npz   their feature vectors (model column order) and
+                   probabilities, as `bless` last computed them
+    baseline.json  per-stage timings from `baseline` (machine specific, so
+                   not committed: each machine makes its own)
+
+    python3 bench_features.py                  # check: fail on drift; print timings
+    python3 bench_features.py check --no-speed # numbers only, no timings
+    python3 bench_features.py baseline         # store this machine's timings
+    python3 bench_features.py check --speed    # also fail on a slowdown vs that baseline
+    python3 bench_features.py bless            # after an intended change to the features / model
+    python3 bench_features.py windows          # new golden windows (then bless)
+
+Timings are per window, the fastest of --repeat runs (the least noisy
+estimate), for window lengths --lengths (frames; 40 = the live 2 s at
+20 fps) and predict_proba batch sizes --batches. check exits 1 if a feature
+moves more than FEATURE_RTOL / FEATURE_ATOL or a probability more than
+PROB_ATOL; with --speed, also if a stage takes longer than
+baseline x (1 + --speed-tol) + SPEED_FLOOR_MS.
+Results go to bench_logs/<timestamp>/features.csv.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from pose_features import align_features, compute_features, interpolate_nans, normalize_per_frame
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+GOLDEN_DIR = os.path.join(HERE, "golden")
+WINDOWS_FILE  = os.path.join(GOLDEN_DIR, "windows.npz")
+EXPECTED_FILE = os.path.join(GOLDEN_DIR, "expected.npz")
+BASELINE_FILE = os.path.join(GOLDEN_DIR, "baseline.json")
+MODEL_PATH = os.path.join(HERE, "random_forest_model.pkl")
+
+FPS = 20.0                 # FPS_TARGET of the live loop
+GOLDEN_FRAMES = 40         # WINDOW_SEC * FPS_TARGET
+GESTURES = ["float", "glide", "handsup", "lefthand", "righthand", "punch", "slash", "stillness"]
+FEATURE_RTOL = 1e-7
+FEATURE_ATOL = 1e-9
+PROB_ATOL    = 1e-6
+SPEED_TOL      = 1.0       # --speed: allowed slowdown vs baseline (1.0 = twice as slow)
+SPEED_FLOOR_MS = 0.5       # plus this much, so sub-millisecond stages don't fail on timer noise
+
+# rough standing pose, image coordinates (x right, y down), MediaPipe landmark order
+BASE_POSE = np.array([
+    (0.50, 0.20), (0.51, 0.18), (0.52, 0.18), (0.53, 0.18), (0.49, 0.18), (0.48, 0.18), (0.47, 0.18),
+    (0.54, 0.19), (0.46, 0.19), (0.51, 0.23), (0.49, 0.23),
+    (0.56, 0.32), (0.44, 0.32), (0.58, 0.45), (0.42, 0.45), (0.59, 0.56), (0.41, 0.56),
+    (0.60, 0.58), (0.40, 0.58), (0.59, 0.59), (0.41, 0.59), (0.58, 0.58), (0.42, 0.58),
+    (0.53, 0.58), (0.47, 0.58), (0.54, 0.72), (0.46, 0.72), (0.54, 0.86), (0.46, 0.86),
+    (0.545, 0.88), (0.455, 0.88), (0.55, 0.89), (0.45, 0.89),
+])
+L_ARM, R_ARM = [13, 15, 17, 19, 21], [14, 16, 18, 20, 22]   # elbow, wrist, hand points
+
+
+def _move(pose, idx, to, w):
+    """Move landmarks idx toward `to` (offset of their first point) by weight w (0..1 per frame)."""
+    d = np.asarray(to) - pose[0, idx[0], :2]
+    pose[:, idx, :2] += w[:, None, None] * d
+
+
+def synth_window(gesture, frames, rng, dropouts=False):
+    """(frames, 99) landmark window of a gesture, float32 values, NaN where 'not visible'."""
+    s = np.linspace(0.0, 1.0, frames)
+    ease = 0.5 - 0.5 * np.cos(np.pi * s)
+    pose = np.zeros((frames, 33, 3))
+    pose[:, :, :2] = BASE_POSE
+    pose[:, :, 2] = -0.1 + 0.02 * rng.standard_normal(33)
+    if gesture == "handsup":
+        _move(pose, L_ARM[1:], (0.62, 0.10), ease)
+        _move(pose, R_ARM[1:], (0.38, 0.10), ease)
+        _move(pose, [13], (0.60, 0.22), ease)
+        _move(pose, [14], (0.40, 0.22), ease)
+    elif gesture == "punch":
+        w = np.exp(-((s - 0.5) / 0.12) ** 2)
+        _move(pose, R_ARM[1:], (0.22, 0.34), w)
+        _move(pose, [14], (0.32, 0.34), w)
+    elif gesture == "slash":
+        pose[:, R_ARM[1:], :2] += (np.array([0.30, 0.15]) - BASE_POSE[16]) * (1 - ease)[:, None, None]
+        pose[:, R_ARM[1:], :2] += (np.array([0.62, 0.62]) - BASE_POSE[16]) * ease[:, None, None]
+    elif gesture in ("lefthand", "righthand"):
+        arm, to, elbow = (L_ARM, (0.76, 0.32), 13) if gesture == "lefthand" else (R_ARM, (0.24, 0.32), 14)
+        _move(pose, arm[1:], to, ease)
+        _move(pose, [elbow], (0.5 * (to[0] + BASE_POSE[elbow - 2][0]), 0.33), ease)
+    elif gesture == "float":
+        pose[:, :, 0] += 0.02 * np.sin(2 * np.pi * s)[:, None]
+        _move(pose, L_ARM[1:], (0.66, 0.46), 0.5 * ease)
+        _move(pose, R_ARM[1:], (0.34, 0.46), 0.5 * ease)
+    elif gesture == "glide":
+        pose[:, :, 0] += 0.10 * ease[:, None]
+    pose += 0.003 * rng.standard_normal(pose.shape)
+    A = pose.reshape(frames, 99).astype(np.float32)
+
+    if dropouts:
+        for _ in range(6):   # landmarks not visible for a few frames
+            j, t0 = rng.integers(0, 33), rng.integers(0, frames)
+            A[t0:t0 + rng.integers(1, frames // 4), j * 3:j * 3 + 3] = np.nan
+        A[rng.integers(1, frames - 1)] = np.nan          # a frame without a pose
+        A[:frames // 5, 15 * 3:15 * 3 + 3] = np.nan      # left wrist missing at the start
+        A[:, 31 * 3:31 * 3 + 3] = np.nan                 # a landmark never visible
+    return A
+
+
+def make_windows(frames, seed):
+    """[(name, window)]: every gesture clean and with dropouts."""
+    rng = np.random.default_rng(seed)
+    return [("%s%s" % (g, "_dropout" if d else ""), synth_window(g, frames, rng, d))
+            for g in GESTURES for d in (False, True)]
+
+
+def _sklearn_version():
+    import sklearn
+    return sklearn.__version__
+
+
+def load_model():
+    clf = joblib.load(MODEL_PATH)
+    return clf, list(getattr(clf, "feature_names_in_", []))
+
+
+def features_of(window, cols):
+    """What the live loop does to one window up to the model row."""
+    A = window.astype(float)   # the live buffer is float64
+    A = normalize_per_frame(interpolate_nans(A))
+    feat = compute_features(A, 1.0 / FPS)
+    return align_features(feat, cols or list(feat.keys()))
+
+
+def outputs(clf, cols, windows):
+    """(features (n x cols), probs (n x classes)) of the golden windows."""
+    feats = np.array([features_of(w, cols) for w in windows])
+    probs = clf.predict_proba(pd.DataFrame(feats, columns=cols))
+    return feats, probs
+
+
+def compare(clf, cols):
+    """Golden check; returns a list of failure lines."""
+    g = np.load(WINDOWS_FILE)
+    e = np.load(EXPECTED_FILE, allow_pickle=False)
+    fails = []
+    if list(e["columns"]) != cols:
+        return ["model columns differ from the golden ones (new model?  bless)"]
+    if list(e["classes"]) != [str(c) for c in clf.classes_]:
+        return ["model classes differ from the golden ones (new model?  bless)"]
+    feats, probs = outputs(clf, cols, list(g["windows"]))
+    bad = ~np.isclose(feats, e["features"], rtol=FEATURE_RTOL, atol=FEATURE_ATOL)
+    for i, j in zip(*np.nonzero(bad)):
+        fails.append("features: %s %s = %.12g, golden %.12g" % (g["names"][i], cols[j], feats[i, j], e["features"][i, j]))
+    diff = np.abs(probs - e["probs"])
+    for i in np.nonzero(diff.max(axis=1) > PROB_ATOL)[0]:
+        fails.append("probs: %s max diff %.3g (top %s, golden %s)" % (
+            g["names"][i], diff[i].max(), clf.classes_[probs[i].argmax()], clf.classes_[e["probs"][i].argmax()]))
+    print("[GOLDEN] %d windows: features max |diff| %.3g, probs max |diff| %.3g -> %s" % (
+        len(feats), np.abs(feats - e["features"]).max(), diff.max(), "FAIL" if fails else "ok"))
+    return fails
+
+
+def _min_ms(fn, repeat, per):
+    fn()   # warm-up
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return 1000 * min(runs) / per
+
+
+def timings(clf, cols, lengths, batches, repeat, seed=7):
+    """[{stage, frames, batch, ms_per_window}] for every stage, window length and batch size."""
+    rows = []
+    for n in lengths:
+        wins = [w.astype(float) for _, w in make_windows(n, seed)]
+        filled = [interpolate_nans(w.copy()) for w in wins]
+        normed = [normalize_per_frame(w) for w in filled]
+        dt = 1.0 / FPS
+        stages = [
+            ("interpolate", lambda: [interpolate_nans(w.copy()) for w in wins]),
+            ("normalize", lambda: [normalize_per_frame(w) for w in filled]),
+            ("features", lambda: [compute_features(w, dt) for w in normed]),
+            ("window_to_row", lambda: [features_of(w, cols) for w in wins]),
+        ]
+        for name, fn in stages:
+            rows.append({"stage": name, "frames": n, "batch": 1, "ms_per_window": _min_ms(fn, repeat, len(wins))})
+        for b in batches:
+            X = pd.DataFrame([features_of(wins[i % len(wins)], cols) for i in range(b)], columns=cols)
+            rows.append({"stage": "predict_proba", "frames": n, "batch": b,
+                         "ms_per_window": _min_ms(lambda: clf.predict_proba(X), repeat, b)})
+            batch = [wins[i % len(wins)] for i in range(b)]
+            rows.append({"stage": "end_to_end", "frames": n, "batch": b, "ms_per_window": _min_ms(
+                lambda: clf.predict_proba(pd.DataFrame([features_of(w, cols) for w in batch], columns=cols)),
+                repeat, b)})
+    return rows
+
+
+def _key(r):
+    return "%s@%dx%d" % (r["stage"], r["frames"], r["batch"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", nargs="?", default="check", choices=["check", "baseline", "bless", "windows"])
+    ap.add_argument("--lengths", default="20,40,80", help="window lengths in frames, comma separated")
+    ap.add_argument("--batches", default="1,8,32", help="predict_proba batch sizes, comma separated")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--speed", action="store_true", help="check: fail on a slowdown vs this machine's baseline")
+    ap.add_argument("--speed-tol", type=float, default=SPEED_TOL, help="allowed slowdown vs baseline (1.0 = +100%%)")
+    ap.add_argument("--no-speed", action="store_true", help="check numbers only, no timings")
+    ap.add_argument("--seed", type=int, default=1, help="for `windows`")
+    args = ap.parse_args()
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+
+    if args.cmd == "windows":
+        wins = make_windows(GOLDEN_FRAMES, args.seed)
+        np.savez_compressed(WINDOWS_FILE, names=np.array([n for n, _ in wins]), windows=np.stack([w for _, w in wins]))
+        print("[GOLDEN] wrote %d windows to %s; run `bless` next" % (len(wins), WINDOWS_FILE))
+        return
+
+    clf, cols = load_model()
+    if args.cmd == "bless":
+        g = np.load(WINDOWS_FILE)
+        feats, probs = outputs(clf, cols, list(g["windows"]))
+        np.savez_compressed(EXPECTED_FILE, columns=np.array(cols), classes=np.array([str(c) for c in clf.classes_]),
+                            features=feats, probs=probs)
+        for name, p in zip(g["names"], probs):
+            print("  %-20s -> %-10s %.2f" % (name, clf.classes_[p.argmax()], p.max()))
+        print("[GOLDEN] wrote %s (numpy %s, scikit-learn %s)" % (EXPECTED_FILE, np.__version__, _sklearn_version()))
+        return
+
+    fails = compare(clf, cols) if args.cmd == "check" else []
+    rows = []
+    if args.cmd == "baseline" or not args.no_speed:
+        rows = timings(clf, cols, [int(x) for x in args.lengths.split(",")],
+                       [int(x) for x in args.batches.split(",")], args.repeat)
+
+    if args.cmd == "baseline":
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"machine": platform.node(), "processor": platform.processor() or platform.machine(),
+                       "python": platform.python_version(), "numpy": np.__version__,
+                       "sklearn": _sklearn_version(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "ms_per_window": dict((_key(r), round(r["ms_per_window"], 4)) for r in rows)}, f, indent=2)
+    base = {}
+    if rows and args.cmd == "check" and args.speed:
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                b = json.load(f)
+            base = b["ms_per_window"]
+            if b.get("machine") != platform.node():
+                print("[WARN] baseline is from %s, this is %s: timings not checked (run `baseline`)" % (
+                    b.get("machine"), platform.node()))
+                base = {}
+        else:
+            print("[WARN] no %s yet (run `baseline`); timings not checked" % BASELINE_FILE)
+
+    if rows:
+        print("%14s %7s %6s %10s %11s %8s" % ("stage", "frames", "batch", "ms/window", "baseline", "ratio"))
+        for r in rows:
+            b = base.get(_key(r))
+            r["baseline_ms"] = b
+            slow = b is not None and r["ms_per_window"] > b * (1 + args.speed_tol) + SPEED_FLOOR_MS
+            if slow:
+                fails.append("speed: %s %.3f ms/window, baseline %.3f" % (_key(r), r["ms_per_window"], b))
+            print("%14s %7d %6d %10.3f %11s %8s%s" % (r["stage"], r["frames"], r["batch"], r["ms_per_window"],
+                                                     "%.3f" % b if b is not None else "-",
+                                                     "%.2f" % (r["ms_per_window"] / b) if b else "-",
+                                                     "  SLOWER" if slow else ""))
+        out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "features.csv"), "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=["stage", "frames", "batch", "ms_per_window", "baseline_ms"])
+            w.writeheader()
+            w.writerows(rows)
+        print("results:", out_dir)
+    if args.cmd == "baseline":
+        print("[GOLDEN] wrote", BASELINE_FILE)
+
+    for line in fails:
+        print("[FAIL]", line)
+    if fails:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Mode delivery under signal loss: send once, fixed resends, acked (mode_delivery.py).
+
+Drives ModeDelivery in-process against the simulated fleet in fakefleet/
+(every robot already running the bundle) and changes the mode every --gap
+seconds. Per change and robot, the fleet log tells whether and when the
+robot acted on the new mode; sends are counted per robot (a broadcast
+counts once per robot).
+
+    once    - one broadcast, nothing else (fire-and-forget)
+    resend  - broadcast, then again after 1 s and 2 s (the old BUNDLE_RESEND)
+    acked   - broadcast, then direct signals to the robots that have not acked
+
+    python3 bench_mode_delivery.py                          # 10 robots, 0 / 5 / 20 % loss
+    python3 bench_mode_delivery.py --robots 30 --loss 0.1 --changes 30
+
+Acks are lost at the same rate as signals. --robot-id vid runs robots that
+ack with a virtual id different from their cctl id (no robot.id). Results
+go to bench_logs/<timestamp>/mode_delivery.csv.
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(HERE, "fakefleet"))
+
+import mode_delivery   # noqa: E402
+from cctl.fleet import Fleet, load_config   # noqa: E402
+
+STRATEGIES = ("once", "resend", "acked")
+MODES = ["glitch", "encircling", "float", "glide"]
+
+
+class FleetClient:
+    """The CctlClient surface ModeDelivery uses, on an in-process Fleet, counting sends."""
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.net = self
+        self.sends = 0
+
+    def add_slot(self, name, handler):
+        self.fleet.host_slots[name] = handler
+
+    def signal(self, slot, payload):
+        self.sends += len(self.fleet.on)
+        self.fleet.signal(slot, payload)
+
+    def direct_signal(self, slot, robot, payload):
+        self.sends += 1
+        self.fleet.signal(slot, payload, robots=[robot])
+
+
+async def run(strategy, n, loss, changes, gap, seed, work, robot_id="cctl"):
+    cfg = load_config()
+    cfg.update(robots=n, seed=seed, robot_id=robot_id)
+    cfg["fail_rate"] = dict((k, 0.0) for k in cfg["fail_rate"])
+    cfg["fail_rate"]["signal"] = loss
+    log_path = os.path.join(work, "fleet_%s_%g_%s.jsonl" % (strategy, loss, robot_id))
+    fleet = Fleet(cfg, state_path=os.path.join(work, "state.json"), log_path=log_path)
+    fleet.loop = asyncio.get_running_loop()
+    fleet.on = set(fleet.ids)
+    fleet.running = {r: cfg["bundle"] for r in fleet.ids}
+    client = FleetClient(fleet)
+    robots = sorted(fleet.ids)
+
+    md = mode_delivery.ModeDelivery(client)
+    mode_delivery.FALLBACK_RESEND = (1.0, 2.0) if strategy == "resend" else ()
+    if strategy == "acked":
+        md.attach()
+
+    sent = []   # (t_sent, mode, seq)
+    done = []   # Delivery per change (acked strategy)
+    for k in range(changes):
+        mode = MODES[k % len(MODES)]
+        t0 = time.time()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            d = await md.deliver(mode, robots)
+        if d is not None:
+            done.append(d)
+        sent.append((t0, mode, str(md.seq)))
+        await asyncio.sleep(max(0.0, t0 + gap - time.time()))
+    await asyncio.sleep(0.5)   # last arrivals
+
+    acted = {}   # seq -> {robot: t}
+    with open(log_path) as f:
+        for line in f:
+            e = json.loads(line)
+            if e["event"] == "signal" and e.get("seq") is not None:
+                acted.setdefault(e["seq"], {}).setdefault(e["robot"], e["t"])
+    lat, missed = [], 0
+    for t0, _, seq in sent:
+        got = acted.get(seq, {})
+        missed += n - len(got)
+        lat.extend(t - t0 for t in got.values())
+    lat.sort()
+    first = changes * n
+    return {
+        "strategy": strategy, "robot_id": robot_id, "robots": n, "loss": loss, "changes": changes,
+        "delivered": 1.0 - missed / float(first),
+        "missed": missed,
+        "lat_p50_ms": 1000 * statistics.median(lat) if lat else float("nan"),
+        "lat_p95_ms": 1000 * lat[min(len(lat) - 1, int(0.95 * len(lat)))] if lat else float("nan"),
+        "lat_max_ms": 1000 * lat[-1] if lat else float("nan"),
+        "sends_per_change": client.sends / float(changes),
+        "retransmit_frac": (client.sends - first) / float(client.sends),
+        "missing_reported": sum(len(d.pending) for d in done),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--robots", type=int, default=10)
+    ap.add_argument("--loss", default="0,0.05,0.2", help="signal loss rates, comma separated")
+    ap.add_argument("--strategies", default=",".join(STRATEGIES))
+    ap.add_argument("--changes", type=int, default=10, help="mode changes per run")
+    ap.add_argument("--gap", type=float, default=3.5, help="seconds between mode changes")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--robot-id", default="cctl", help='id robots ack with: "cctl", "vid" or "cctl,vid"')
+    args = ap.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work:
+        for robot_id in args.robot_id.split(","):
+            for loss in [float(x) for x in args.loss.split(",")]:
+                for strategy in args.strategies.split(","):
+                    rows.append(asyncio.run(run(strategy, args.robots, loss, args.changes, args.gap,
+                                                args.seed, work, robot_id)))
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "mode_delivery.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("%d robots, %d mode changes per run, %.1f s apart" % (args.robots, args.changes, args.gap))
+    print("%5s %6s %8s %10s %7s %9s %9s %9s %12s %11s %9s" % ("ids", "loss", "strategy", "delivered", "missed",
+                                                              "p50 ms", "p95 ms", "max ms", "sends/chg",
+                                                              "retransmit", "unacked"))
+    for r in rows:
+        print("%5s %5.0f%% %8s %9.1f%% %7d %9.0f %9.0f %9.0f %12.1f %10.0f%% %9d" % (
+            r["robot_id"], 100 * r["loss"], r["strategy"], 100 * r["delivered"], r["missed"], r["lat_p50_ms"],
+            r["lat_p95_ms"], r["lat_max_ms"], r["sends_per_change"], 100 * r["retransmit_frac"],
+            r["missing_reported"]))
+    print("unacked: robots the dispatcher still had pending at the deadline (acked strategy)")
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Per-tick cost of the glitch neighbor repulsion, old loop vs scan vs grid.
+
+Every glitch tick each robot turns the swarm pose snapshot into a repulsion
+force. The old loop did the full distance math for every neighbor. Now
+robot_lib.nearby_neighbors hands a robot's first query of a snapshot the
+whole list, which neighbor_force scans with a cheap box reject; the second
+query of the same snapshot buckets it into GRID_CELL-sized cells once and
+every query after that only visits the 3x3 cells around the robot.
+
+    python3 bench_neighbors.py                    # 3..200 robots
+    python3 bench_neighbors.py --robots 10,100,400 --seconds 0.5
+
+Columns, per robot and tick (µs):
+    all_pairs   the old loop over the full snapshot
+    scan        box-reject scan of the full snapshot (a real robot: it gets a
+                fresh pose list every tick, so the first-query path)
+    own_grid    each robot building a grid for its one query (why the first
+                query does not index: this is no cheaper than the old loop)
+    shared      nearby_neighbors with every robot querying the same snapshot
+                (one process stepping the whole swarm, e.g. a simulator)
+"swarm ms" is per-robot x N, the CPU a whole swarm tick costs; the robots' own
+tick is LOOP_DT_MS. Two layouts: "field" spreads N robots over the real field
+(density grows with N), "density" grows the field with N so robots keep the
+spacing of 10 robots on the real field.
+
+Results go to bench_logs/<timestamp>/neighbors.csv.
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import time
+
+import usr_code_glitch as glitch
+from robot_lib import X_MAX, X_MIN, Y_MAX, Y_MIN, grid_near, nearby_neighbors, neighbor_grid
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+BASE_ROBOTS = 10   # "density" layout keeps the spacing of this many robots on the real field
+
+
+def all_pairs_force(x, y, vid, neighbors):
+    """The neighbor loop usr_code_glitch.py ran before the grid (reference)."""
+    vx = vy = 0.0
+    for item in neighbors:
+        if isinstance(item, (list, tuple)) and len(item) >= 3:
+            if len(item) == 4:
+                nid, nx, ny, _ = item
+            else:
+                nx, ny = item[0], item[1]
+                nid = None
+            if (nid is not None) and (str(nid) == str(vid)):
+                continue
+            dxn = x - nx
+            dyn = y - ny
+            d2 = dxn * dxn + dyn * dyn
+            if d2 < 1e-12:
+                continue
+            if d2 < (glitch.REPULSE_RADIUS * glitch.REPULSE_RADIUS):
+                s = glitch.REPULSE_GAIN / d2
+                vx += s * dxn
+                vy += s * dyn
+            d = math.sqrt(d2)
+            if d < glitch.HARD_REP_RADIUS:
+                s_hard = glitch.HARD_REP_GAIN / (d2 * d + 1e-9)
+                vx += s_hard * dxn
+                vy += s_hard * dyn
+    return vx, vy
+
+
+def snapshot(n, layout, rng):
+    """[(id, x, y, th)] like get_swarm_poses()."""
+    scale = math.sqrt(n / float(BASE_ROBOTS)) if layout == "density" else 1.0
+    cx, cy = (X_MIN + X_MAX) / 2.0, (Y_MIN + Y_MAX) / 2.0
+    hw, hh = (X_MAX - X_MIN) / 2.0 * scale, (Y_MAX - Y_MIN) / 2.0 * scale
+    return [(i, rng.uniform(cx - hw, cx + hw), rng.uniform(cy - hh, cy + hh), rng.uniform(-math.pi, math.pi))
+            for i in range(1, n + 1)]
+
+
+def per_robot_us(fn, poses, seconds):
+    """Average µs per robot of fn(poses) called once per swarm tick."""
+    ticks, t0 = 0, time.perf_counter()
+    while True:
+        fn(poses)
+        ticks += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            return 1e6 * elapsed / (ticks * len(poses))
+
+
+def run(n, layout, seconds, seed):
+    poses = snapshot(n, layout, random.Random(seed))
+    cell = glitch.GRID_CELL
+
+    def old(ps):
+        for vid, x, y, _ in ps:
+            all_pairs_force(x, y, vid, ps)
+
+    def scan(ps):
+        for vid, x, y, _ in ps:
+            glitch.neighbor_force(x, y, vid, ps)
+
+    def own_grid(ps):
+        for vid, x, y, _ in ps:
+            glitch.neighbor_force(x, y, vid, grid_near(neighbor_grid(ps, cell), x, y, cell))
+
+    def shared(ps):
+        ps = list(ps)   # a new snapshot each swarm tick
+        for vid, x, y, _ in ps:
+            glitch.neighbor_force(x, y, vid, nearby_neighbors(ps, x, y, cell))
+
+    g = neighbor_grid(poses, cell)
+    visited = sum(len(grid_near(g, x, y, cell)) - 1 for _, x, y, _ in poses) / float(n)
+    diff = 0.0
+    for vid, x, y, _ in poses:
+        a = all_pairs_force(x, y, vid, poses)
+        for b in (glitch.neighbor_force(x, y, vid, poses),
+                  glitch.neighbor_force(x, y, vid, grid_near(g, x, y, cell))):
+            diff = max(diff, abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+    row = {"robots": n, "layout": layout, "visited": visited,
+           "all_pairs_us": per_robot_us(old, poses, seconds),
+           "scan_us": per_robot_us(scan, poses, seconds),
+           "own_grid_us": per_robot_us(own_grid, poses, seconds),
+           "shared_us": per_robot_us(shared, poses, seconds),
+           "max_force_diff": diff}
+    row["swarm_ms_all_pairs"] = row["all_pairs_us"] * n / 1e3
+    row["swarm_ms_scan"] = row["scan_us"] * n / 1e3
+    row["swarm_ms_shared"] = row["shared_us"] * n / 1e3
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--robots", default="3,5,10,20,50,100,200", help="swarm sizes, comma separated")
+    ap.add_argument("--layouts", default="field,density")
+    ap.add_argument("--seconds", type=float, default=0.3, help="timing budget per measurement")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rows = []
+    for layout in args.layouts.split(","):
+        for n in [int(x) for x in args.robots.split(",")]:
+            rows.append(run(n, layout, args.seconds, args.seed))
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "neighbors.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("%7s %8s %8s %10s %8s %9s %8s %12s %12s %12s" % (
+        "robots", "layout", "visited", "all_pairs", "scan", "own_grid", "shared",
+        "swarm ms old", "swarm ms scan", "ms shared"))
+    for r in rows:
+        print("%7d %8s %8.1f %10.1f %8.1f %9.1f %8.1f %12.2f %12.2f %12.2f" % (
+            r["robots"], r["layout"], r["visited"], r["all_pairs_us"], r["scan_us"], r["own_grid_us"],
+            r["shared_us"], r["swarm_ms_all_pairs"], r["swarm_ms_scan"], r["swarm_ms_shared"]))
+    print("max |force difference| vs all-pairs: %.2e" % max(r["max_force_diff"] for r in rows))
+    print("tick budget: %d ms per robot (LOOP_DT_MS)" % glitch.LOOP_DT_MS)
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
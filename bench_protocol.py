@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Radio traffic and follower CPU of the MSI mode/LED relay, old vs compact protocol.
+
+msi_format_usr_code.py used to have the leader broadcast a 32-byte 'iffffiii'
+struct (id, pose, speed, LED) every 0.1 s with a logger.info per send, and
+every follower unpacked each message it got before looking at the sender id.
+Now the leader sends an 11-byte robot_lib state packet only when the state
+changes (plus CHANGE_REPEATS quick repeats) and then every KEEPALIVE_S, and
+followers drop other senders and repeats on the 4 header bytes.
+
+    python3 bench_protocol.py                          # 5 min session, a mode change every 10 s
+    python3 bench_protocol.py --change-every 3 --seconds 600
+
+Traffic is counted by stepping the real leader code (leader_apply /
+leader_packet) through the session on a virtual clock. Follower CPU is the
+real follower_msg (and the old loop body, kept here as reference) over the
+message stream a follower would receive, including set_led and the
+logger.info calls, with the log going to /dev/null; "foreign" messages are
+ones from other senders on the same radio (--foreign per second).
+
+Results go to bench_logs/<timestamp>/protocol.csv.
+"""
+import argparse
+import csv
+import logging
+import os
+import struct
+import time
+
+import msi_format_usr_code as msi
+from robot_lib import PROTO_HOST, pack_state
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+OLD_FMT = 'iffffiii'   # ID, x, y, dx, dy, led_r, led_g, led_b
+COLORS = [[100, 0, 100], [100, 0, 0], [0, 100, 0], [100, 100, 0]]   # the MODE_COLORS, robot scale
+
+
+def old_follower_msg(msg_raw, current_led, bot, logger):
+    """The follower loop body msi_format_usr_code.py ran before (reference)."""
+    if len(msg_raw) >= 32:
+        message = struct.unpack(OLD_FMT, msg_raw[:32])
+        if message[0] == msi.LEADER_ID:
+            new_led = [message[5], message[6], message[7]]
+            msi.copy_list(new_led, current_led)
+            bot.set_led(current_led[0], current_led[1], current_led[2])
+            logger.info("Follower %d updated LED: %s" % (bot.id, current_led))
+
+
+class NullBot(object):
+    id = 3
+
+    def set_led(self, r, g, b):
+        pass
+
+
+def changes(seconds, every):
+    """[(t, led)] mode changes of the session."""
+    out, t, k = [], 0.0, 0
+    while t < seconds:
+        out.append((t, COLORS[k % len(COLORS)]))
+        t += every
+        k += 1
+    return out
+
+
+def old_streams(seconds, every, logger):
+    """(controller -> leader packets, leader -> followers packets) of the old protocol."""
+    ctl = [("0.0,0.0;" + ",".join(str(int(v * 255 / 100)) for v in led)).encode("ascii")
+           for _, led in changes(seconds, every)]
+    ticks = int(round(seconds / msi.LOOP_DT))
+    led = [0, 0, 0]
+    todo = changes(seconds, every)
+    out = []
+    for i in range(ticks):
+        now = i * msi.LOOP_DT
+        while todo and todo[0][0] <= now:
+            led = todo.pop(0)[1]
+        out.append(struct.pack(OLD_FMT, msi.LEADER_ID, 0.1, 0.2, 0, 0, led[0], led[1], led[2]))
+        logger.info("Leader broadcasting LED: %s" % led)
+    return ctl, out
+
+
+def new_streams(seconds, every, keepalive_ctl=2.0):
+    """The same for the compact protocol, stepping the real leader code.
+
+    keepalive_ctl is msi_format_controller_script.KEEPALIVE_S (that module needs cctl).
+    """
+    st = msi.new_leader()
+    ticks = int(round(seconds / msi.LOOP_DT))
+    todo = changes(seconds, every)
+    ctl, out = [], []
+    seq, packet, last_sent = 0, None, 0.0
+    for i in range(ticks):
+        now = i * msi.LOOP_DT
+        if todo and todo[0][0] <= now:
+            seq += 1
+            packet = pack_state(PROTO_HOST, seq, 0.0, 0.0, todo.pop(0)[1])
+            send = True
+        else:
+            send = packet is not None and now - last_sent >= keepalive_ctl
+        if send:
+            ctl.append(packet)
+            last_sent = now
+            msi.leader_apply(st, packet)
+        pkt = msi.leader_packet(st, msi.LEADER_ID, now)
+        if pkt is not None:
+            out.append(pkt)
+    return ctl, out
+
+
+def foreign(n, old):
+    """n messages from another sender (robot 7), in the given protocol."""
+    if old:
+        return [struct.pack(OLD_FMT, 7, 0.0, 0.0, 0, 0, 1, 2, 3)] * n
+    return [pack_state(7, 1, 0.0, 0.0, [1, 2, 3])] * n
+
+
+def cpu_us(fn, msgs, repeat):
+    """Best-of-repeat µs to run fn over the whole stream."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(msgs)
+        best = min(best, time.perf_counter() - t0)
+    return 1e6 * best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=300.0, help="session length")
+    ap.add_argument("--change-every", type=float, default=10.0, help="seconds between mode changes")
+    ap.add_argument("--foreign", type=float, default=10.0, help="messages per second from other senders")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    logger = logging.getLogger("bench_protocol")
+    logger.propagate = False
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    bot = NullBot()
+
+    n_foreign = int(args.foreign * args.seconds)
+    rows = []
+    for name in ("old", "compact"):
+        if name == "old":
+            t0 = time.perf_counter()
+            ctl, lead = old_streams(args.seconds, args.change_every, logger)
+            leader_us = 1e6 * (time.perf_counter() - t0)
+            other = foreign(n_foreign, True)
+            led = [0, 0, 0]
+
+            def follower(msgs):
+                for m in msgs:
+                    old_follower_msg(m, led, bot, logger)
+        else:
+            t0 = time.perf_counter()
+            ctl, lead = new_streams(args.seconds, args.change_every)
+            leader_us = 1e6 * (time.perf_counter() - t0)
+            other = foreign(n_foreign, False)
+
+            def follower(msgs):
+                st = msi.new_follower()
+                for m in msgs:
+                    led = msi.follower_msg(st, m)
+                    if led is not None:
+                        bot.set_led(led[0], led[1], led[2])
+                        logger.info("Follower %d updated LED: %s" % (bot.id, led))
+
+        stream = lead + other
+        rows.append({
+            "protocol": name,
+            "leader_msgs": len(lead), "leader_bytes": sum(len(m) for m in lead),
+            "ctl_msgs": len(ctl), "ctl_bytes": sum(len(m) for m in ctl),
+            "leader_msgs_per_s": len(lead) / args.seconds,
+            "leader_bytes_per_s": sum(len(m) for m in lead) / args.seconds,
+            "follower_us_per_msg": cpu_us(follower, stream, args.repeat) / len(stream),
+            "follower_us_per_leader_msg": cpu_us(follower, lead, args.repeat) / len(lead),
+            "follower_us_per_foreign_msg": cpu_us(follower, other, args.repeat) / max(1, len(other)),
+            "follower_cpu_ms_per_s": cpu_us(follower, stream, args.repeat) / 1e3 / args.seconds,
+            "leader_cpu_ms_per_s": leader_us / 1e3 / args.seconds,
+        })
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "protocol.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("%.0f s session, a mode change every %.0f s, %.0f foreign msg/s" % (
+        args.seconds, args.change_every, args.foreign))
+    print("%9s %12s %12s %12s %14s %14s %14s %14s" % (
+        "protocol", "leader msg/s", "leader B/s", "ctl msgs", "µs/msg", "µs/leader msg",
+        "µs/foreign", "follower ms/s"))
+    for r in rows:
+        print("%9s %12.2f %12.1f %12d %14.2f %14.2f %14.2f %14.3f" % (
+            r["protocol"], r["leader_msgs_per_s"], r["leader_bytes_per_s"], r["ctl_msgs"],
+            r["follower_us_per_msg"], r["follower_us_per_leader_msg"], r["follower_us_per_foreign_msg"],
+            r["follower_cpu_ms_per_s"]))
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
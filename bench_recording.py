@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Memory, disk and CPU of the live classifier's recording modes.
+
+Feeds a synthetic 640x480 camera stream (textured background, a moving
+figure, sensor noise) at FPS_TARGET on a virtual clock through the same
+recording code as 10_continuous_classification.py, with an event every
+--event-every seconds:
+
+    full         raw.mp4, every frame (the old default)
+    downsampled  raw.mp4, every 4th frame at half size (RAW_EVERY=4 RAW_SCALE=0.5)
+    clips        clips only (CLIPS=1 RECORD_RAW=0), ring kept as JPEG
+    clips-raw    clips only, ring kept as raw frames (CLIP_JPEG=None)
+
+    python3 bench_recording.py                        # 2 min session, an event every 20 s
+    python3 bench_recording.py --seconds 600 --event-every 60 --pre 5 --post 3
+
+Reported: pre-roll ring peak (MB), disk written (MB, and per hour of
+session), frame-loop time per frame spent on recording (ms; clip encoding
+runs on writer threads) and total process CPU per frame (ms, all threads).
+Results go to bench_logs/<timestamp>/recording.csv.
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from clip_capture import ClipRecorder
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+FPS = 20.0
+SIZE = (640, 480)
+MODES = {
+    # name: (record_raw, raw_every, raw_scale, clips, clip_jpeg)
+    "full":        (True, 1, 1.0, False, None),
+    "downsampled": (True, 4, 0.5, False, None),
+    "clips":       (False, 1, 1.0, True, 85),
+    "clips-raw":   (False, 1, 1.0, True, None),
+}
+
+
+def camera(n_noise=8, seed=1):
+    """frame(i): a textured room with a figure moving across it, plus noise."""
+    rng = np.random.default_rng(seed)
+    w, h = SIZE
+    bg = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (0, 0), 6)
+    bg = cv2.addWeighted(bg, 0.6, np.full_like(bg, 110), 0.4, 0)
+    noise = [rng.integers(-6, 7, (h, w, 3)).astype(np.int16) for _ in range(n_noise)]
+
+    def frame(i):
+        f = bg.copy()
+        x = int(w / 2 + 0.3 * w * np.sin(i / 40.0))
+        arm = int(60 * np.sin(i / 6.0))
+        cv2.rectangle(f, (x - 40, 140), (x + 40, 380), (60, 40, 160), -1)
+        cv2.circle(f, (x, 110), 30, (150, 170, 200), -1)
+        cv2.line(f, (x - 40, 170), (x - 110, 170 + arm), (60, 40, 160), 14)
+        cv2.line(f, (x + 40, 170), (x + 110, 170 - arm), (60, 40, 160), 14)
+        return np.clip(f.astype(np.int16) + noise[i % n_noise], 0, 255).astype(np.uint8)
+
+    return frame
+
+
+def run(mode, seconds, event_every, pre, post, work):
+    record_raw, raw_every, raw_scale, use_clips, clip_jpeg = MODES[mode]
+    out = os.path.join(work, mode)
+    os.makedirs(out, exist_ok=True)
+    frame = camera()
+    raw_size = (int(SIZE[0] * raw_scale), int(SIZE[1] * raw_scale))
+    raw_path = os.path.join(out, "raw.mp4")
+    writer = cv2.VideoWriter(raw_path, cv2.VideoWriter_fourcc(*"mp4v"), FPS / raw_every, raw_size) if record_raw else None
+    clips = ClipRecorder(FPS, SIZE, pre, post, clip_jpeg) if use_clips else None
+
+    n = int(seconds * FPS)
+    loop_s = 0.0
+    cpu0 = time.process_time()
+    gen_cpu = 0.0
+    for i in range(n):
+        g0 = time.process_time()
+        f = frame(i)
+        gen_cpu += time.process_time() - g0
+        t0 = time.perf_counter()
+        if clips is not None and i > 0 and i % int(event_every * FPS) == 0:
+            clips.trigger(os.path.join(out, "clips", "event_%.2f.mp4" % (i / FPS)))
+        if writer is not None and i % raw_every == 0:
+            writer.write(f if raw_scale == 1.0 else cv2.resize(f, raw_size, interpolation=cv2.INTER_AREA))
+        if clips is not None:
+            clips.push(f)
+        loop_s += time.perf_counter() - t0
+    if writer is not None:
+        writer.release()
+    if clips is not None:
+        clips.close()
+    cpu = time.process_time() - cpu0 - gen_cpu
+
+    disk = (os.path.getsize(raw_path) if record_raw else 0) + (clips.clip_bytes() if clips else 0)
+    return {"mode": mode, "seconds": seconds, "events": len(clips.done) if clips else 0,
+            "ring_peak_mb": clips.peak_ring_bytes / 1e6 if clips else 0.0,
+            "disk_mb": disk / 1e6, "disk_mb_per_hour": disk / 1e6 * 3600.0 / seconds,
+            "loop_ms_per_frame": 1000 * loop_s / n, "cpu_ms_per_frame": 1000 * cpu / n}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=120.0, help="session length (virtual)")
+    ap.add_argument("--event-every", type=float, default=20.0)
+    ap.add_argument("--pre", type=float, default=5.0, help="pre-roll s")
+    ap.add_argument("--post", type=float, default=3.0, help="post-roll s")
+    ap.add_argument("--modes", default=",".join(MODES))
+    args = ap.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work:
+        for mode in args.modes.split(","):
+            rows.append(run(mode, args.seconds, args.event_every, args.pre, args.post, work))
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "recording.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("%.0f s session at %.0f fps, an event every %.0f s, clips %.0f s + %.0f s" % (
+        args.seconds, FPS, args.event_every, args.pre, args.post))
+    print("%12s %7s %13s %9s %10s %14s %13s" % ("mode", "events", "ring peak MB", "disk MB", "disk MB/h",
+                                                "loop ms/frame", "cpu ms/frame"))
+    for r in rows:
+        print("%12s %7d %13.1f %9.1f %10.0f %14.2f %13.2f" % (
+            r["mode"], r["events"], r["ring_peak_mb"], r["disk_mb"], r["disk_mb_per_hour"],
+            r["loop_ms_per_frame"], r["cpu_ms_per_frame"]))
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
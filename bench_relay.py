@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Propagation of MSI mode changes with and without the follower relay.
+
+Runs msi_format_usr_code.py in swarm_sim.py on N stationary robots spread
+over a square field (robot 0 is the leader) with a limited send_msg range,
+sends two mode changes to the leader on its 'speed_led' slot, and reads the
+LEDs off the trace (every swarm_sim.TRACE_DT):
+
+    reached      fraction of the robots connected to the leader (within
+                 --radius hops) that show the new LED before the next change
+    propagation  time from the change until the last of those shows it
+    msgs/s       send_msg calls per second, whole run (leader and relays)
+    msgs/change  send_msg calls in the 5 s after a change
+
+    python3 bench_relay.py                               # 10/30/60 robots on 2 m and 4 m fields
+    python3 bench_relay.py --robots 100 --field 5 --radius 0.75 --loss 0.2
+
+Results go to bench_logs/<timestamp>/relay.csv.
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import statistics
+import time
+
+import msi_format_usr_code as msi
+import swarm_sim
+from robot_lib import PROTO_HOST, pack_state
+from swarm_sim import ROBOT_RADIUS, Swarm
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+CHANGES = [(3.0, [100, 0, 100]), (18.0, [0, 100, 0])]   # (t, LED) sent to the leader
+BURST_S = 5.0
+
+
+class CountingSwarm(Swarm):
+    """Swarm that keeps the virtual time of every send_msg."""
+
+    def __init__(self, *args, **kwargs):
+        Swarm.__init__(self, *args, **kwargs)
+        self.sent_at = []
+
+    def broadcast(self, i, payload):
+        self.sent_at.append(self.t_us / 1e6)
+        Swarm.broadcast(self, i, payload)
+
+
+def poses(n, side, rng):
+    out = []
+    while len(out) < n:
+        x, y = rng.uniform(0.0, side), rng.uniform(0.0, side)
+        if all(math.hypot(x - px, y - py) >= 3.0 * ROBOT_RADIUS for px, py, _ in out):
+            out.append((x, y, 0.0))
+    return out
+
+
+def reachable(ps, radius):
+    """Indices connected to robot 0 by hops shorter than radius."""
+    seen, todo = {0}, [0]
+    while todo:
+        i = todo.pop()
+        for j, (x, y, _) in enumerate(ps):
+            if j not in seen and math.hypot(x - ps[i][0], y - ps[i][1]) <= radius:
+                seen.add(j)
+                todo.append(j)
+    return seen
+
+
+def run(n, side, radius, loss, relay, seed, seconds):
+    msi.RELAY = relay
+    swarm_sim.COMM_RADIUS, swarm_sim.COMM_LOSS = radius, loss
+    ps = poses(n, side, random.Random(seed))
+    swarm = CountingSwarm(ps, ids=range(n))
+    for k, (t, led) in enumerate(CHANGES):
+        swarm.signal_at(t, "speed_led", pack_state(PROTO_HOST, k + 1, 0.0, 0.0, led))
+    report = swarm.run(msi.usr, seconds, trace=True)
+
+    conn = reachable(ps, radius)
+    reached, prop = [], []
+    for k, (t, led) in enumerate(CHANGES):
+        t_end = CHANGES[k + 1][0] if k + 1 < len(CHANGES) else seconds
+        first = {}
+        for row in swarm.trace:
+            if t <= row[0] < t_end and row[1] in conn and row[1] not in first and list(row[7:10]) == led:
+                first[row[1]] = row[0]
+        reached.append(len(first) / float(len(conn)))
+        if len(first) == len(conn):
+            prop.append(max(first.values()) - t)
+    burst = [sum(1 for s in swarm.sent_at if t <= s < t + BURST_S) for t, _ in CHANGES]
+    return {"robots": n, "field_m": side, "density_per_m2": n / side ** 2, "radius_m": radius, "loss": loss,
+            "relay": "on" if relay else "off", "seed": seed, "connected": len(conn),
+            "hops_needed": 1 if all(math.hypot(x - ps[0][0], y - ps[0][1]) <= radius for x, y, _ in ps) else 2,
+            "reached": min(reached), "propagation_s": max(prop) if len(prop) == len(CHANGES) else None,
+            "msgs_per_s": len(swarm.sent_at) / seconds, "msgs_per_change": statistics.mean(burst),
+            "errors": len(report["errors"])}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--robots", default="10,30,60", help="fleet sizes, comma separated")
+    ap.add_argument("--field", default="2,4", help="square field sides in m, comma separated")
+    ap.add_argument("--radius", type=float, default=1.0, help="send_msg range in m")
+    ap.add_argument("--loss", type=float, default=0.1, help="chance one delivery is lost")
+    ap.add_argument("--relay", default="off,on")
+    ap.add_argument("--seeds", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=30.0, help="virtual seconds per run")
+    args = ap.parse_args()
+
+    rows = []
+    for side in [float(x) for x in args.field.split(",")]:
+        for n in [int(x) for x in args.robots.split(",")]:
+            for relay in args.relay.split(","):
+                for seed in range(1, args.seeds + 1):
+                    rows.append(run(n, side, args.radius, args.loss, relay == "on", seed, args.seconds))
+
+    out_dir = os.path.join(HERE, "bench_logs", time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "relay.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("send_msg range %.2f m, %.0f%% delivery loss, %d seeds" % (args.radius, 100 * args.loss, args.seeds))
+    print("%7s %7s %9s %6s %9s %13s %9s %12s" % ("field m", "robots", "robots/m2", "relay", "reached",
+                                                 "propagation s", "msgs/s", "msgs/change"))
+    for side in [float(x) for x in args.field.split(",")]:
+        for n in [int(x) for x in args.robots.split(",")]:
+            for relay in args.relay.split(","):
+                rs = [r for r in rows if r["field_m"] == side and r["robots"] == n and r["relay"] == relay]
+                done = [r["propagation_s"] for r in rs if r["propagation_s"] is not None]
+                print("%7.1f %7d %9.1f %6s %8.0f%% %13s %9.1f %12.1f" % (
+                    side, n, n / side ** 2, relay, 100 * statistics.mean(r["reached"] for r in rs),
+                    ("%.1f (%d/%d)" % (max(done), len(done), len(rs))) if done else "never",
+                    statistics.mean(r["msgs_per_s"] for r in rs),
+                    statistics.mean(r["msgs_per_change"] for r in rs)))
+    print("reached: worst of the two changes, mean over seeds; propagation: worst over the runs that reached all")
+    print("results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
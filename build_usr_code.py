@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Build the robot programs that `cctl update` uploads.
+
+The usr_code_* behaviors import their shared helpers (`from robot_lib import *`),
+but a robot only receives the one file. For every target in TARGETS this:
+
+  - inlines the robot_lib.py definitions the behavior uses (and nothing else)
+  - bakes the target's parameter set in and folds constants into the code
+  - drops definitions usr() never reaches, docstrings and comments
+  - re-indents with one space per level
+
+and writes build/<target>. The dispatchers build on startup and upload from
+build/, so edit the sources, never the built files.
+
+    python3 build_usr_code.py            # build everything, print the size report
+    python3 build_usr_code.py --time     # also time `cctl update` of the full vs built files
+
+"full" in the report is the behavior with all of robot_lib.py pasted in,
+comments and all (what the hand-copied scripts used to look like); it is
+written to build/full/ for the timing run.
+"""
+import argparse
+import ast
+import io
+import os
+import time
+import tokenize
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+LIB_FILE = os.path.join(HERE, "robot_lib.py")
+BUILD_DIR = os.path.join(HERE, "build")
+
+# uploaded file -> (source behavior, parameter set baked into it)
+TARGETS = {
+    "usr_code_filler.py":     ("usr_code_shift.py", {"MOVE_DIR": -1}),
+    "usr_code_move_left.py":  ("usr_code_shift.py", {"MOVE_DIR": -1}),
+    "usr_code_move_right.py": ("usr_code_shift.py", {"MOVE_DIR": 1}),
+    "usr_code_glitch.py":     ("usr_code_glitch.py", {}),
+    "usr_code_encircling.py": ("usr_code_encircling.py", {}),
+    "usr_code_bundle.py":     ("usr_code_bundle.py", {}),
+    "msi_format_usr_code.py": ("msi_format_usr_code.py", {}),
+}
+ENTRY = "usr"   # what the robot runs; everything it does not reach is dropped
+
+
+class BuildError(Exception):
+    pass
+
+
+# ---- source editing (ast positions are utf-8 byte offsets) ----
+def _edit(text, edits):
+    """Apply [(lineno, col, end_lineno, end_col, replacement)] (1-based lines) to text."""
+    lines = text.encode("utf-8").split(b"\n")
+    for l0, c0, l1, c1, rep in sorted(edits, reverse=True):
+        head = lines[l0 - 1][:c0]
+        tail = lines[l1 - 1][c1:]
+        lines[l0 - 1:l1] = (head + rep.encode("utf-8") + tail).split(b"\n")
+    return b"\n".join(lines).decode("utf-8")
+
+
+def _drop_lines(text, spans):
+    """Remove whole lines [first, last] (1-based) for every span."""
+    lines = text.split("\n")
+    gone = set()
+    for first, last in spans:
+        gone.update(range(first, last + 1))
+    return "\n".join(l for i, l in enumerate(lines, 1) if i not in gone)
+
+
+def _span(node):
+    first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return first, node.end_lineno
+
+
+# ---- name analysis ----
+def _defines(stmt):
+    """Names a top-level statement binds."""
+    if isinstance(stmt, (ast.FunctionDef, ast.ClassDef)):
+        return {stmt.name}
+    if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+        return {(a.asname or a.name).split(".")[0] for a in stmt.names if a.name != "*"}
+    if isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+        return {n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)}
+    return set()
+
+
+def _loads(node):
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+
+
+def _binding_counts(tree):
+    """How often each name is bound anywhere (any scope): assignments, args, defs, imports, globals."""
+    counts = {}
+
+    def bump(name):
+        counts[name] = counts.get(name, 0) + 1
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load):
+            bump(n.id)
+        elif isinstance(n, ast.arg):
+            bump(n.arg)
+        elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bump(n.name)
+        elif isinstance(n, (ast.Import, ast.ImportFrom)):
+            for a in n.names:
+                bump((a.asname or a.name).split(".")[0])
+        elif isinstance(n, (ast.Global, ast.Nonlocal)):
+            for name in n.names:
+                bump(name)
+        elif isinstance(n, ast.ExceptHandler) and n.name:
+            bump(n.name)
+    return counts
+
+
+_BINOPS = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+           ast.Div: lambda a, b: a / b, ast.Pow: lambda a, b: a ** b}
+
+
+def _const(node, env):
+    """Value of a constant expression over already-folded names; raises ValueError otherwise."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in env:
+        return env[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        v = _const(node.operand, env)
+        return -v if isinstance(node.op, ast.USub) else +v
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        a, b = _const(node.left, env), _const(node.right, env)
+        if isinstance(node.op, ast.Div) and isinstance(a, int) and isinstance(b, int):
+            raise ValueError("int / int")   # depends on `from __future__ import division`
+        if isinstance(a, str) or isinstance(b, str):
+            raise ValueError("string arithmetic")
+        return _BINOPS[type(node.op)](a, b)
+    raise ValueError("not constant")
+
+
+def _literal(v):
+    if isinstance(v, float) and (v != v or v in (float("inf"), float("-inf"))):
+        raise ValueError("non-finite")
+    return repr(v)
+
+
+def _in_place(lit, node, parent):
+    """Literal text that can stand where `node` was (`-1.2 ** 2` and `35.real` need parentheses)."""
+    if isinstance(parent, ast.Attribute) or (lit.startswith("-") and isinstance(parent, ast.BinOp)
+                                             and isinstance(parent.op, ast.Pow) and parent.left is node):
+        return "(" + lit + ")"
+    return lit
+
+
+_CMPOPS = {ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b, ast.Lt: lambda a, b: a < b,
+           ast.LtE: lambda a, b: a <= b, ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b}
+
+
+def _truth(node):
+    """Truth value of a constant `if` test; raises ValueError if it depends on anything at runtime."""
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _CMPOPS:
+        return _CMPOPS[type(node.ops[0])](_const(node.left, {}), _const(node.comparators[0], {}))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return not _truth(node.operand)
+    if isinstance(node, ast.BoolOp):
+        known = []
+        for v in node.values:
+            try:
+                known.append(_truth(v))
+            except ValueError:
+                known.append(None)
+        short = False if isinstance(node.op, ast.And) else True
+        if short in known:
+            return short      # `False and <anything>` / `True or <anything>`
+        if None not in known:
+            return not short
+        raise ValueError("depends on runtime values")
+    if isinstance(node, ast.Constant):
+        return bool(node.value)
+    return bool(_const(node, {}))
+
+
+# ---- build steps ----
+def inline_lib(text, lib_text, src):
+    """Replace `from robot_lib import *` with robot_lib.py itself."""
+    tree = ast.parse(text)
+    star = [s for s in tree.body if isinstance(s, ast.ImportFrom) and s.module == "robot_lib"]
+    if not star:
+        return text
+    lib_names = set()
+    for s in ast.parse(lib_text).body:
+        if not isinstance(s, (ast.Import, ast.ImportFrom)):
+            lib_names |= _defines(s)
+    for s in tree.body:
+        if isinstance(s, (ast.Import, ast.ImportFrom)):
+            continue
+        clash = _defines(s) & lib_names
+        if clash:
+            raise BuildError(f"{src} line {s.lineno} redefines robot_lib name(s) {', '.join(sorted(clash))}")
+    s = star[0]
+    lines = text.split("\n")
+    return "\n".join(lines[:s.lineno - 1] + lib_text.rstrip("\n").split("\n") + lines[s.end_lineno:])
+
+
+def bake_params(text, params, src):
+    tree = ast.parse(text)
+    edits, missing = [], dict(params)
+    for s in tree.body:
+        if (isinstance(s, ast.Assign) and len(s.targets) == 1 and isinstance(s.targets[0], ast.Name)
+                and s.targets[0].id in missing):
+            v = s.value
+            edits.append((v.lineno, v.col_offset, v.end_lineno, v.end_col_offset,
+                          _literal(missing.pop(s.targets[0].id))))
+    if missing:
+        raise BuildError(f"{src}: no top-level assignment for parameter(s) {', '.join(sorted(missing))}")
+    return _edit(text, edits)
+
+
+def fold_constants(text):
+    """Replace reads of module constants (bound exactly once, constant value) with their literal."""
+    tree = ast.parse(text)
+    bound = _binding_counts(tree)
+    env = {}
+    for s in tree.body:
+        if not isinstance(s, ast.Assign) or len(s.targets) != 1:
+            continue
+        t = s.targets[0]
+        pairs = [(t, s.value)]
+        if isinstance(t, ast.Tuple) and isinstance(s.value, ast.Tuple) and len(t.elts) == len(s.value.elts):
+            pairs = list(zip(t.elts, s.value.elts))
+        for name, value in pairs:
+            if not isinstance(name, ast.Name) or bound.get(name.id) != 1:
+                continue
+            try:
+                v = _const(value, env)
+                _literal(v)
+            except (ValueError, ArithmeticError):
+                continue
+            env[name.id] = v
+
+    parents = {}
+    for p in ast.walk(tree):
+        for c in ast.iter_child_nodes(p):
+            parents[c] = p
+    edits = []
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load) and n.id in env:
+            lit = _in_place(_literal(env[n.id]), n, parents.get(n))
+            edits.append((n.lineno, n.col_offset, n.end_lineno, n.end_col_offset, lit))
+    return _edit(text, edits)
+
+
+def fold_expressions(text):
+    """Evaluate arithmetic on literals left behind by fold_constants, e.g. `-1.2 + 0.02`,
+    and drop constant terms from `and` / `or` (`'by_id' == "by_id" and x` -> `x`)."""
+    while True:
+        folded = _fold_expressions_once(text)
+        if folded == text:
+            return text
+        text = folded
+
+
+def _fold_expressions_once(text):
+    tree = ast.parse(text)
+    edits = []
+
+    def visit(n, parent):
+        if isinstance(n, ast.BoolOp):
+            keep = []
+            for v in n.values:
+                try:
+                    if _truth(v) == isinstance(n.op, ast.And):
+                        continue      # `True and` / `False or`: no effect on the result
+                except (ValueError, ArithmeticError, TypeError):
+                    pass
+                keep.append(v)
+            if keep and len(keep) < len(n.values):
+                op = " and " if isinstance(n.op, ast.And) else " or "
+                seg = op.join(ast.get_source_segment(text, v) for v in keep)
+                edits.append((n.lineno, n.col_offset, n.end_lineno, n.end_col_offset, "(" + seg + ")"))
+                return
+        literal = isinstance(n, ast.UnaryOp) and isinstance(n.operand, ast.Constant)   # already `-1.2`
+        if isinstance(n, (ast.BinOp, ast.UnaryOp)) and not literal:
+            try:
+                lit = _in_place(_literal(_const(n, {})), n, parent)
+            except (ValueError, ArithmeticError, TypeError):
+                lit = None
+            if lit is not None:
+                edits.append((n.lineno, n.col_offset, n.end_lineno, n.end_col_offset, lit))
+                return
+        for c in ast.iter_child_nodes(n):
+            visit(c, n)
+    visit(tree, None)
+    return _edit(text, edits)
+
+
+def fold_branches(text):
+    """Keep only the live branch of `if`s whose test is constant once parameters are baked in."""
+    while True:
+        tree = ast.parse(text)
+        lines = text.split("\n")
+        target = None
+        for n in ast.walk(tree):   # breadth first: outermost foldable `if` first
+            if isinstance(n, ast.If):
+                try:
+                    target = (n, _truth(n.test))
+                    break
+                except (ValueError, ArithmeticError, TypeError):
+                    pass
+        if target is None:
+            return text
+        n, live = target
+        pad = " " * n.col_offset
+        branch = n.body if live else n.orelse
+        if not branch:
+            new = [pad + "pass"]
+        else:
+            new = lines[branch[0].lineno - 1:branch[-1].end_lineno]
+            indent = branch[0].col_offset
+            if not live and len(branch) == 1 and isinstance(branch[0], ast.If) \
+                    and lines[branch[0].lineno - 1][indent:].startswith("elif"):
+                indent = n.col_offset   # `elif` sits at the `if`'s column
+                new[0] = new[0][:indent] + new[0][indent + 2:]   # elif -> if
+            cut = max(0, indent - n.col_offset)
+            new = [pad + l[indent:] if l[:indent].strip() == "" else l for l in new] if cut else new
+        text = "\n".join(lines[:n.lineno - 1] + new + lines[n.end_lineno:])
+
+
+def drop_dead(text):
+    """Drop top-level definitions ENTRY never reaches, duplicate imports and docstrings."""
+    tree = ast.parse(text)
+    defs, roots, spans = {}, {ENTRY}, []
+    for s in tree.body:
+        names = _defines(s)
+        if names and not isinstance(s, ast.ImportFrom):
+            for name in names:
+                defs.setdefault(name, []).append(s)
+        elif isinstance(s, ast.Expr) and isinstance(s.value, ast.Constant) and isinstance(s.value.value, str):
+            spans.append(_span(s))   # module docstring / bare string
+        elif not isinstance(s, ast.ImportFrom):
+            roots |= _loads(s)       # top-level code that runs on import
+
+    reached, todo = set(), list(roots)
+    while todo:
+        name = todo.pop()
+        if name in reached:
+            continue
+        reached.add(name)
+        for s in defs.get(name, []):
+            todo.extend(_loads(s) - reached)
+
+    imported = set()
+    for s in tree.body:
+        names = _defines(s)
+        if not names or isinstance(s, ast.ImportFrom):
+            continue
+        if isinstance(s, ast.Import):
+            if not (names & reached) or names <= imported:
+                spans.append(_span(s))
+            imported |= names
+        elif not (names & reached):
+            spans.append(_span(s))
+
+    # docstrings of the functions / classes that stay
+    edits = []
+    for n in ast.walk(tree):
+        if isinstance(n, (ast.FunctionDef, ast.ClassDef)) and n.body:
+            d = n.body[0]
+            if isinstance(d, ast.Expr) and isinstance(d.value, ast.Constant) and isinstance(d.value.value, str):
+                edits.append((d.lineno, d.col_offset, d.end_lineno, d.end_col_offset,
+                              "pass" if len(n.body) == 1 else ""))
+    return _drop_lines(_edit(text, edits), spans)
+
+
+def minify(text):
+    """Re-emit the token stream: no comments or blank lines, one space per indent level."""
+    out, line, depth, prev = [], [], 0, None
+    for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+        kind, s = tok.type, tok.string
+        if kind in (tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER):
+            continue
+        if kind == tokenize.INDENT:
+            depth += 1
+            continue
+        if kind == tokenize.DEDENT:
+            depth -= 1
+            continue
+        if kind == tokenize.NEWLINE:
+            if line:
+                out.append(" " * depth + "".join(line))
+            line, prev = [], None
+            continue
+        if prev is not None and ((prev[-1].isalnum() or prev[-1] == "_") and (s[0].isalnum() or s[0] == "_")
+                                 or (prev[-1].isdigit() and s[0] == ".")):
+            line.append(" ")
+        line.append(s)
+        prev = s
+    body = "\n".join(out) + "\n"
+    if any(ord(c) > 127 for c in body):
+        body = "# -*- coding: utf-8 -*-\n" + body
+    return body
+
+
+def full_text(src_text, lib_text, src, params):
+    """The behavior as one file without minifying (the "before" in the report)."""
+    return bake_params(inline_lib(src_text, lib_text, src), params, src)
+
+
+def build(target, out_dir=BUILD_DIR):
+    src, params = TARGETS[target]
+    with open(os.path.join(HERE, src)) as f:
+        src_text = f.read()
+    with open(LIB_FILE) as f:
+        lib_text = f.read()
+    full = full_text(src_text, lib_text, src, params)
+    built = minify(drop_dead(fold_branches(fold_expressions(fold_constants(full)))))
+    tag = " ".join(f"{k}={v}" for k, v in sorted(params.items()))
+    built = f"# {src}{' ' + tag if tag else ''} (build_usr_code.py)\n" + built
+    try:
+        compile(built, target, "exec")
+    except SyntaxError as e:
+        raise BuildError(f"{target}: built file does not compile: {e}")
+    if "robot_lib" in built.split("\n", 1)[1]:
+        raise BuildError(f"{target}: still references robot_lib")
+
+    os.makedirs(os.path.join(out_dir, "full"), exist_ok=True)
+    for path, text in ((os.path.join(out_dir, target), built), (os.path.join(out_dir, "full", target), full)):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    return {"target": target, "source": src + (f" {tag}" if tag else ""),
+            "full_bytes": len(full.encode("utf-8")), "built_bytes": len(built.encode("utf-8"))}
+
+
+def build_all(out_dir=BUILD_DIR, quiet=False):
+    """Build every target; returns one report row per target. Raises BuildError."""
+    rows = [build(t, out_dir) for t in sorted(TARGETS)]
+    full = sum(r["full_bytes"] for r in rows)
+    built = sum(r["built_bytes"] for r in rows)
+    if quiet:
+        print(f"[BUILD] {len(rows)} robot programs → {os.path.relpath(out_dir, HERE)}/ "
+              f"({full / 1e3:.1f} kB full, {built / 1e3:.1f} kB built)")
+    return rows
+
+
+def time_updates(rows, out_dir):
+    """`cctl update` each full and built file once (swarm-wide), seconds per file."""
+    from cctl_client import SyncCctlClient   # needs cctl (or fakefleet/ on PYTHONPATH)
+    client = SyncCctlClient()
+    try:
+        for r in rows:
+            for key, path in (("full_sec", os.path.join(out_dir, "full", r["target"])),
+                              ("built_sec", os.path.join(out_dir, r["target"]))):
+                t0 = time.time()
+                client.update(path, timeout=120)
+                r[key] = time.time() - t0
+    finally:
+        client.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default=BUILD_DIR, help="output directory (default build/)")
+    ap.add_argument("--time", action="store_true", help="time `cctl update` of the full and built files")
+    args = ap.parse_args()
+
+    try:
+        rows = build_all(args.out)
+    except BuildError as e:
+        raise SystemExit(f"[ERROR] {e}")
+    if args.time:
+        time_updates(rows, args.out)
+
+    print("%-24s %-32s %9s %9s %6s" % ("target", "source", "full B", "built B", "saved")
+          + ("  %8s %8s" % ("full s", "built s") if args.time else ""))
+    for r in rows:
+        saved = 1.0 - r["built_bytes"] / float(r["full_bytes"])
+        line = "%-24s %-32s %9d %9d %5.0f%%" % (r["target"], r["source"], r["full_bytes"], r["built_bytes"],
+                                                100.0 * saved)
+        if args.time:
+            line += "  %8.2f %8.2f" % (r["full_sec"], r["built_sec"])
+        print(line)
+    full = sum(r["full_bytes"] for r in rows)
+    built = sum(r["built_bytes"] for r in rows)
+    print("%-24s %-32s %9d %9d %5.0f%%" % ("total", "", full, built, 100.0 * (1.0 - built / float(full)))
+          + ("  %8.2f %8.2f" % (sum(r["full_sec"] for r in rows), sum(r["built_sec"] for r in rows))
+             if args.time else ""))
+    print("built:", os.path.relpath(args.out, HERE) + "/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Long-lived cctl client shared by the dispatchers.
+
+One Configuration, one argparse parser and (lazily) one Network session are
+built at startup and reused for every command, so a mode change costs the
+command round trips instead of a `cctl` process launch per step. Robots
+already powered on are remembered and skipped by `on`. With a DispatchMetrics
+attached, every command's latency and outcome is recorded per robot.
+"""
+import asyncio
+import time
+
+from cctl import cli
+from cctl.conf import Configuration
+
+
+class CctlClient:
+    def __init__(self, conf=None, metrics=None):
+        self.conf = conf if conf is not None else Configuration()
+        self.parser = cli.create_parser()
+        self.metrics = metrics
+        self.powered = set()   # robot ids we have successfully turned on
+        self._net = None
+
+    @property
+    def net(self):
+        """User-network session (signals to robots), created on first use."""
+        if self._net is None:
+            from cctl.api.network import Network
+            self._net = Network().user
+        return self._net
+
+    async def run(self, *argv):
+        args = self.parser.parse_args([str(a) for a in argv])
+        if self.metrics is None:
+            return await cli.exec_command(args, self.conf)
+        # update goes to every robot that is on, so it is recorded under "all"
+        robots = [str(a) for a in argv[1:]] if argv[0] != "update" else None
+        t0 = time.monotonic()
+        ok = False
+        try:
+            out = await cli.exec_command(args, self.conf)
+            ok = True
+            return out
+        finally:
+            # a deadline cancels us mid-command; that counts as an error too
+            self.metrics.observe(str(argv[0]), robots, time.monotonic() - t0, ok)
+
+    async def on(self, robots):
+        """cctl on, only for robots not already powered on. Returns the ids sent."""
+        todo = [r for r in robots if str(r) not in self.powered]
+        if not todo:
+            return []
+        await self.run("on", *todo)
+        self.powered.update(str(r) for r in todo)
+        return todo
+
+    async def pause(self, robots):
+        return await self.run("pause", *robots)
+
+    async def update(self, script_abs):
+        return await self.run("update", script_abs)
+
+    async def start(self, robots):
+        return await self.run("start", *robots)
+
+    def signal(self, slot, payload):
+        """Broadcast a few bytes to every robot listening on `slot`."""
+        return self.net.signal(slot, payload)
+
+    def direct_signal(self, slot, robot, payload):
+        """Send a few bytes to one robot's `slot`."""
+        from cctl.api.bot_ctl import Coachbot
+        return self.net.direct_signal(slot, Coachbot(int(robot)), payload)
+
+    def forget(self, robots):
+        """Mark robots as not powered (e.g. after a reboot) so the next `on` resends."""
+        for r in robots:
+            self.powered.discard(str(r))
+
+
+class SyncCctlClient:
+    """Blocking wrapper for the non-async watchers; owns its own event loop."""
+
+    def __init__(self, conf=None, metrics=None):
+        self.loop = asyncio.new_event_loop()
+        self.client = CctlClient(conf, metrics)
+
+    def call(self, coro, timeout=None):
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return self.loop.run_until_complete(coro)
+
+    def on(self, robots, timeout=None):
+        return self.call(self.client.on(robots), timeout)
+
+    def pause(self, robots, timeout=None):
+        return self.call(self.client.pause(robots), timeout)
+
+    def update(self, script_abs, timeout=None):
+        return self.call(self.client.update(script_abs), timeout)
+
+    def start(self, robots, timeout=None):
+        return self.call(self.client.start(robots), timeout)
+
+    def close(self):
+        self.loop.close()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Deterministic checks of the dispatcher's concurrency pieces: the latest-wins
+TransitionScheduler (transitions.py) and the per-robot fan-out (fanout.py).
+
+No robots and no cctl: apply functions and robot commands are plain
+coroutines that wait on asyncio.Events, so every interleaving below is
+forced by the script rather than by timing.
+
+    python3 check_scheduling.py          # exits 1 if any check fails
+
+Checks:
+    burst       A -> B -> C while A runs: ends in C, B never runs
+    supersede   a newer request at a checkpoint stops the old transition
+    retry       a failed transition is retried and then applied
+    straggler   a robot past its deadline is a straggler; the rest return at once
+    with_retries  a failing swarm command is retried, a hung one gives up
+"""
+import asyncio
+import sys
+
+from fanout import fan_out, with_retries
+from transitions import APPLIED, FAILED, SUPERSEDED, TransitionScheduler
+
+TIMEOUT = 5.0   # a check that has not finished by then is hung (= failed)
+
+
+class Recorder:
+    """Scheduler with a scripted apply_fn; keeps what ran and how it ended."""
+
+    def __init__(self, apply_fn, **kw):
+        self.ran = []
+        self.outcomes = []
+        self.changed = asyncio.Event()
+        self.sched = TransitionScheduler(self._apply, on_finish=self._finished, **kw)
+        self.apply_fn = apply_fn
+        self.worker = None
+
+    async def _apply(self, tr):
+        self.ran.append(tr.mode)
+        await self.apply_fn(tr)
+
+    def _finished(self, tr):
+        self.outcomes.append((tr.mode, tr.outcome))
+        self.changed.set()
+
+    async def until(self, mode, outcome):
+        while (mode, outcome) not in self.outcomes:
+            self.changed.clear()
+            await self.changed.wait()
+
+    def start(self):
+        self.worker = asyncio.ensure_future(self.sched.run())
+
+    def stop(self):
+        self.worker.cancel()
+
+
+async def check_burst():
+    gate = asyncio.Event()
+    entered = asyncio.Event()
+
+    async def apply(tr):
+        if tr.mode == "A":
+            entered.set()
+            await gate.wait()
+        tr.checkpoint("before start")
+
+    rec = Recorder(apply)
+    rec.start()
+    rec.sched.submit("A", "1")
+    await entered.wait()
+    rec.sched.submit("B", "2")
+    rec.sched.submit("C", "3")
+    gate.set()
+    await rec.until("C", APPLIED)
+    rec.stop()
+    assert rec.ran == ["A", "C"], rec.ran
+    assert rec.outcomes == [("B", SUPERSEDED), ("A", SUPERSEDED), ("C", APPLIED)], rec.outcomes
+
+
+async def check_supersede():
+    gate = asyncio.Event()
+    entered = asyncio.Event()
+    started = []
+
+    async def apply(tr):
+        if tr.mode == "old":
+            entered.set()
+            await gate.wait()   # e.g. cctl update in flight
+        tr.checkpoint("before start")
+        started.append(tr.mode)
+
+    rec = Recorder(apply)
+    rec.start()
+    rec.sched.submit("old", "1")
+    await entered.wait()
+    rec.sched.submit("new", "2")
+    assert rec.sched.current.superseded
+    gate.set()
+    await rec.until("new", APPLIED)
+    rec.stop()
+    assert started == ["new"], started
+    assert rec.outcomes == [("old", SUPERSEDED), ("new", APPLIED)], rec.outcomes
+
+
+async def check_retry():
+    calls = []
+
+    async def apply(tr):
+        calls.append(tr.mode)
+        if len(calls) == 1:
+            raise RuntimeError("cctl update failed")
+
+    rec = Recorder(apply, retry_failed_after=0.0)
+    rec.start()
+    rec.sched.submit("A", "1")
+    await rec.until("A", APPLIED)
+    rec.stop()
+    assert calls == ["A", "A"], calls
+    assert [o for _, o in rec.outcomes] == [FAILED, APPLIED], rec.outcomes
+
+
+async def check_straggler():
+    release = asyncio.Event()
+    seen = []
+
+    async def send(robot):
+        if robot == 3 and not release.is_set():
+            await release.wait()   # offline until the fan-out has returned
+        return robot
+
+    res = await fan_out("start", send, [1, 2, 3, 4], deadline=0.05, retries=2, backoff=0.0,
+                        observer=lambda r, ok: seen.append((r, ok)))
+    assert res.ok == [1, 2, 4], res.ok
+    assert res.stragglers == [3], res.stragglers
+    assert (3, False) in seen, seen
+    release.set()
+    await res.wait_retries()
+    assert res.late_ok == [3] and not res.stragglers and not res.failed, res.summary()
+    assert res.attempts[3] == 2, res.attempts
+
+
+async def check_with_retries():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("busy")
+        return "ok"
+
+    out = await with_retries("update", flaky, deadline=1.0, retries=2, backoff=0.0)
+    assert out == "ok" and len(calls) == 3, calls
+
+    async def hung():
+        await asyncio.Event().wait()
+
+    try:
+        await with_retries("update", hung, deadline=0.05, retries=1, backoff=0.0)
+    except asyncio.TimeoutError:
+        pass
+    else:
+        raise AssertionError("hung command did not time out")
+
+
+CHECKS = [check_burst, check_supersede, check_retry, check_straggler, check_with_retries]
+
+
+async def main():
+    failed = 0
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        try:
+            await asyncio.wait_for(check(), TIMEOUT)
+        except Exception as e:
+            failed += 1
+            print(f"[CHECK] {name}: FAIL {type(e).__name__}: {e}")
+        else:
+            print(f"[CHECK] {name}: ok")
+    print(f"[CHECK] {len(CHECKS) - failed}/{len(CHECKS)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,101 @@
+"""
+Event clips from an in-memory pre-roll ring buffer, for the live classifier.
+
+Instead of (or next to) recording the whole session to raw.mp4, the live
+loop pushes every frame into a ring holding the last `pre_sec` seconds.
+When an event fires, `trigger(path)` starts a clip: the ring contents (the
+pre-roll) and the next `post_sec` seconds of frames are written to `path`.
+Encoding runs on a writer thread per clip, so the frame loop only pays for
+the push (and, with `jpeg_quality`, one JPEG encode per frame).
+
+Ring memory: raw frames are width x height x 3 bytes each (640x480: 0.9 MB,
+so 5 s at 20 fps is about 180 MB); with `jpeg_quality` set they are kept
+JPEG-compressed (typically 30-60 kB each) and decoded only when a clip is
+written. Events closer together than the clip length get overlapping clips.
+"""
+import os
+import queue
+import threading
+from collections import deque
+
+import cv2
+
+CLIP_FOURCC = "mp4v"
+
+
+class _Clip:
+    """One clip being written: a frame queue drained by its own thread."""
+
+    def __init__(self, path, fps, frame_size, jpeg, post_frames):
+        self.path = path
+        self.left = post_frames
+        self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._write, args=(fps, frame_size, jpeg), daemon=True)
+        self.thread.start()
+
+    def _write(self, fps, frame_size, jpeg):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*CLIP_FOURCC), fps, frame_size)
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            writer.write(cv2.imdecode(item, cv2.IMREAD_COLOR) if jpeg else item)
+        writer.release()
+
+
+class ClipRecorder:
+    def __init__(self, fps, frame_size, pre_sec=5.0, post_sec=3.0, jpeg_quality=None):
+        self.fps = fps
+        self.frame_size = frame_size
+        self.jpeg_quality = jpeg_quality
+        self.ring = deque(maxlen=max(1, int(round(pre_sec * fps))))
+        self.post_frames = int(round(post_sec * fps))
+        self.open = []        # clips still taking post-roll frames
+        self.done = []        # clips whose frames are all queued (threads may still be encoding)
+        self.ring_bytes = 0   # bytes held by the ring now
+        self.peak_ring_bytes = 0
+
+    def push(self, frame):
+        """Add the newest frame (BGR, frame_size); feeds the post-roll of open clips."""
+        if self.jpeg_quality:
+            item = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])[1]
+        else:
+            item = frame   # cap.read() hands out a new array per frame; no copy needed
+        if len(self.ring) == self.ring.maxlen:
+            self.ring_bytes -= self.ring[0].nbytes
+        self.ring.append(item)
+        self.ring_bytes += item.nbytes
+        self.peak_ring_bytes = max(self.peak_ring_bytes, self.ring_bytes)
+        for clip in self.open:
+            clip.q.put(item)
+            clip.left -= 1
+        finished = [c for c in self.open if c.left <= 0]
+        for clip in finished:
+            clip.q.put(None)
+            self.open.remove(clip)
+            self.done.append(clip)
+
+    def trigger(self, path):
+        """Start a clip at `path`: the pre-roll now, the post-roll as frames arrive. Returns path."""
+        clip = _Clip(path, self.fps, self.frame_size, bool(self.jpeg_quality), self.post_frames)
+        for item in self.ring:
+            clip.q.put(item)
+        if clip.left > 0:
+            self.open.append(clip)
+        else:
+            clip.q.put(None)
+            self.done.append(clip)
+        return path
+
+    def close(self):
+        """Cut open clips short and wait until every clip is on disk."""
+        for clip in self.open:
+            clip.q.put(None)
+        self.done.extend(self.open)
+        self.open = []
+        for clip in self.done:
+            clip.thread.join()
+
+    def clip_bytes(self):
+        return sum(os.path.getsize(c.path) for c in self.done if os.path.exists(c.path))
@@ -0,0 +1,160 @@
+"""
+Shared start instant for a transition.
+
+The behaviors used to pick their own start with `t0 = robot.get_clock() + 1.0`,
+so the spread of start times was the skew of `cctl start` delivery plus the
+robots' clock offsets. Here the dispatcher estimates each robot's clock
+offset (ping / ack round trips on the "clock" slot, best of a few samples by
+round-trip time) and broadcasts one future host instant converted into each
+robot's own clock: "at <id>=<robot clock> ...", keyed by the id the robot
+put in its acks (its virtual id, which need not match the cctl id).
+
+Robots report "started <id> <robot clock>" back on the "clock_host" slot, so
+each transition's actual start skew is logged to dispatch_logs/start_skew.csv.
+With SYNC_START=0 the offsets are still measured but no start instant is
+sent, which gives the baseline skew to compare against.
+
+Robot -> host messages need a host-side slot API on the cctl network
+(`add_slot`). Without it a relative "in <sec>" start is broadcast instead
+(removes the `cctl start` skew, not the broadcast delivery skew) and skew
+is not measured.
+"""
+import asyncio
+import csv
+import os
+import time
+
+PING_EVERY     = 0.1     # seconds between ping rounds
+MIN_SAMPLES    = 3       # round trips per robot before its offset is trusted
+SYNC_TIMEOUT   = 6.0     # give up waiting for acks / armed robots after this long
+START_LEAD     = 0.3     # start this long after the start message goes out (+ worst half RTT)
+SKEW_COLLECT   = 5.0     # wait up to this long after the start instant for every "started" report
+AT_PER_MESSAGE = 20      # id=clock pairs per "at" broadcast
+SYNC_START     = os.environ.get("SYNC_START", "1") == "1"
+
+
+class RobotClock:
+    def __init__(self):
+        self.offset = None       # robot_clock - host_time (seconds)
+        self.rtt = float("inf")  # round trip of the sample the offset came from
+        self.samples = 0
+        self.armed = False       # behavior initialized and waiting for its start
+
+
+class ClockSync:
+    def __init__(self, client, log_path=None):
+        self.client = client
+        self.log_path = log_path
+        self.clocks = {}         # id reported by the robot -> RobotClock (fresh per transition)
+        self.sent = {}           # ping seq -> host send time
+        self.seq = 0
+        self.starts = {}         # robot id -> host time it reported starting
+        self.available = False
+        self._loop = None        # event loop that owns clocks / sent / starts (replies are handed to it)
+
+    def attach(self):
+        """Register the host-side slot for acks / start reports. False if unsupported."""
+        net = self.client.net
+        if not hasattr(net, "add_slot"):
+            print("[SYNC] no host-side slot API; sending relative start only, skew not measured")
+            return False
+        self._loop = asyncio.get_event_loop()
+        net.add_slot("clock_host", self._on_message)
+        self.available = True
+        return True
+
+    def _on_message(self, _, payload):
+        # cctl calls this on its network thread: stamp the arrival (the RTT
+        # needs it), then let the loop apply it while nothing else runs there
+        self._loop.call_soon_threadsafe(self._on_reply, time.time(), payload)
+
+    def _on_reply(self, t_recv, payload):
+        try:
+            parts = payload.decode("utf-8").split()
+        except Exception:
+            return
+        if len(parts) >= 5 and parts[0] == "ack":
+            t_sent = self.sent.get(parts[1])
+            if t_sent is None:
+                return
+            c = self.clocks.setdefault(parts[2], RobotClock())
+            rtt = t_recv - t_sent
+            c.samples += 1
+            c.armed = parts[4] == "1"
+            if rtt < c.rtt:
+                # NTP-style: assume the robot read its clock halfway through the round trip
+                c.rtt = rtt
+                c.offset = float(parts[3]) - (t_sent + t_recv) / 2.0
+        elif len(parts) >= 3 and parts[0] == "started":
+            c = self.clocks.get(parts[1])
+            if c is not None and c.offset is not None:
+                self.starts[parts[1]] = float(parts[2]) - c.offset
+
+    def _ping(self):
+        self.seq += 1
+        self.sent[str(self.seq)] = time.time()
+        self.client.signal("clock", ("ping %d" % self.seq).encode("utf-8"))
+
+    def _ready(self):
+        return [k for k, c in self.clocks.items() if c.samples >= MIN_SAMPLES and c.armed]
+
+    async def estimate(self, n_robots, timeout=SYNC_TIMEOUT):
+        """Ping until n_robots have MIN_SAMPLES round trips and are armed (or timeout)."""
+        self.clocks = {}   # offsets drift: fresh estimate per transition
+        t_end = time.time() + timeout
+        while time.time() < t_end:
+            self._ping()
+            await asyncio.sleep(PING_EVERY)
+            if len(self._ready()) >= n_robots:
+                break
+        self.sent.clear()
+        return {k: c for k, c in self.clocks.items() if c.offset is not None}
+
+    async def start(self, n_robots, label, boot=0.0):
+        """Estimate offsets, broadcast one shared start instant, then log the measured skew.
+
+        `boot` is how long the behavior takes to arm after `cctl start` (its
+        warm-up); only used for the relative fallback.
+        """
+        if n_robots <= 0:
+            return
+        if not self.available:
+            if SYNC_START:
+                self.client.signal("clock", ("in %.3f" % (boot + START_LEAD + 1.0)).encode("utf-8"))
+            return
+        synced = await self.estimate(n_robots, timeout=max(SYNC_TIMEOUT, boot + 2.0))
+        worst_rtt = max([c.rtt for c in synced.values()] or [0.0])
+        t_start = time.time() + START_LEAD + worst_rtt / 2.0
+        self.starts = {}
+        if SYNC_START:
+            pairs = ["%s=%.4f" % (k, t_start + c.offset) for k, c in sorted(synced.items())]
+            for i in range(0, len(pairs), AT_PER_MESSAGE):
+                self.client.signal("clock", ("at " + " ".join(pairs[i:i + AT_PER_MESSAGE])).encode("utf-8"))
+            # robots that never acked: relative start, from this broadcast's arrival
+            self.client.signal("clock", ("in %.3f" % max(0.0, t_start - time.time())).encode("utf-8"))
+        t_end = t_start + SKEW_COLLECT
+        while len(self.starts) < n_robots and time.time() < t_end:
+            await asyncio.sleep(0.1)
+        self.report(label, n_robots, len(synced), t_start, worst_rtt)
+
+    def report(self, label, n_robots, n_synced, t_start, worst_rtt):
+        starts = list(self.starts.values())
+        if len(starts) < 2:
+            print(f"[SYNC] {label}: {len(starts)}/{n_robots} start reports, skew not measured")
+            return
+        skew = max(starts) - min(starts)
+        late = max(s - t_start for s in starts)
+        method = "shared" if SYNC_START else "baseline"
+        print(f"[SYNC] {label}: start skew {1000 * skew:.0f} ms over {len(starts)}/{n_robots} robots "
+              f"({method}, {n_synced} synced, offset ±{500 * worst_rtt:.0f} ms)")
+        if not self.log_path:
+            return
+        new = not os.path.exists(self.log_path)
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", newline="") as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(["t_start", "label", "method", "robots", "reported", "synced",
+                            "skew_ms", "max_late_ms", "offset_unc_ms"])
+            w.writerow([f"{t_start:.3f}", label, method, n_robots, len(starts), n_synced,
+                        f"{1000 * skew:.1f}", f"{1000 * late:.1f}", f"{500 * worst_rtt:.1f}"])
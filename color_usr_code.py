@@ -9,7 +9,7 @@ def usr(bot):
 
     # Handler for mode messages broadcast via controller_send_mode.py
     def on_mode(_, msg):
-        mode = msg.decode("utf-8").strip().lower()
+        mode = (msg.decode("utf-8").strip().lower().split() or [""])[0]   # "<mode> <seq>" from mode_delivery.py
         bot.logger.info(f"Received mode: {mode}")
 
         # Simple color mapping for each mode
@@ -0,0 +1,85 @@
+"""
+Per-robot record of the last successfully deployed user code, by content hash.
+
+float/glide/punch/slash all map to usr_code_filler.py, and a repeated label
+re-triggers with a new timestamp. In both cases the robots already hold the
+script, so the dispatcher can skip `cctl update` and only restart them. The
+record is kept in .deploy_cache.json so it survives dispatcher restarts.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+CACHE_PATH = os.environ.get("DEPLOY_CACHE", os.path.join(HERE, ".deploy_cache.json"))
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DeployCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.deployed = {}      # robot id (str) -> sha256 of the last deployed script
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}      # abs path -> (mtime, size, sha256)
+        try:
+            with open(path) as f:
+                self.deployed = {str(k): v for k, v in json.load(f).get("deployed", {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def digest(self, script_abs):
+        st = os.stat(script_abs)
+        key = (st.st_mtime, st.st_size)
+        cached = self._digests.get(script_abs)
+        if cached is None or cached[:2] != key:
+            cached = key + (file_digest(script_abs),)
+            self._digests[script_abs] = cached
+        return cached[2]
+
+    def stale(self, robots, script_abs):
+        """Robots that do not hold this exact script yet."""
+        h = self.digest(script_abs)
+        return [r for r in robots if self.deployed.get(str(r)) != h]
+
+    def check(self, robots, script_abs):
+        """True (and counts a hit) if every robot already holds the script."""
+        if self.stale(robots, script_abs):
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def record(self, robots, script_abs):
+        h = self.digest(script_abs)
+        for r in robots:
+            self.deployed[str(r)] = h
+        self.save()
+
+    def invalidate(self, robots=None):
+        if robots is None:
+            self.deployed.clear()
+        else:
+            for r in robots:
+                self.deployed.pop(str(r), None)
+        self.save()
+
+    def save(self):
+        d = os.path.dirname(self.path) or "."
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"deployed": self.deployed}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return "deploy cache hits=%d misses=%d (%.0f%% skipped uploads)" % (self.hits, self.misses, rate)
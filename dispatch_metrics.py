@@ -0,0 +1,185 @@
+"""
+Dispatcher metrics in Prometheus text exposition format.
+
+Per-command, per-robot latency histograms and error counts are recorded by
+CctlClient; the dispatchers add gauges/counters of their own (transition
+backlog, pre-stage and deploy-cache counts). Exposed on
+http://localhost:<METRICS_PORT>/metrics, optionally mirrored to a text file
+(node_exporter textfile style), and summarized at shutdown.
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9105"))   # 0 disables the HTTP endpoint
+METRICS_FILE = os.environ.get("METRICS_FILE", "")            # optional textfile mirror
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SAMPLES_KEPT = 2000   # raw samples per series, for the shutdown percentiles
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=SAMPLES_KEPT)
+
+    def observe(self, v):
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += v
+        self.samples.append(v)
+
+    def quantile(self, q):
+        if not self.samples:
+            return float("nan")
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+
+def _labels(d):
+    if not d:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace('"', "'")) for k, v in d.items()) + "}"
+
+
+class DispatchMetrics:
+    def __init__(self, prefix="dispatch"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.commands = defaultdict(Histogram)      # (cmd, robot) -> latency histogram
+        self.errors = defaultdict(int)              # (cmd, robot) -> error count
+        self.transitions = defaultdict(Histogram)   # outcome -> transition duration
+        self.gauges = {}                            # name -> (help, type, label, fn or value)
+        self.started = time.time()
+        self._server = None
+
+    # ---- recording ----
+    def observe(self, cmd, robots, seconds, ok=True):
+        with self.lock:
+            for r in (robots or ["all"]):
+                key = (cmd, str(r))
+                self.commands[key].observe(seconds)
+                if not ok:
+                    self.errors[key] += 1
+
+    def observe_transition(self, outcome, seconds):
+        with self.lock:
+            self.transitions[outcome].observe(seconds)
+
+    def gauge(self, name, value, help_text="", kind="gauge", label=None):
+        """Register a value (or callable). With `label`, the callable returns {label_value: value}."""
+        with self.lock:
+            self.gauges[name] = (help_text, kind, label, value)
+
+    # ---- exposition ----
+    def exposition(self):
+        p = self.prefix
+        out = []
+        with self.lock:
+            out.append(f"# HELP {p}_command_seconds cctl command latency per robot")
+            out.append(f"# TYPE {p}_command_seconds histogram")
+            for (cmd, robot), h in sorted(self.commands.items()):
+                self._hist_lines(out, f"{p}_command_seconds", {"cmd": cmd, "robot": robot}, h)
+            out.append(f"# HELP {p}_command_errors_total failed or timed-out cctl commands per robot")
+            out.append(f"# TYPE {p}_command_errors_total counter")
+            for (cmd, robot) in sorted(self.commands):
+                out.append(f"{p}_command_errors_total{_labels({'cmd': cmd, 'robot': robot})} "
+                           f"{self.errors.get((cmd, robot), 0)}")
+            out.append(f"# HELP {p}_transition_seconds mode transition duration by outcome")
+            out.append(f"# TYPE {p}_transition_seconds histogram")
+            for outcome, h in sorted(self.transitions.items()):
+                self._hist_lines(out, f"{p}_transition_seconds", {"outcome": outcome}, h)
+            gauges = list(self.gauges.items())
+        for name, (help_text, kind, label, value) in gauges:
+            full = f"{p}_{name}"
+            out.append(f"# HELP {full} {help_text or name}")
+            out.append(f"# TYPE {full} {kind}")
+            try:
+                v = value() if callable(value) else value
+            except Exception:
+                continue
+            if label:
+                for k, val in sorted(v.items()):
+                    out.append(f"{full}{_labels({label: k})} {float(val):g}")
+            else:
+                out.append(f"{full} {float(v):g}")
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def _hist_lines(out, name, labels, h):
+        for b, c in zip(h.buckets, h.counts):
+            out.append(f"{name}_bucket{_labels(dict(labels, le=f'{b:g}'))} {c}")
+        out.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {h.total}")
+        out.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+        out.append(f"{name}_count{_labels(labels)} {h.total}")
+
+    # ---- endpoints ----
+    def serve(self, port=METRICS_PORT):
+        """Serve /metrics from a daemon thread. Returns the bound port (None if disabled)."""
+        if not port:
+            return None
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        except OSError as e:
+            print("[WARN] metrics endpoint not started:", e)
+            return None
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"[INFO] metrics on http://127.0.0.1:{self._server.server_address[1]}/metrics")
+        return self._server.server_address[1]
+
+    def write(self, path=METRICS_FILE):
+        """Mirror the exposition to a text file (atomic rename)."""
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.exposition())
+        os.replace(tmp, path)
+
+    def summary(self):
+        lines = ["dispatcher metrics after %.0fs" % (time.time() - self.started),
+                 "%-10s %-8s %6s %6s %8s %8s %8s" % ("cmd", "robot", "count", "errors", "p50", "p90", "max")]
+        with self.lock:
+            for (cmd, robot), h in sorted(self.commands.items()):
+                lines.append("%-10s %-8s %6d %6d %8.3f %8.3f %8.3f" % (
+                    cmd, robot, h.total, self.errors.get((cmd, robot), 0),
+                    h.quantile(0.5), h.quantile(0.9), max(h.samples) if h.samples else float("nan")))
+            for outcome, h in sorted(self.transitions.items()):
+                lines.append("transition %-19s %6d        %8.3f %8.3f" % (
+                    outcome, h.total, h.quantile(0.5), h.quantile(0.9)))
+        return "\n".join(lines)
+
+    def shutdown(self, summary_path=None):
+        text = self.summary()
+        print(text)
+        if summary_path:
+            os.makedirs(os.path.dirname(summary_path) or ".", exist_ok=True)
+            with open(summary_path, "w") as f:
+                f.write(text + "\n\n" + self.exposition())
+        self.write()
+        if self._server is not None:
+            self._server.shutdown()
@@ -0,0 +1,225 @@
+"""
+Event state machine of the live classifier, pulled out of the frame loop so
+it can be replayed deterministically on recorded probability streams.
+
+A probability stream is one row per classification step:
+    t_first  time of the first frame in the window (s since session start)
+    t_last   time of the newest frame in the window
+    probs    raw clf.predict_proba output (one column per class)
+
+10_continuous_classification.py writes it to <session>/probs.csv.
+"""
+import csv
+import math
+from collections import namedtuple
+
+import numpy as np
+
+EventParams = namedtuple("EventParams", [
+    "on_thresh",              # probability to consider a gesture "on"
+    "off_thresh",             # below this the "on" timer is reset; == on_thresh means no hysteresis
+    "min_event_sec",          # must persist above on_thresh this long to emit an event
+    "cooldown_sec",           # ignore same label again for this long after an event
+    "ema_alpha",              # smoothing factor (0..1)
+    "pause_after_event_sec",  # "don't look for poses" window after any event
+])
+PARAM_NAMES = list(EventParams._fields)
+
+DEFAULT_PARAMS = EventParams(
+    on_thresh=0.60,
+    off_thresh=0.60,          # reset below on_thresh, as the live loop always did
+    min_event_sec=0.40,
+    cooldown_sec=0.60,
+    ema_alpha=0.4,
+    pause_after_event_sec=15.0,
+)
+
+Event = namedtuple("Event", ["t_start", "t_end", "label", "peak_prob"])
+
+
+class EventEngine:
+    """Per-step EMA + hysteresis + min-duration + cooldown + global pause."""
+
+    def __init__(self, classes, params=DEFAULT_PARAMS):
+        self.classes = [str(c) for c in classes]
+        self.params = params
+        self.ema = np.zeros(len(self.classes), dtype=float)
+        self.last_above = [None] * len(self.classes)
+        self.last_event_time = [-1e9] * len(self.classes)
+        self.pause_until = -1e9
+
+    def is_paused(self, now):
+        return now < self.pause_until
+
+    def step(self, t_first, t_last, probs):
+        """Feed one classification step; returns an Event or None."""
+        p = self.params
+        if self.is_paused(t_last):
+            return None
+
+        self.ema = p.ema_alpha * np.asarray(probs, dtype=float) + (1.0 - p.ema_alpha) * self.ema
+
+        # update above-threshold timers (start at beginning of window)
+        for i in range(len(self.classes)):
+            if self.ema[i] >= p.on_thresh:
+                if self.last_above[i] is None:
+                    self.last_above[i] = t_first
+            elif self.ema[i] < p.off_thresh:
+                self.last_above[i] = None
+
+        # decide events (only for the top class to reduce overlaps)
+        top = int(np.argmax(self.ema))
+        top_prob = float(self.ema[top])
+        t_on = self.last_above[top]
+        recently = (t_last - self.last_event_time[top]) < p.cooldown_sec
+        if (t_on is not None) and (t_last - t_on >= p.min_event_sec) and (top_prob >= p.on_thresh) and not recently:
+            self.last_event_time[top] = t_last
+            self.last_above[top] = None
+            self.pause_until = t_last + p.pause_after_event_sec
+            return Event(t_on, t_last, self.classes[top], top_prob)
+        return None
+
+    def top(self):
+        i = int(np.argmax(self.ema))
+        return self.classes[i], float(self.ema[i])
+
+
+# ---------- recorded streams ----------
+def write_stream_header(path, classes):
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerow(["t_first", "t_last"] + [str(c) for c in classes])
+
+
+def append_stream_row(path, t_first, t_last, probs):
+    with open(path, "a", newline="") as f:
+        csv.writer(f).writerow([f"{t_first:.4f}", f"{t_last:.4f}"] + [f"{float(v):.5f}" for v in probs])
+
+
+def load_stream(path):
+    """Returns (classes, t_first (S,), t_last (S,), probs (S, C))."""
+    with open(path, newline="") as f:
+        header = next(csv.reader(f))
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    if data.size == 0:
+        data = np.zeros((0, len(header)))
+    return header[2:], data[:, 0], data[:, 1], data[:, 2:]
+
+
+def load_timeline(path):
+    """Hand-labeled ground truth: CSV with t_start,t_end,label rows."""
+    rows = []
+    with open(path, newline="") as f:
+        for r in csv.DictReader(f):
+            rows.append((float(r["t_start"]), float(r["t_end"]), r["label"].strip()))
+    return rows
+
+
+def replay(classes, t_first, t_last, probs, params=DEFAULT_PARAMS):
+    engine = EventEngine(classes, params)
+    events = []
+    for s in range(len(t_last)):
+        ev = engine.step(float(t_first[s]), float(t_last[s]), probs[s])
+        if ev is not None:
+            events.append(ev)
+    return events
+
+
+# ---------- vectorized replay over a parameter grid ----------
+def replay_grid(t_first, t_last, probs, grid):
+    """
+    Same state machine as EventEngine, stepped for P parameter sets at once.
+
+    grid is a (P, 6) array with columns in PARAM_NAMES order. Returns arrays
+    (combo, t_start, t_end, label_idx, peak_prob), one entry per event.
+    """
+    grid = np.asarray(grid, dtype=float)
+    P = grid.shape[0]
+    S, C = probs.shape
+    on, off, min_ev, cool, alpha, pause = (grid[:, k] for k in range(6))
+    on_c, off_c, alpha_c = on[:, None], off[:, None], alpha[:, None]
+    rows = np.arange(P)
+
+    ema = np.zeros((P, C))
+    above = np.full((P, C), np.nan)
+    last_ev = np.full((P, C), -1e9)
+    pause_until = np.full(P, -1e9)
+
+    out = [[], [], [], [], []]
+    for s in range(S):
+        tf, tl = t_first[s], t_last[s]
+        active = ~(tl < pause_until)
+        act_c = active[:, None]
+
+        ema = np.where(act_c, alpha_c * probs[s] + (1.0 - alpha_c) * ema, ema)
+        hi = ema >= on_c
+        above[hi & np.isnan(above) & act_c] = tf
+        above[~hi & (ema < off_c) & act_c] = np.nan
+
+        top = np.argmax(ema, axis=1)
+        top_p = ema[rows, top]
+        t_on = above[rows, top]
+        recently = (tl - last_ev[rows, top]) < cool
+        fire = active & ~np.isnan(t_on) & (tl - t_on >= min_ev) & (top_p >= on) & ~recently
+        if not fire.any():
+            continue
+
+        idx = np.flatnonzero(fire)
+        lab = top[idx]
+        out[0].append(idx)
+        out[1].append(t_on[idx])
+        out[2].append(np.full(len(idx), tl))
+        out[3].append(lab)
+        out[4].append(top_p[idx])
+        last_ev[idx, lab] = tl
+        above[idx, lab] = np.nan
+        pause_until[idx] = tl + pause[idx]
+
+    if not out[0]:
+        return (np.zeros(0, int), np.zeros(0), np.zeros(0), np.zeros(0, int), np.zeros(0))
+    return tuple(np.concatenate(col) for col in out)
+
+
+# ---------- scoring against labeled timelines ----------
+def score_events(events, timeline, match_slack=1.0):
+    """
+    Greedy match of events to ground-truth intervals with the same label.
+
+    An event matches a truth interval when its t_end falls inside
+    [t_start, t_end + match_slack]. Returns (hits, misses, false_triggers,
+    latencies) where latency = event t_end - truth t_start.
+    """
+    used = [False] * len(timeline)
+    latencies = []
+    false_triggers = 0
+    for ev in sorted(events, key=lambda e: e.t_end):
+        for k, (ts, te, lab) in enumerate(timeline):
+            if not used[k] and lab == ev.label and ts <= ev.t_end <= te + match_slack:
+                used[k] = True
+                latencies.append(ev.t_end - ts)
+                break
+        else:
+            false_triggers += 1
+    hits = sum(used)
+    return hits, len(timeline) - hits, false_triggers, latencies
+
+
+def score_grid(classes, events, timeline, P, match_slack=1.0):
+    """
+    Vector-replay counterpart of score_events; returns per-combo arrays
+    (hits, misses, false_triggers, latency_sum).
+    """
+    combo, _, t_end, lab, _ = events
+    hits = np.zeros(P, int)
+    false_t = np.zeros(P, int)
+    lat_sum = np.zeros(P)
+    order = np.lexsort((t_end, combo))
+    combo, t_end, lab = combo[order], t_end[order], lab[order]
+    bounds = np.searchsorted(combo, np.arange(P + 1))
+    for p in range(P):
+        lo, hi = bounds[p], bounds[p + 1]
+        if lo == hi:
+            continue
+        evs = [Event(None, float(t_end[j]), classes[lab[j]], None) for j in range(lo, hi)]
+        h, _, f, lats = score_events(evs, timeline, match_slack)
+        hits[p], false_t[p], lat_sum[p] = h, f, math.fsum(lats)
+    return hits, len(timeline) - hits, false_t, lat_sum
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Append-only event store across live sessions.
+
+Every event of 10_continuous_classification.py used to land only in its
+session folder (live_stream_logs/<ts>/events.csv, plus a prediction.json
+that is overwritten per event), so "how often did punch fire last month"
+meant walking every folder. The live loop now also appends each event to
+one store under event_store/:
+
+    events.bin     fixed 40-byte records (RECORD): wall time, offset in the
+                   session (t_start, t_end), peak probability, and session /
+                   label / mode / feature-schema ids, plus where its features are
+    features.f32   the model features of each event, float32, back to back
+    names.jsonl    id -> name for sessions (with start time and folder),
+                   labels, modes and feature schemas (the column list),
+                   and the event clips (clip_capture.py) with the session and
+                   t_start of the event they belong to
+    index.bin      row numbers sorted by time, by label and by session, for
+                   the first `n` records (memory-mapped by queries)
+
+Files are only ever appended to; a record is written last (one write), so a
+crash mid-event leaves at most unreferenced feature bytes or a partial record,
+which readers ignore. One writer at a time (the live loop).
+
+Queries load the index and look up the matching rows (binary search on time,
+a slice per label / session); records past the index (events since it was
+built) are scanned directly. The live loop rebuilds the index when it exits.
+
+    python3 event_store.py count --label punch --since 2026-09-01
+    python3 event_store.py query --session 2026-10-02_19-30-11 --features
+    python3 event_store.py list
+    python3 event_store.py import live_stream_logs      # backfill old session folders
+    python3 event_store.py index
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+STORE_DIR = os.environ.get("EVENT_STORE", os.path.join(HERE, "event_store"))
+RECORDS_FILE  = "events.bin"
+FEATURES_FILE = "features.f32"
+NAMES_FILE    = "names.jsonl"
+INDEX_FILE    = "index.bin"
+HEADER_W      = 4096      # bytes of JSON header in index.bin
+KINDS = ("session", "label", "mode", "schema", "clip")
+SESSION_FMT = "%Y-%m-%d_%H-%M-%S"   # live_stream_logs folder names
+
+RECORD = np.dtype([
+    ("t",       "<f8"),   # wall time of the event end (unix s)
+    ("t_start", "<f4"),   # s since session start
+    ("t_end",   "<f4"),
+    ("peak",    "<f4"),   # peak probability
+    ("session", "<u4"),
+    ("label",   "<u2"),
+    ("mode",    "<u2"),
+    ("schema",  "<u2"),   # feature column list (names.jsonl)
+    ("n_feat",  "<u2"),   # 0: no features stored
+    ("feat_at", "<u8"),   # offset into features.f32, in floats
+])
+
+# same mapping as label_to_mode in 10_continuous_classification.py (for `import` only)
+LABEL_TO_MODE = {
+    "float": "float", "glide": "glide", "handsup": "glitch", "lefthand": "directional_left",
+    "righthand": "directional_right", "punch": "punch", "slash": "slash", "stillness": "encircling",
+}
+
+
+def read_names(root=STORE_DIR):
+    """{kind: [entry, ...]} from names.jsonl, each entry a dict with at least "id" and "name"."""
+    names = dict((k, []) for k in KINDS)
+    path = os.path.join(root, NAMES_FILE)
+    if not os.path.exists(path):
+        return names
+    with open(path) as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue   # torn last line
+            lst = names.get(e.get("kind"))
+            if lst is not None and e["id"] == len(lst):
+                lst.append(e)
+    return names
+
+
+class EventStore:
+    """Writer side: the live loop opens a session and appends its events."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.names = read_names(root)
+        self.ids = dict((k, dict((e["name"], e["id"]) for e in v)) for k, v in self.names.items())
+        self.rec_fd = os.open(os.path.join(root, RECORDS_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.feat_fd = os.open(os.path.join(root, FEATURES_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # drop a partial record left by a crash, so records stay aligned
+        size = os.fstat(self.rec_fd).st_size
+        if size % RECORD.itemsize:
+            os.ftruncate(self.rec_fd, size - size % RECORD.itemsize)
+        self.session = None
+        self.t0 = 0.0
+        self.appended = 0
+
+    def _id(self, kind, name, **extra):
+        ids = self.ids[kind]
+        if name not in ids:
+            e = dict(kind=kind, id=len(ids), name=name, **extra)
+            with open(os.path.join(self.root, NAMES_FILE), "a") as f:
+                f.write(json.dumps(e) + "\n")
+            ids[name] = e["id"]
+            self.names[kind].append(e)
+        return ids[name]
+
+    def open_session(self, name, t0=None, folder=None):
+        """Start (or continue) session `name`; event offsets are relative to t0 (unix s)."""
+        self.t0 = time.time() if t0 is None else t0
+        self.session = self._id("session", name, t0=round(self.t0, 3), folder=folder)
+        return self.session
+
+    def append(self, t_start, t_end, label, peak, mode="", features=None, columns=None, clip=None):
+        """One event; `features` is a list of floats in `columns` order, `clip` a video path."""
+        rec = np.zeros(1, dtype=RECORD)
+        rec["t"] = self.t0 + t_end
+        rec["t_start"], rec["t_end"], rec["peak"] = t_start, t_end, peak
+        rec["session"] = self.session
+        rec["label"] = self._id("label", str(label))
+        rec["mode"] = self._id("mode", str(mode))
+        if features is not None and len(features):
+            rec["schema"] = self._id("schema", ",".join(columns), columns=list(columns))
+            rec["n_feat"] = len(features)
+            rec["feat_at"] = os.fstat(self.feat_fd).st_size // 4
+            os.write(self.feat_fd, np.asarray(features, dtype="<f4").tobytes())
+        if clip:
+            # keyed by the stored (float32) t_start, so clip_of() matches the record exactly
+            self._id("clip", clip, session=self.session, t_start=float(rec["t_start"][0]))
+        os.write(self.rec_fd, rec.tobytes())   # last: the event exists once this is on disk
+        self.appended += 1
+
+    def close(self, reindex=True):
+        os.close(self.rec_fd)
+        os.close(self.feat_fd)
+        if reindex:
+            build_index(self.root)
+
+
+def records(root=STORE_DIR):
+    """All records, memory-mapped read-only (a partial last record is ignored)."""
+    path = os.path.join(root, RECORDS_FILE)
+    n = os.path.getsize(path) // RECORD.itemsize if os.path.exists(path) else 0
+    if n == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode="r", shape=(n,))
+
+
+def _postings(key, n_keys):
+    """(row numbers grouped by key, ascending within a key; offsets of each key's slice)."""
+    order = np.argsort(key, kind="stable")
+    return order.astype(np.uint32), np.searchsorted(key[order], np.arange(n_keys + 1)).astype(np.uint32)
+
+
+def build_index(root=STORE_DIR):
+    """Write index.bin: a JSON header (HEADER_W bytes) then the index arrays, raw."""
+    recs = records(root)
+    names = read_names(root)
+    t = np.asarray(recs["t"])
+    by_time = np.argsort(t, kind="stable")
+    by_label, label_off = _postings(np.asarray(recs["label"]), len(names["label"]))
+    by_session, session_off = _postings(np.asarray(recs["session"]), len(names["session"]))
+    arrays = {"t_sorted": t[by_time], "by_time": by_time.astype(np.uint32), "by_label": by_label,
+              "label_off": label_off, "by_session": by_session, "session_off": session_off}
+    header, at = {"n": len(recs), "arrays": {}}, HEADER_W
+    for name, a in arrays.items():
+        header["arrays"][name] = [a.dtype.str, at, len(a)]
+        at += a.nbytes
+    head = json.dumps(header).encode()
+    assert len(head) < HEADER_W
+    tmp = os.path.join(root, INDEX_FILE + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(head.ljust(HEADER_W, b" "))
+        for a in arrays.values():
+            f.write(a.tobytes())
+    os.replace(tmp, os.path.join(root, INDEX_FILE))   # readers see the old or the new index, whole
+    return len(recs)
+
+
+def _load_index(root):
+    """{"n": records covered, name: array mapped from index.bin}, or None."""
+    path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        header = json.loads(f.read(HEADER_W))
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    index = {"n": header["n"]}
+    for name, (dtype, at, n) in header["arrays"].items():
+        index[name] = raw[at:at + n * np.dtype(dtype).itemsize].view(dtype)
+    return index
+
+
+def _to_time(s):
+    """Unix time from a number, YYYY-MM-DD, or YYYY-MM-DD_HH-MM-SS / YYYY-MM-DDTHH:MM:SS."""
+    if s is None:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d", SESSION_FMT, "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(s, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"not a time: {s!r}")
+
+
+def query(label=None, session=None, since=None, until=None, root=STORE_DIR):
+    """Records matching every given filter, in time order.
+
+    label / session: a name or a list of names; since / until: unix time or
+    date text (since inclusive, until exclusive). Returns (records, names).
+    """
+    names = read_names(root)
+    recs = records(root)
+    index = _load_index(root)
+    n_idx = 0
+    if index is not None:
+        n_idx = min(index["n"], len(recs))
+    since, until = _to_time(since), _to_time(until)
+
+    def ids(kind, want):
+        if want is None:
+            return None
+        want = [want] if isinstance(want, str) else list(want)
+        lookup = dict((e["name"], e["id"]) for e in names[kind])
+        return np.array([lookup[w] for w in want if w in lookup], dtype=np.int64)
+
+    label_ids, session_ids = ids("label", label), ids("session", session)
+
+    # indexed part: the smallest candidate set the index gives
+    rows = None
+    if n_idx:
+        sets = []
+        for key_ids, order, off in ((label_ids, "by_label", "label_off"), (session_ids, "by_session", "session_off")):
+            if key_ids is not None:
+                o = index[off]
+                key_ids = key_ids[key_ids < len(o) - 1]
+                sets.append(np.concatenate([index[order][o[k]:o[k + 1]] for k in key_ids])
+                            if len(key_ids) else np.zeros(0, dtype=np.uint32))
+        if since is not None or until is not None:
+            ts = index["t_sorted"]
+            lo = np.searchsorted(ts, since, "left") if since is not None else 0
+            hi = np.searchsorted(ts, until, "left") if until is not None else len(ts)
+            sets.append(index["by_time"][lo:hi])
+        rows = np.sort(min(sets, key=len)) if sets else index["by_time"]
+    rows = np.arange(0) if rows is None else rows.astype(np.int64)
+    rows = np.concatenate([rows, np.arange(n_idx, len(recs))])   # not indexed yet: scanned
+
+    out = np.asarray(recs[rows]) if len(rows) else np.zeros(0, dtype=RECORD)
+    keep = np.ones(len(out), dtype=bool)
+    if label_ids is not None:
+        keep &= np.isin(out["label"], label_ids)
+    if session_ids is not None:
+        keep &= np.isin(out["session"], session_ids)
+    if since is not None:
+        keep &= out["t"] >= since
+    if until is not None:
+        keep &= out["t"] < until
+    out = out[keep]
+    return out[np.argsort(out["t"], kind="stable")], names
+
+
+def features(rec, names, root=STORE_DIR):
+    """{column: value} of one record ({} if it has none)."""
+    n = int(rec["n_feat"])
+    if n == 0:
+        return {}
+    vals = np.fromfile(os.path.join(root, FEATURES_FILE), dtype="<f4", count=n, offset=4 * int(rec["feat_at"]))
+    cols = names["schema"][int(rec["schema"])]["columns"]
+    return dict(zip(cols, (float(v) for v in vals)))
+
+
+def clip_of(rec, names):
+    """Path of the event's clip, or None."""
+    if "clip_keys" not in names:
+        names["clip_keys"] = dict(((e["session"], e["t_start"]), e["name"]) for e in names["clip"])
+    return names["clip_keys"].get((int(rec["session"]), float(rec["t_start"])))
+
+
+def import_sessions(live_root, root=STORE_DIR):
+    """Backfill session folders (events.csv) not in the store yet.
+
+    Only the last event of a session gets features: prediction.json is
+    overwritten per event.
+    """
+    store = EventStore(root)
+    done = 0
+    for name in sorted(os.listdir(live_root)):
+        folder = os.path.join(live_root, name)
+        path = os.path.join(folder, "events.csv")
+        if name in store.ids["session"] or not os.path.exists(path):
+            continue
+        try:
+            t0 = datetime.strptime(name, SESSION_FMT).timestamp()
+        except ValueError:
+            t0 = os.path.getmtime(path)
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        pred = {}
+        if os.path.exists(os.path.join(folder, "prediction.json")):
+            with open(os.path.join(folder, "prediction.json")) as f:
+                pred = json.load(f)
+        store.open_session(name, t0, folder=folder)
+        for i, r in enumerate(rows):
+            feat = pred.get("features") if i == len(rows) - 1 and pred.get("predicted_label") == r["label"] else None
+            cols = pred.get("columns_used") or list(feat or [])
+            store.append(float(r["t_start"]), float(r["t_end"]), r["label"], float(r["peak_prob"] or 0.0),
+                         mode=LABEL_TO_MODE.get(r["label"], "unknown"),
+                         features=[feat.get(c, 0.0) for c in cols] if feat else None, columns=cols)
+        done += 1
+    store.close()
+    print(f"[EVENTS] imported {done} session(s), {store.appended} events into {root}")
+
+
+def _when(t):
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--root", default=STORE_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, help_ in (("query", "list matching events"), ("count", "matching events per label")):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("--label", help="comma separated")
+        p.add_argument("--session", help="comma separated session names")
+        p.add_argument("--since", help="unix time or YYYY-MM-DD[_HH-MM-SS]")
+        p.add_argument("--until")
+        if name == "query":
+            p.add_argument("--features", action="store_true", help="print each event's features")
+    sub.add_parser("list", help="sessions in the store")
+    p = sub.add_parser("import", help="backfill live_stream_logs session folders")
+    p.add_argument("live_root")
+    sub.add_parser("index", help="rebuild index.bin")
+    args = ap.parse_args()
+
+    if args.cmd == "import":
+        import_sessions(args.live_root, args.root)
+        build_index(args.root)
+        return
+    if args.cmd == "index":
+        t0 = time.perf_counter()
+        n = build_index(args.root)
+        print(f"[EVENTS] indexed {n} events in {1000 * (time.perf_counter() - t0):.1f} ms")
+        return
+    if args.cmd == "list":
+        recs, names = query(root=args.root)
+        per = np.bincount(recs["session"], minlength=len(names["session"]))
+        for e in names["session"]:
+            print("%-22s %s %5d events  %s" % (e["name"], _when(e["t0"]), per[e["id"]], e.get("folder") or ""))
+        return
+
+    split = lambda s: s.split(",") if s else None
+    t0 = time.perf_counter()
+    recs, names = query(split(args.label), split(args.session), args.since, args.until, args.root)
+    ms = 1000 * (time.perf_counter() - t0)
+    if args.cmd == "count":
+        per = np.bincount(recs["label"], minlength=len(names["label"]))
+        for e in sorted(names["label"], key=lambda e: -per[e["id"]]):
+            if per[e["id"]]:
+                print("%-12s %6d" % (e["name"], per[e["id"]]))
+    else:
+        for r in recs:
+            print("%s  %-22s %7.2f-%7.2f  %-10s %-18s peak %.2f" % (
+                _when(r["t"]), names["session"][r["session"]]["name"], r["t_start"], r["t_end"],
+                names["label"][r["label"]]["name"], names["mode"][r["mode"]]["name"], r["peak"]))
+            if clip_of(r, names):
+                print("     clip:", clip_of(r, names))
+            if args.features:
+                print("    ", json.dumps(features(r, names, args.root)))
+    print(f"[EVENTS] {len(recs)} events ({ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""
+Local stand-in for the lab's `cctl` package (see fakefleet/README.md).
+
+Put fakefleet/ first on PYTHONPATH (and fakefleet/bin on PATH for the shell
+watchers) to run the dispatchers against a simulated fleet.
+"""
+from .api.bot_ctl import Coachbot
+from .api.network import Network
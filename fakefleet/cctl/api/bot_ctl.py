@@ -0,0 +1,6 @@
+class Coachbot:
+    def __init__(self, identifier):
+        self.identifier = int(identifier)
+
+    def __repr__(self):
+        return f"Coachbot({self.identifier})"
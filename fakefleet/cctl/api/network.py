@@ -0,0 +1,21 @@
+"""Fake user network: signal / direct_signal go to the simulated fleet."""
+from ..fleet import fleet
+
+
+class UserNetwork:
+
+    def signal(self, slot, payload):
+        """Broadcast to every robot that is on."""
+        fleet().signal(slot, payload)
+
+    def direct_signal(self, slot, bot, payload):
+        fleet().signal(slot, payload, robots=[bot.identifier])
+
+    def add_slot(self, name, handler):
+        """Host-side handler for robot -> host signals (e.g. clock_sync acks)."""
+        fleet().host_slots[name] = handler
+
+
+class Network:
+    def __init__(self, *args, **kwargs):
+        self.user = UserNetwork()
@@ -0,0 +1,56 @@
+"""
+Fake `cctl` command line: same entry points the dispatchers use
+(create_parser / exec_command) plus main() for the `bin/cctl` shim.
+"""
+import argparse
+import asyncio
+import sys
+
+from .fleet import FleetError, fleet, reset
+
+
+def create_parser():
+    p = argparse.ArgumentParser(prog="cctl", description="fake cctl (simulated Coachbot fleet)")
+    sub = p.add_subparsers(dest="command")
+    sub.required = True
+    for cmd in ("on", "off", "pause", "start"):
+        s = sub.add_parser(cmd)
+        s.add_argument("ids", nargs="*", type=int)
+    s = sub.add_parser("update")
+    s.add_argument("path")
+    sub.add_parser("status")
+    sub.add_parser("reset")
+    return p
+
+
+async def exec_command(args, conf=None):
+    f = fleet()
+    cmd = args.command
+    if cmd == "on":
+        await f.power(args.ids, on=True)
+    elif cmd == "off":
+        await f.power(args.ids or sorted(f.on), on=False)
+    elif cmd == "pause":
+        await f.pause(args.ids or sorted(f.on))
+    elif cmd == "start":
+        await f.start(args.ids)
+    elif cmd == "update":
+        await f.update(args.path)
+    elif cmd == "status":
+        print(f.status())
+    elif cmd == "reset":
+        reset(f.state_path)
+    return 0
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    try:
+        return asyncio.run(exec_command(args))
+    except FleetError as e:
+        print("cctl:", e, file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+class Configuration:
+    """Stand-in for cctl.conf.Configuration; the fake fleet is configured by FAKECCTL_* env vars."""
+
+    def __init__(self, *args, **kwargs):
+        pass
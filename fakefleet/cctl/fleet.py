@@ -0,0 +1,364 @@
+"""
+Simulated Coachbot fleet behind the fake cctl.
+
+Every command waits a sampled latency (lognormal around a median, per robot),
+fails with a configurable probability, and `update` is paced by a shared
+upload bandwidth. Robots listed as dead never answer. State (which robots are
+on, which script they hold / run) is kept in FAKECCTL_STATE so separate
+`cctl` CLI processes see the same fleet, and every effect on a robot is
+appended to FAKECCTL_LOG (JSON lines) for the benchmark driver.
+
+Robots running one of the shift behaviors also play their side of the
+shared-start protocol (clock_sync.py): each has its own clock offset, acks
+pings on the "clock" slot, waits for its start instant after a warm-up and
+logs "motion_start" (and reports it to the host) when it starts moving.
+Robots running the bundle ack sequenced mode signals ("<mode> <seq>") on
+the "mode_ack" host slot (mode_delivery.py), once per copy received, and
+act only on the first copy; acks are lost at the signal fail_rate too.
+
+With robot_id "vid" the robots have no robot.id: they ack (and answer clock
+pings) with a virtual id that differs from their cctl id, as on hardware
+where the two are assigned separately; "cctl" (default) acks with the cctl id.
+
+Config: defaults below, overridden by a JSON file in FAKECCTL_CONFIG and by
+the FAKECCTL_* env vars. `dead` and `fail_rate` are re-read when the config
+file changes, so robots can be killed / revived while a dispatcher runs.
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+DEFAULTS = {
+    "robots": 10,                 # ids 1..robots (ids outside the fleet are unknown)
+    "latency": {                  # command -> [median sec, lognormal sigma], per robot
+        "on":     [0.30, 0.4],
+        "off":    [0.20, 0.4],
+        "pause":  [0.05, 0.5],
+        "start":  [0.05, 0.5],
+        "update": [0.40, 0.3],    # fixed part; the upload itself is paced by upload_bps
+        "signal": [0.01, 0.5],
+    },
+    "fail_rate": {"on": 0.0, "off": 0.0, "pause": 0.0, "start": 0.0, "update": 0.0, "signal": 0.0},
+    "upload_bps": 250000,         # shared link, bytes/sec
+    "dead": [],                   # robot ids that never answer
+    "hang_sec": 3600.0,           # how long a dead robot keeps a command waiting
+    "seed": None,
+    # shared-start protocol (see clock_sync.py and the usr_code_* shift behaviors)
+    "clock_offset_sec": 30.0,     # robot clocks are off by up to +- this much
+    "boot_sec": [3.2, 0.1],       # script warm-up until armed: [median, sigma]
+    "tick_sec": 0.02,             # behavior loop period while waiting to start
+    "sync_scripts": ["usr_code_filler.py", "usr_code_move_left.py", "usr_code_move_right.py"],
+    "sync_modes": ["float", "glide", "punch", "slash", "directional_left", "directional_right"],
+    "bundle": "usr_code_bundle.py",
+    "robot_id": "cctl",           # id robots report: "cctl", or "vid" (shuffled 0..robots-1, != cctl id)
+}
+SYNC_WAIT, START_MAX_WAIT = 3.0, 8.0   # as in the robot code
+
+STATE_PATH = os.environ.get("FAKECCTL_STATE", os.path.join(tempfile.gettempdir(), "fakecctl_state.json"))
+LOG_PATH = os.environ.get("FAKECCTL_LOG", "")
+
+
+class FleetError(RuntimeError):
+    """A command failed on one or more robots."""
+
+
+def load_config():
+    cfg = json.loads(json.dumps(DEFAULTS))
+    path = os.environ.get("FAKECCTL_CONFIG")
+    if path:
+        with open(path) as f:
+            for k, v in json.load(f).items():
+                if isinstance(v, dict) and isinstance(cfg.get(k), dict):
+                    cfg[k].update(v)
+                else:
+                    cfg[k] = v
+    env = os.environ
+    if env.get("FAKECCTL_ROBOTS"):
+        cfg["robots"] = int(env["FAKECCTL_ROBOTS"])
+    if env.get("FAKECCTL_DEAD"):
+        cfg["dead"] = [int(r) for r in env["FAKECCTL_DEAD"].split()]
+    if env.get("FAKECCTL_FAIL"):            # one rate for every command
+        cfg["fail_rate"] = {k: float(env["FAKECCTL_FAIL"]) for k in cfg["fail_rate"]}
+    if env.get("FAKECCTL_UPLOAD_BPS"):
+        cfg["upload_bps"] = float(env["FAKECCTL_UPLOAD_BPS"])
+    if env.get("FAKECCTL_SEED"):
+        cfg["seed"] = int(env["FAKECCTL_SEED"])
+    if env.get("FAKECCTL_ROBOT_ID"):
+        cfg["robot_id"] = env["FAKECCTL_ROBOT_ID"]
+    return cfg
+
+
+class Fleet:
+    def __init__(self, cfg=None, state_path=STATE_PATH, log_path=LOG_PATH):
+        self.cfg = cfg if cfg is not None else load_config()
+        self.state_path = state_path
+        self.log_path = log_path
+        self.rng = random.Random(self.cfg["seed"])
+        self.ids = set(range(1, int(self.cfg["robots"]) + 1))
+        self.dead = set(int(r) for r in self.cfg["dead"])
+        self.on = set()
+        self.loaded = None       # script the robots hold (update is swarm-wide)
+        self.running = {}        # robot -> script it is running
+        self.host_slots = {}     # slot -> handler(sender, payload) registered by the host
+        self.sync = {}           # robot -> shift-behavior start state
+        self.mode_seen = {}      # robot -> (mode, seq) the bundle last acted on
+        self.loop = None         # event loop the dispatcher runs (signals may come from threads)
+        orng = random.Random(self.cfg["seed"])
+        self.clock_off = {r: orng.uniform(-1.0, 1.0) * self.cfg["clock_offset_sec"] for r in sorted(self.ids)}
+        self.own_id = dict((r, r) for r in self.ids)   # cctl id -> id the robot reports
+        if self.cfg.get("robot_id", "cctl") == "vid":
+            vids = list(range(len(self.ids)))
+            orng.shuffle(vids)
+            while len(self.ids) > 1 and any(v == r for v, r in zip(vids, sorted(self.ids))):
+                orng.shuffle(vids)   # every robot's virtual id differs from its cctl id
+            self.own_id = dict(zip(sorted(self.ids), vids))
+        self._cfg_mtime = self._config_mtime()
+        self._load()
+
+    @staticmethod
+    def _config_mtime():
+        path = os.environ.get("FAKECCTL_CONFIG")
+        try:
+            return os.path.getmtime(path) if path else None
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Pick up edits to dead / fail_rate in the config file."""
+        mtime = self._config_mtime()
+        if mtime == self._cfg_mtime:
+            return
+        self._cfg_mtime = mtime
+        cfg = load_config()
+        self.cfg["fail_rate"] = cfg["fail_rate"]
+        self.dead = set(int(r) for r in cfg["dead"])
+
+    # ---- persistence ----
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                st = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.on = set(st.get("on", []))
+        self.loaded = st.get("loaded")
+        self.running = {int(k): v for k, v in st.get("running", {}).items()}
+
+    def _save(self):
+        d = os.path.dirname(self.state_path) or "."
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"on": sorted(self.on), "loaded": self.loaded,
+                       "running": {str(k): v for k, v in self.running.items()}}, f)
+        os.replace(tmp, self.state_path)
+
+    def log(self, robot, event, **extra):
+        if not self.log_path:
+            return
+        rec = dict(t=time.time(), robot=robot, event=event)
+        rec.update(extra)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(rec) + "\n")
+
+    # ---- timing model ----
+    def latency(self, cmd):
+        median, sigma = self.cfg["latency"].get(cmd, [0.05, 0.5])
+        return median * self.rng.lognormvariate(0.0, sigma)
+
+    def fails(self, cmd):
+        return self.rng.random() < self.cfg["fail_rate"].get(cmd, 0.0)
+
+    async def _each(self, cmd, robots, effect):
+        """Run one command on robots in parallel; raise FleetError if any robot failed."""
+        self._refresh()
+        self.loop = asyncio.get_running_loop()
+        async def one(r):
+            if r not in self.ids:
+                return r, "unknown robot"
+            if r in self.dead:
+                await asyncio.sleep(self.cfg["hang_sec"])
+                return r, "no answer"
+            await asyncio.sleep(self.latency(cmd))
+            if self.fails(cmd):
+                self.log(r, cmd + "_failed")
+                return r, "failed"
+            effect(r)
+            return r, None
+
+        results = await asyncio.gather(*(one(int(r)) for r in robots))
+        self._save()
+        bad = {r: why for r, why in results if why}
+        if bad:
+            raise FleetError(f"{cmd}: " + ", ".join(f"{r} {why}" for r, why in sorted(bad.items())))
+
+    # ---- commands ----
+    async def power(self, robots, on=True):
+        def effect(r):
+            if on:
+                self.on.add(r)
+            else:
+                self.on.discard(r)
+                self.running.pop(r, None)
+            self.log(r, "on" if on else "off")
+        await self._each("on" if on else "off", robots, effect)
+
+    async def pause(self, robots):
+        def effect(r):
+            self.running.pop(r, None)
+            self.log(r, "pause")
+        await self._each("pause", robots, effect)
+
+    async def start(self, robots):
+        def effect(r):
+            if r in self.on and self.loaded:
+                self.running[r] = self.loaded
+                self.log(r, "start", script=self.loaded)
+                if self.loaded in self.cfg["sync_scripts"]:
+                    median, sigma = self.cfg["boot_sec"]
+                    self._arm(r, median * self.rng.lognormvariate(0.0, sigma))
+        await self._each("start", robots or sorted(self.on), effect)
+
+    async def update(self, script_path):
+        """Swarm-wide upload to every robot that is on; the upload shares one link."""
+        self._refresh()
+        size = os.path.getsize(script_path)
+        targets = sorted(self.on)
+        live = [r for r in targets if r not in self.dead]
+        await asyncio.sleep(self.latency("update") + size * len(live) / float(self.cfg["upload_bps"]))
+        if len(live) < len(targets):
+            await asyncio.sleep(self.cfg["hang_sec"])
+        if self.fails("update"):
+            raise FleetError("update: upload failed")
+        self.loaded = os.path.basename(script_path)
+        for r in live:
+            self.running.pop(r, None)
+            self.log(r, "update", script=self.loaded, bytes=size)
+        self._save()
+
+    def signal(self, slot, payload, robots=None):
+        """Fire-and-forget like the real user network: each delivery is logged at
+        its sampled arrival time; dropped ones (fail_rate) are logged as such."""
+        now = time.time()
+        targets = sorted(self.on) if robots is None else [int(r) for r in robots]
+        text = payload.decode("utf-8", "replace")
+        for r in targets:
+            if r not in self.ids or r in self.dead or r not in self.on:
+                continue
+            if self.fails("signal"):
+                self.log(r, "signal_dropped", slot=slot, payload=text)
+                continue
+            delay = self.latency("signal")
+            if slot == "clock":
+                self._later(delay, self._on_clock, r, text)
+                continue
+            if slot == "mode" and len(text.split()) > 1:
+                self._later(delay, self._on_mode, r, text)
+                continue
+            self.log(r, "signal", slot=slot, payload=text, t=now + delay)
+            if (slot == "mode" and self.running.get(r) == self.cfg["bundle"]
+                    and text in self.cfg["sync_modes"]):
+                self._arm(r, delay + self.cfg["tick_sec"])
+
+    # ---- robot side of the shared-start protocol ----
+    def _later(self, delay, fn, *args):
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, fn, *args)
+
+    def robot_clock(self, r):
+        return time.time() + self.clock_off[r]
+
+    def _to_host(self, slot, text):
+        handler = self.host_slots.get(slot)
+        if handler is not None:
+            self._later(self.latency("signal"), handler, None, text.encode("utf-8"))
+
+    def _on_mode(self, r, text):
+        """Bundle side of acked mode delivery: ack every copy, act on the first."""
+        if self.running.get(r) != self.cfg["bundle"]:
+            return   # not running the bundle yet: no slot, no ack
+        parts = text.split()
+        mode, seq = parts[:2]
+        if self.fails("signal"):
+            self.log(r, "mode_ack_dropped", payload=text)
+        else:
+            # like robot_lib.ack_mode: own id, plus the cctl id a direct signal named
+            self._to_host("mode_ack", "ack %s %d%s" % (seq, self.own_id[r], " " + parts[2] if len(parts) > 2 else ""))
+        if self.mode_seen.get(r) == (mode, seq):
+            self.log(r, "signal_duplicate", slot="mode", payload=mode, seq=seq)
+            return
+        self.mode_seen[r] = (mode, seq)
+        self.log(r, "signal", slot="mode", payload=mode, seq=seq)
+        if mode in self.cfg["sync_modes"]:
+            self._arm(r, self.cfg["tick_sec"])
+
+    def _arm(self, r, after):
+        """(Re)start a shift behavior: fresh sync state, armed `after` seconds from now."""
+        st = {"pinged": False, "armed": False, "start_at": None, "exact": False, "t_armed": None,
+              "gen": self.sync.get(r, {}).get("gen", 0) + 1}
+        self.sync[r] = st
+        self._later(after, self._tick, r, st["gen"])
+
+    def _on_clock(self, r, text):
+        st = self.sync.get(r)
+        if st is None:
+            return
+        parts = text.split()
+        if parts[0] == "ping":
+            st["pinged"] = True
+            self._to_host("clock_host", "ack %s %d %.4f %d" % (parts[1], self.own_id[r], self.robot_clock(r),
+                                                              1 if st["armed"] else 0))
+        elif parts[0] == "at":
+            for pair in parts[1:]:
+                k, v = pair.split("=")
+                if k == str(self.own_id[r]):
+                    st["start_at"], st["exact"] = float(v), True
+        elif parts[0] == "in" and not st["exact"]:
+            st["start_at"] = self.robot_clock(r) + float(parts[1])
+
+    def _tick(self, r, gen):
+        st = self.sync.get(r)
+        if st is None or st["gen"] != gen or self.running.get(r) is None:
+            return
+        now = self.robot_clock(r)
+        if not st["armed"]:
+            st["armed"], st["t_armed"] = True, now
+        if st["start_at"] is not None:
+            t0 = min(st["start_at"], st["t_armed"] + START_MAX_WAIT)
+        else:
+            t0 = st["t_armed"] + (SYNC_WAIT if st["pinged"] else 1.0)
+        if now < t0:
+            self._later(self.cfg["tick_sec"], self._tick, r, gen)
+            return
+        self.log(r, "motion_start", script=self.running.get(r))
+        self._to_host("clock_host", "started %d %.4f" % (self.own_id[r], now))
+
+    def status(self):
+        lines = []
+        for r in sorted(self.ids):
+            state = "DEAD" if r in self.dead else ("ON" if r in self.on else "OFF")
+            lines.append(f"{r:4d} {state:4s} {self.running.get(r, '-')}")
+        lines.append(f"loaded: {self.loaded or '-'}")
+        return "\n".join(lines)
+
+
+_fleet = None
+
+
+def fleet():
+    """Process-wide fleet (one per dispatcher / CLI invocation)."""
+    global _fleet
+    if _fleet is None:
+        _fleet = Fleet()
+    return _fleet
+
+
+def reset(state_path=STATE_PATH):
+    """Forget on/loaded/running state (robots back to OFF)."""
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
@@ -0,0 +1,145 @@
+"""
+Concurrent per-robot command fan-out.
+
+Each robot gets its own command with its own deadline, so one slow or
+offline robot no longer holds up the rest of the swarm. Robots that miss
+the first deadline are reported as stragglers and, if asked, retried in the
+background with exponential backoff while the caller moves on.
+"""
+import asyncio
+import time
+
+DEADLINE_SEC = 5.0     # per-robot deadline for one attempt
+RETRIES      = 3       # extra attempts for stragglers
+BACKOFF_SEC  = 0.5     # first retry delay, doubled each time
+MAX_INFLIGHT = 32      # concurrent commands in flight (large fleets)
+
+
+class FanoutResult:
+    """Outcome of one fan-out: who succeeded on time, who is still being retried."""
+
+    def __init__(self, name, robots):
+        self.name = name
+        self.robots = list(robots)
+        self.ok = []            # succeeded within the first deadline
+        self.late_ok = []       # succeeded on a background retry
+        self.failed = []        # gave up (after all retries, or no retries)
+        self.errors = {}        # robot -> last error seen
+        self.latency = {}       # robot -> seconds until success
+        self.attempts = {}      # robot -> attempts made
+        self._retry_tasks = []
+
+    @property
+    def partial(self):
+        return bool(self.ok) and len(self.ok) < len(self.robots)
+
+    @property
+    def stragglers(self):
+        done = set(self.ok) | set(self.late_ok) | set(self.failed)
+        return [r for r in self.robots if r not in done]
+
+    def summary(self):
+        s = "%s: %d/%d ok" % (self.name, len(self.ok), len(self.robots))
+        if self.late_ok:
+            s += ", late %s" % self.late_ok
+        if self.stragglers:
+            s += ", retrying %s" % self.stragglers
+        if self.failed:
+            s += ", failed %s" % self.failed
+        return s
+
+    async def wait_retries(self):
+        if self._retry_tasks:
+            await asyncio.gather(*self._retry_tasks, return_exceptions=True)
+
+    def cancel(self):
+        """Drop background retries (e.g. the transition was superseded)."""
+        for t in self._retry_tasks:
+            t.cancel()
+
+
+async def _attempt(send, robot, deadline, sem, observer=None):
+    async with sem:
+        try:
+            out = await asyncio.wait_for(send(robot), deadline)
+        except asyncio.CancelledError:
+            raise   # dropped by us (superseded), says nothing about the robot
+        except Exception:
+            if observer is not None:
+                observer(robot, False)
+            raise
+    if observer is not None:
+        observer(robot, True)
+    return out
+
+
+async def _retry(result, send, robot, deadline, retries, backoff, sem, t0, observer=None):
+    delay = backoff
+    for _ in range(retries):
+        await asyncio.sleep(delay)
+        result.attempts[robot] += 1
+        try:
+            await _attempt(send, robot, deadline, sem, observer)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.errors[robot] = e
+            delay *= 2.0
+            continue
+        result.late_ok.append(robot)
+        result.latency[robot] = time.monotonic() - t0
+        return
+    result.failed.append(robot)
+
+
+async def fan_out(name, send, robots, deadline=DEADLINE_SEC, retries=RETRIES,
+                  backoff=BACKOFF_SEC, background=True, max_inflight=MAX_INFLIGHT, observer=None):
+    """
+    Run `await send(robot)` for every robot concurrently.
+
+    Returns once every robot has succeeded or missed its first deadline.
+    With background=True, stragglers keep being retried after the return
+    (see FanoutResult.late_ok / wait_retries / cancel); otherwise they are
+    retried inline before returning. `observer(robot, ok)` is called after
+    every attempt that completed or missed its deadline.
+    """
+    result = FanoutResult(name, robots)
+    sem = asyncio.Semaphore(max_inflight)
+    t0 = time.monotonic()
+    firsts = await asyncio.gather(*[_attempt(send, r, deadline, sem, observer) for r in result.robots],
+                                  return_exceptions=True)
+    stragglers = []
+    for r, res in zip(result.robots, firsts):
+        result.attempts[r] = 1
+        if isinstance(res, BaseException):
+            result.errors[r] = res
+            stragglers.append(r)
+        else:
+            result.ok.append(r)
+            result.latency[r] = time.monotonic() - t0
+
+    if stragglers and retries <= 0:
+        result.failed.extend(stragglers)
+    elif stragglers:
+        retry_tasks = [asyncio.ensure_future(_retry(result, send, r, deadline, retries, backoff, sem, t0,
+                                                    observer))
+                       for r in stragglers]
+        result._retry_tasks = retry_tasks
+        if not background:
+            await result.wait_retries()
+    return result
+
+
+async def with_retries(name, call, deadline, retries=RETRIES, backoff=BACKOFF_SEC):
+    """Single swarm-wide command (e.g. `cctl update`) with a deadline and bounded retries."""
+    delay = backoff
+    for attempt in range(retries + 1):
+        try:
+            return await asyncio.wait_for(call(), deadline)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print("[WARN] %s failed (attempt %d/%d): %s; retrying in %.1fs"
+                  % (name, attempt + 1, retries + 1, e, delay))
+            await asyncio.sleep(delay)
+            delay *= 2.0
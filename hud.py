@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+# ---------- HUD LAYOUT (same spots as the original inline HUD) ----------
+TITLE_ORG   = (20, 40)
+BAR_X0      = 20
+BAR_Y0      = 60
+BAR_W       = 220
+BAR_H       = 16
+BAR_GAP     = 6
+LABEL_COLOR = (240, 240, 240)
+BAR_COLOR   = (50, 200, 50)
+OUTLINE_CLR = (90, 90, 90)
+ON_COLOR    = (0, 255, 0)
+OFF_COLOR   = (0, 200, 200)
+PAUSE_COLOR = (0, 180, 255)
+
+
+class Hud:
+    """
+    Cached HUD layer for the live classifier.
+
+    Static parts (class names, bar outlines) are rendered once. The dynamic
+    parts (bar fills, numbers, top label) are only re-rendered when the EMA
+    moves by more than `redraw_eps`, and the whole layer is pasted onto the
+    frame with a single masked copy.
+    """
+
+    def __init__(self, classes, on_thresh, frame_size, redraw_eps=0.01):
+        self.classes = [str(c) for c in classes]
+        self.on_thresh = on_thresh
+        self.redraw_eps = redraw_eps
+
+        w, h = frame_size
+        rows = len(self.classes)
+        # HUD region of interest: everything we ever draw lives in the top band
+        self.roi_w = w
+        self.roi_h = min(h, BAR_Y0 + rows * (BAR_H + BAR_GAP) + 4)
+
+        self.static = np.zeros((self.roi_h, self.roi_w, 3), dtype=np.uint8)
+        self.num_x = []
+        for i, cls in enumerate(self.classes):
+            y = BAR_Y0 + i * (BAR_H + BAR_GAP)
+            cv2.rectangle(self.static, (BAR_X0, y), (BAR_X0 + BAR_W, y + BAR_H), OUTLINE_CLR, 1)
+            name = f"{cls[:10]:10s}"
+            org = (BAR_X0 + BAR_W + 10, y + BAR_H - 2)
+            cv2.putText(self.static, name, org, cv2.FONT_HERSHEY_PLAIN, 1.1, LABEL_COLOR, 1)
+            (tw, _), _ = cv2.getTextSize(name, cv2.FONT_HERSHEY_PLAIN, 1.1, 1)
+            self.num_x.append(org[0] + tw)
+
+        self.layer = self.static.copy()
+        self.mask = self.layer.any(axis=2)
+        self._drawn_ema = None
+        self._drawn_top = None
+        self._drawn_pause = None
+
+    def update(self, ema, top_label, top_prob):
+        """Re-render the dynamic parts only if the display would visibly change."""
+        ema = np.asarray(ema, dtype=float)
+        if (self._drawn_pause is None and self._drawn_ema is not None
+                and self._drawn_top == top_label
+                and float(np.max(np.abs(ema - self._drawn_ema))) < self.redraw_eps):
+            return False
+
+        layer = self.static.copy()
+        color = ON_COLOR if top_prob >= self.on_thresh else OFF_COLOR
+        cv2.putText(layer, f"{top_label}  {top_prob:0.2f}", TITLE_ORG,
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.1, color, 3)
+        for i, p in enumerate(ema):
+            y = BAR_Y0 + i * (BAR_H + BAR_GAP)
+            fill = int(BAR_W * float(p))
+            if fill > 0:
+                cv2.rectangle(layer, (BAR_X0, y), (BAR_X0 + fill, y + BAR_H), BAR_COLOR, -1)
+            cv2.putText(layer, f" {float(p):0.2f}", (self.num_x[i], y + BAR_H - 2),
+                        cv2.FONT_HERSHEY_PLAIN, 1.1, LABEL_COLOR, 1)
+
+        self._set_layer(layer)
+        self._drawn_ema = ema.copy()
+        self._drawn_top = top_label
+        self._drawn_pause = None
+        return True
+
+    def paused(self, remaining):
+        """Show the PAUSED banner; only re-rendered when the shown seconds change."""
+        secs = int(round(max(0.0, remaining)))
+        if self._drawn_pause == secs:
+            return False
+        layer = np.zeros_like(self.static)
+        cv2.putText(layer, f"PAUSED {secs:d}s", TITLE_ORG,
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.1, PAUSE_COLOR, 3)
+        self._set_layer(layer)
+        self._drawn_pause = secs
+        self._drawn_ema = None
+        return True
+
+    def _set_layer(self, layer):
+        self.layer = layer
+        self.mask = layer.any(axis=2)
+
+    def composite(self, frame):
+        """Paste the cached layer onto `frame` in place (one masked copy)."""
+        roi = frame[:self.roi_h, :self.roi_w]
+        np.copyto(roi, self.layer[:roi.shape[0], :roi.shape[1]],
+                  where=self.mask[:roi.shape[0], :roi.shape[1], None])
+        return frame
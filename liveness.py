@@ -0,0 +1,149 @@
+"""
+Per-robot liveness table for the dispatcher.
+
+Every per-robot command attempt (fan_out's observer) and every heartbeat
+probe updates a robot's entry: last seen time, consecutive
+failures and a short success history. Robots that keep failing become
+"suspect" and are left out of mode changes, so a dead or flat bot no longer
+stalls every switch until its deadline. Suspects (and healthy robots not
+heard from for a while) are probed in the background with a cheap
+`cctl on <id>`; a suspect that answers READMIT_AFTER probes in a row is
+re-admitted.
+"""
+import asyncio
+import time
+from collections import deque
+
+HEALTHY = "healthy"
+SUSPECT = "suspect"
+
+SUSPECT_AFTER   = 2      # consecutive failures (attempts, incl. retries) before a robot is routed around
+READMIT_AFTER   = 2      # consecutive successful probes before a suspect is routed to again
+PROBE_SEC       = 3.0    # probe interval for suspects (doubles per failed probe, capped)
+PROBE_MAX_SEC   = 30.0
+HEARTBEAT_SEC   = 30.0   # probe healthy robots not seen for this long
+PROBE_DEADLINE  = 3.0
+HISTORY         = 20     # per-robot success history kept for the report
+
+
+class RobotHealth:
+    def __init__(self, robot):
+        self.robot = robot
+        self.state = HEALTHY
+        self.last_seen = None       # time.time() of the last successful command / probe
+        self.fail_streak = 0
+        self.ok_streak = 0
+        self.history = deque(maxlen=HISTORY)
+        self.next_probe = 0.0
+        self.probe_every = PROBE_SEC
+        self.since = time.time()    # when it entered the current state
+
+    def success_rate(self):
+        return sum(self.history) / float(len(self.history)) if self.history else float("nan")
+
+
+class Liveness:
+    def __init__(self, robots, on_readmit=None):
+        self.table = {str(r): RobotHealth(r) for r in robots}
+        self.on_readmit = on_readmit   # called with the robot id when a suspect recovers
+        self.probing = set()
+
+    def _entry(self, robot):
+        key = str(robot)
+        if key not in self.table:
+            self.table[key] = RobotHealth(robot)
+        return self.table[key]
+
+    # ---- recording ----
+    def observe(self, robot, ok):
+        """fan_out observer: one attempt on one robot."""
+        self.record([robot], ok)
+
+    def record(self, robots, ok):
+        now = time.time()
+        for r in robots:
+            e = self._entry(r)
+            e.history.append(bool(ok))
+            if ok:
+                e.last_seen = now
+                e.fail_streak = 0
+                e.ok_streak += 1
+                if e.state == SUSPECT and e.ok_streak >= READMIT_AFTER:
+                    self._set(e, HEALTHY, f"{e.ok_streak} answers in a row")
+                    if self.on_readmit is not None:
+                        self.on_readmit(e.robot)
+            else:
+                e.ok_streak = 0
+                e.fail_streak += 1
+                if e.state == HEALTHY and e.fail_streak >= SUSPECT_AFTER:
+                    self._set(e, SUSPECT, f"{e.fail_streak} failures in a row")
+                    e.probe_every = PROBE_SEC
+                    e.next_probe = now + PROBE_SEC
+
+    def _set(self, e, state, why):
+        print(f"[HEALTH] robot {e.robot} {e.state} → {state} ({why})")
+        e.state = state
+        e.since = time.time()
+
+    # ---- routing ----
+    def healthy(self, robots):
+        """The robots mode changes should go to (keeps the given order)."""
+        return [r for r in robots if self._entry(r).state == HEALTHY]
+
+    def suspects(self):
+        return [e.robot for e in self.table.values() if e.state == SUSPECT]
+
+    def counts(self):
+        out = {HEALTHY: 0, SUSPECT: 0}
+        for e in self.table.values():
+            out[e.state] += 1
+        return out
+
+    # ---- background probing ----
+    def due(self, now):
+        """Robots to probe now: suspects on their backoff, healthy ones gone quiet."""
+        out = []
+        for e in self.table.values():
+            if str(e.robot) in self.probing:
+                continue
+            if e.state == SUSPECT and now >= e.next_probe:
+                out.append(e)
+            elif e.state == HEALTHY and e.last_seen is not None and now - e.last_seen >= HEARTBEAT_SEC:
+                out.append(e)
+        return out
+
+    async def _probe(self, e, probe):
+        self.probing.add(str(e.robot))
+        try:
+            await asyncio.wait_for(probe(e.robot), PROBE_DEADLINE)
+            ok = True
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            ok = False
+        finally:
+            self.probing.discard(str(e.robot))
+        self.record([e.robot], ok)
+        if e.state == SUSPECT:
+            e.probe_every = PROBE_SEC if ok else min(PROBE_MAX_SEC, e.probe_every * 2.0)
+            e.next_probe = time.time() + e.probe_every
+        return ok
+
+    async def run_probes(self, probe, tick=0.5):
+        """Background task: `await probe(robot)` succeeds iff the robot answered."""
+        tasks = set()
+        while True:
+            for e in self.due(time.time()):
+                t = asyncio.ensure_future(self._probe(e, probe))
+                tasks.add(t)
+                t.add_done_callback(tasks.discard)
+            await asyncio.sleep(tick)
+
+    def report(self):
+        lines = ["%5s %-8s %10s %6s %8s" % ("robot", "state", "last seen", "fails", "success")]
+        now = time.time()
+        for e in sorted(self.table.values(), key=lambda e: int(e.robot)):
+            seen = "%8.1fs" % (now - e.last_seen) if e.last_seen else "     never"
+            lines.append("%5s %-8s %10s %6d %7.0f%%" % (e.robot, e.state, seen, e.fail_streak,
+                                                       100.0 * e.success_rate()))
+        return "\n".join(lines)
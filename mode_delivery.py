@@ -0,0 +1,202 @@
+"""
+Acknowledged mode delivery with targeted retransmit.
+
+The dispatchers used to send the mode name on the robots' "mode" slot once
+(plus blind resends a fixed time later, "just in case") and assume it
+arrived: a robot that missed the packet stayed in the old mode until the
+next change. Here every mode change gets a sequence number ("<mode> <seq>"
+on the slot), robots ack it on the "mode_ack" host slot ("ack <seq> <robot
+id>"), and only robots that have not acked are sent it again, by direct
+signal, with a doubling wait, until DELIVERY_DEADLINE. A robot that gets the
+same mode and sequence number twice acks again but does not restart its
+behavior (usr_code_bundle.py).
+
+The id a robot acks with (robot.id, or its virtual id when the API has none)
+need not be the cctl id it is addressed by. Direct signals therefore name
+their target ("<mode> <seq> <cctl id>") and the robot echoes it ("ack <seq>
+<robot id> <cctl id>"); those acks teach the robot id -> cctl id pairing,
+which resolves the acks to later broadcasts. Robots not paired yet get the
+first send of a delivery as a direct signal, not a broadcast.
+
+Per robot, the delivery latency (first send to ack, so it includes the ack's
+way back) and the retransmits it needed go to dispatch_logs/mode_delivery.csv;
+every delivery prints one [MODE] line with the acked count, latency p50 / max
+and the fraction of sends that were retransmits.
+
+Acks need a host-side slot API on the cctl network (`add_slot`). Without it
+(or with ACKED_MODES=0) the old fixed resend schedule is used.
+"""
+import asyncio
+import csv
+import os
+import time
+
+ACK_SLOT          = "mode_ack"
+FIRST_RETRY       = 0.25    # s after the first send before retransmitting (a few signal round trips)
+RETRY_BACKOFF     = 2.0     # the wait doubles after every retransmit round ...
+MAX_RETRY_GAP     = 1.0     # ... up to this
+DELIVERY_DEADLINE = 5.0     # give up on robots that have not acked by then (covers a bundle still booting)
+ACK_POLL          = 0.01    # s between checks for acks
+FALLBACK_RESEND   = (1.0, 2.0)   # no acks possible: extra blind sends, s apart
+ACKED_MODES       = os.environ.get("ACKED_MODES", "1") == "1"
+
+
+class Delivery:
+    """One mode change: who acked when, and what it cost in sends."""
+
+    def __init__(self, mode, seq, robots):
+        self.mode = mode
+        self.seq = seq
+        self.robots = [str(r) for r in robots]
+        self.t0 = time.time()
+        self.pending = set(self.robots)
+        self.latency = {}       # robot -> s from the first send to its ack
+        self.retransmits = {}   # robot -> retransmits it was sent
+        self.sends = 0          # per-robot sends, a broadcast counts once per robot
+        self.superseded = False
+
+    @property
+    def retransmit_fraction(self):
+        return sum(self.retransmits.values()) / float(self.sends) if self.sends else 0.0
+
+
+class ModeDelivery:
+    def __init__(self, client, log_path=None, slot="mode"):
+        self.client = client
+        self.log_path = log_path
+        self.slot = slot
+        self.seq = int(time.time()) % 1000000   # off the clock: a restart does not reuse the last one
+        self.active = {}        # str(seq) -> Delivery awaiting acks
+        self.available = False
+        self.sends_total = 0
+        self.retransmits_total = 0
+        self.cctl_of = {}       # id a robot acks with -> cctl id, learned from acks to direct signals
+        self._loop = None       # event loop that owns active / cctl_of (acks are handed to it)
+
+    def attach(self):
+        """Register the host-side ack slot. False if unsupported (blind resends are used)."""
+        net = self.client.net
+        if not ACKED_MODES:
+            return False
+        if not hasattr(net, "add_slot"):
+            print("[MODE] no host-side slot API; mode signals are not acknowledged")
+            return False
+        self._loop = asyncio.get_event_loop()
+        net.add_slot(ACK_SLOT, self._on_message)
+        self.available = True
+        return True
+
+    def _on_message(self, _, payload):
+        # cctl calls this on its network thread: stamp the arrival, then let the
+        # loop apply it, so active / cctl_of / pending are only touched there
+        self._loop.call_soon_threadsafe(self._on_ack, time.time(), payload)
+
+    def _on_ack(self, t_recv, payload):
+        try:
+            parts = payload.decode("utf-8").split()
+        except Exception:
+            return
+        if len(parts) < 3 or parts[0] != "ack":
+            return
+        if len(parts) >= 4:
+            # ack to a direct signal: it names the cctl id it was sent to
+            robot = parts[3]
+            if self.cctl_of.get(parts[2]) != robot:
+                for own in [k for k, v in self.cctl_of.items() if v == robot]:
+                    del self.cctl_of[own]   # that robot's id changed (restart, new virtual id)
+                self.cctl_of[parts[2]] = robot
+        else:
+            robot = self.cctl_of.get(parts[2])   # unpaired: unknown, wait for the direct retransmit
+        d = self.active.get(parts[1])
+        if d is not None and robot in d.pending:
+            d.pending.discard(robot)
+            d.latency[robot] = t_recv - d.t0
+
+    async def _send(self, payload, robots, broadcast):
+        if broadcast:
+            try:
+                self.client.signal(self.slot, payload)
+            except Exception as e:
+                print("[WARN] mode signal failed:", e)
+            return
+        loop = asyncio.get_event_loop()
+        # direct_signal is a blocking send; keep the loop free (and the robots concurrent).
+        # Each copy names its target so the ack can be paired with the cctl id.
+        res = await asyncio.gather(*(loop.run_in_executor(None, self.client.direct_signal, self.slot, r,
+                                                          payload + b" " + r.encode("utf-8"))
+                                     for r in robots), return_exceptions=True)
+        failed = [r for r, e in zip(robots, res) if isinstance(e, Exception)]
+        if failed:
+            print(f"[WARN] mode signal failed for {failed}")
+
+    async def deliver(self, mode, robots, broadcast=True, superseded=None):
+        """Send `mode` to `robots` (one broadcast, or direct signals) until each acked.
+
+        Returns the Delivery, or None if acks are unavailable and the blind
+        schedule was used. `superseded()` stops retransmitting early.
+        """
+        self.seq += 1
+        payload = ("%s %d" % (mode, self.seq)).encode("utf-8")
+        if not self.available:
+            for delay in (0.0,) + FALLBACK_RESEND:
+                await asyncio.sleep(delay)
+                if superseded is not None and superseded():
+                    return None
+                await self._send(payload, [str(r) for r in robots], broadcast)
+            return None
+
+        d = Delivery(mode, self.seq, robots)
+        if not d.robots:
+            return d
+        self.active[str(d.seq)] = d
+        paired = set(self.cctl_of.values())
+        try:
+            await self._send(payload, d.robots, broadcast and all(r in paired for r in d.robots))
+            d.sends += len(d.robots)
+            gap = FIRST_RETRY
+            t_next = d.t0 + gap
+            deadline = d.t0 + DELIVERY_DEADLINE
+            while d.pending and time.time() < deadline:
+                if superseded is not None and superseded():
+                    d.superseded = True
+                    break
+                if time.time() >= t_next:
+                    missing = sorted(d.pending)
+                    await self._send(payload, missing, broadcast=False)
+                    for r in missing:
+                        d.retransmits[r] = d.retransmits.get(r, 0) + 1
+                    d.sends += len(missing)
+                    gap = min(MAX_RETRY_GAP, gap * RETRY_BACKOFF)
+                    t_next = time.time() + gap
+                await asyncio.sleep(ACK_POLL)
+        finally:
+            self.active.pop(str(d.seq), None)
+        self.sends_total += d.sends
+        self.retransmits_total += sum(d.retransmits.values())
+        self.report(d)
+        return d
+
+    def report(self, d):
+        lat = sorted(d.latency.values())
+        if lat:
+            timing = f"p50 {1000 * lat[len(lat) // 2]:.0f} ms, max {1000 * lat[-1]:.0f} ms"
+        else:
+            timing = "no acks"
+        n_re = sum(d.retransmits.values())
+        missing = f", missing {sorted(d.pending, key=str)}" if d.pending and not d.superseded else ""
+        print(f"[MODE] {d.mode} #{d.seq}: {len(d.latency)}/{len(d.robots)} acked, {timing}, "
+              f"{n_re} retransmits ({100 * d.retransmit_fraction:.0f}% of {d.sends} sends)"
+              f"{' (superseded)' if d.superseded else ''}{missing}")
+        if not self.log_path:
+            return
+        new = not os.path.exists(self.log_path)
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", newline="") as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(["t_sent", "mode", "seq", "robot", "acked", "latency_ms", "retransmits", "superseded"])
+            for r in d.robots:
+                lat_r = d.latency.get(r)
+                w.writerow([f"{d.t0:.3f}", d.mode, d.seq, r, 1 if lat_r is not None else 0,
+                            f"{1000 * lat_r:.1f}" if lat_r is not None else "", d.retransmits.get(r, 0),
+                            1 if d.superseded else 0])
@@ -4,22 +4,27 @@ import time
 import os
 from cctl.api.network import Network
 from cctl.api.bot_ctl import Coachbot
+from robot_lib import PROTO_HOST, pack_state
 
 JSON_PATH = "swarm_config.json"
-SEND_RATE = 10
+POLL_RATE = 10          # swarm_config.json checks per second (nothing is sent unless the mode changed)
+KEEPALIVE_S = 2.0       # resend the current state to the leader this often (it may have restarted)
 
 # Mode to LED mapping (0-255 scale like MSI example)
 MODE_COLORS = {
     "glitch": [255, 0, 255],      # Purple
     "move_left": [255, 0, 0],     # Red
-    "move_right": [0, 255, 0],    # Green  
+    "move_right": [0, 255, 0],    # Green
     "encircle": [255, 255, 0]     # Yellow
 }
 
 def main():
     net = Network().user
     last_mode = None
-    
+    packet = None
+    last_sent = 0.0
+    seq = int(time.time()) & 0xFFFF   # off the clock, so a restart does not reuse the leader's last one
+
     print(f"MSI JSON Controller started. Watching: {JSON_PATH}")
     print("Available modes:", list(MODE_COLORS.keys()))
 
@@ -28,32 +33,37 @@ def main():
             if not os.path.exists(JSON_PATH):
                 time.sleep(1.0)
                 continue
-                
+
             with open(JSON_PATH, 'r') as f:
                 data = json.load(f)
-            
+
             mode = data.get("mode", "").strip().lower()
-            
+
             if mode and mode != last_mode:
                 print(f"Mode change: {last_mode} -> {mode}")
                 last_mode = mode
-                
+
                 led_color = MODE_COLORS.get(mode, [255, 255, 255])  # default white
-                
-                # EXACT MSI format: "speed_x,speed_y;led_r,led_g,led_b"
-                speed_data = '0.0,0.0'  # No movement
-                led_data = ','.join(str(v) for v in led_color)
-                encoded = f'{speed_data};{led_data}'.encode('ascii')
-                
-                print(f"Sending to bot 0: {encoded.decode()}")
-                
+
+                # compact state packet (robot_lib): no movement, LED on the robots' 0-100 scale
+                seq = (seq + 1) & 0xFFFF
+                led = [int(v / 255 * 100) for v in led_color]
+                packet = pack_state(PROTO_HOST, seq, 0.0, 0.0, led)
+
+                print(f"Sending to bot 0: state {seq} LED {led} ({len(packet)} B)")
+
                 # EXACT MSI method: direct_signal to leader
-                net.direct_signal('speed_led', Coachbot(0), encoded)
-                
+                net.direct_signal('speed_led', Coachbot(0), packet)
+                last_sent = time.time()
+
+            elif packet is not None and time.time() - last_sent >= KEEPALIVE_S:
+                net.direct_signal('speed_led', Coachbot(0), packet)   # same seq: the leader ignores it unless it missed the change
+                last_sent = time.time()
+
         except Exception as e:
             print(f"Error: {e}")
-            
-        time.sleep(1.0 / SEND_RATE)
+
+        time.sleep(1.0 / POLL_RATE)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
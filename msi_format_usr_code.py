@@ -1,18 +1,33 @@
+import random
 import time
-import struct
+from robot_lib import *
 
 LEADER_ID = 0  # Bot 0 is the leader/listener
 
-# Message format for bot-to-bot communication (like MSI example)
-MSG_FMT = 'iffffiii'  # ID, x, y, dx, dy, led_r, led_g, led_b
+# Leader -> followers: compact state packets (robot_lib.pack_state, 11 bytes),
+# sent when the state changes and then only as a slow keepalive, instead of a
+# 32-byte struct every 0.1 s. Build with build_usr_code.py and upload
+# build/msi_format_usr_code.py.
+LOOP_DT        = 0.1
+CHANGE_REPEATS = 2      # extra sends of a new state, LOOP_DT apart (one lost packet costs 0.1 s, not a keepalive)
+KEEPALIVE_S    = 1.0    # resend the current state this often (late joiners, missed changes)
 
-def decode_message(message):
-    """EXACT MSI example decode function"""
-    decoded = message.decode('ascii')
-    speed_msg, led_msg = tuple(decoded.split(';'))
-    speed = [float(v) for v in speed_msg.split(',')]
-    led = [int(float(v) / 255 * 100) for v in led_msg.split(',')]  # Convert 255→100
-    return speed[0], speed[1], led
+# Followers relay the leader's state to robots out of its send_msg range
+# (gossip): a follower that gets a newer sequence number passes it on after a
+# random wait, unless it hears copies from RELAY_SUPPRESS other robots first
+# (its neighbours are covered already; the leader's repeats count once), then
+# repeats it under the same rule, the gap doubling from RELAY_KEEPALIVE_S up to
+# RELAY_KEEPALIVE_MAX_S while nothing changes. Hearing an older sequence
+# number from a neighbour brings the relay forward and resets the gap.
+RELAY                 = True
+RELAY_JITTER          = 0.3    # s, uniform wait before passing on a new state
+RELAY_SUPPRESS        = 2      # senders heard repeating it during the wait that cancel our send
+RELAY_KEEPALIVE_S     = 1.0    # s between relays of an unchanged state at first (jittered 0.5-1x) ...
+RELAY_KEEPALIVE_MAX_S = 8.0    # ... doubling up to this
+
+CTL_HDR    = packet_header(PKT_STATE, PROTO_HOST)   # controller -> leader
+LEADER_HDR = packet_header(PKT_STATE, LEADER_ID)    # leader -> followers
+RELAY_TYPE = packet_header(PKT_RELAY, 0)[:1]        # follower -> followers (first byte; any sender)
 
 def copy_list(in_l, out_l):
     """EXACT MSI example copy function"""
@@ -20,70 +35,132 @@ def copy_list(in_l, out_l):
     for i, val in enumerate(in_l):
         out_l[i] = val
 
+def new_leader():
+    # sequence numbers start off the clock so a restarted leader does not
+    # repeat the one its followers applied last
+    return {"seq": int(time.time() * 10) & 0xFFFF, "ctl_seq": None, "dir": [0.0, 0.0], "led": [0, 0, 0],
+            "repeats": 0, "next_send": 0.0}
+
+def leader_apply(st, message):
+    """Controller packet -> True if it changed the state the leader broadcasts."""
+    if message[:2] != CTL_HDR or len(message) < STATE_SIZE:
+        return False
+    seq, dir_x, dir_y, led = unpack_state(message)
+    if seq == st["ctl_seq"]:
+        return False   # controller keepalive
+    st["ctl_seq"] = seq
+    if [dir_x, dir_y] == st["dir"] and led == st["led"]:
+        return False
+    copy_list([dir_x, dir_y], st["dir"])
+    copy_list(led, st["led"])
+    st["seq"] = (st["seq"] + 1) & 0xFFFF
+    st["repeats"] = CHANGE_REPEATS + 1
+    return True
+
+def leader_packet(st, bot_id, now):
+    """Packet to broadcast this tick, or None: on change (plus repeats), else every KEEPALIVE_S."""
+    if st["repeats"] > 0:
+        st["repeats"] -= 1
+    elif now < st["next_send"]:
+        return None
+    st["next_send"] = now + KEEPALIVE_S
+    return pack_state(bot_id, st["seq"], st["dir"][0], st["dir"][1], st["led"])
+
+def new_follower(bot_id=0):
+    return {"seq_bytes": None, "seq": None, "led": [0, 0, 0], "pkt": None,
+            "relay_at": None, "heard": set(), "gap": RELAY_KEEPALIVE_S, "rng": random.Random(bot_id)}
+
+def follower_msg(st, msg, now=0.0):
+    """Leader (or relayed) packet -> new LED, or None if it is from someone else or nothing new."""
+    if msg[:2] != LEADER_HDR and not (RELAY and msg[:1] == RELAY_TYPE):
+        return None   # other sender / type / version
+    if msg[2:4] == st["seq_bytes"]:
+        st["heard"].add(msg[1])   # a repeat of what we applied: its sender counts against our relay
+        return None
+    if len(msg) < STATE_SIZE:
+        return None
+    seq, _, _, led = unpack_state(msg)
+    if st["seq"] is not None and not seq_newer(seq, st["seq"]):
+        if RELAY and st["pkt"] is not None:
+            # a neighbour is behind: relay ours soon instead of at the next keepalive
+            soon = now + st["rng"].uniform(0.0, RELAY_JITTER)
+            if st["relay_at"] is None or soon < st["relay_at"]:
+                st["relay_at"], st["heard"], st["gap"] = soon, set(), RELAY_KEEPALIVE_S
+        return None
+    st["seq_bytes"], st["seq"] = msg[2:4], seq
+    copy_list(led, st["led"])
+    if RELAY:
+        st["pkt"] = msg[:STATE_SIZE]
+        st["relay_at"], st["heard"], st["gap"] = now + st["rng"].uniform(0.0, RELAY_JITTER), set(), RELAY_KEEPALIVE_S
+    return led
+
+def follower_packet(st, bot_id, now):
+    """Relay packet to broadcast this tick, or None (not due, or enough copies heard)."""
+    if st["relay_at"] is None or now < st["relay_at"]:
+        return None
+    send = len(st["heard"]) < RELAY_SUPPRESS
+    st["relay_at"] = now + st["gap"] * st["rng"].uniform(0.5, 1.0)
+    st["gap"] = min(RELAY_KEEPALIVE_MAX_S, 2.0 * st["gap"])
+    st["heard"] = set()
+    return relay_of(st["pkt"], bot_id) if send else None
+
 def usr(bot):
     """Main function - MSI structure with leader/follower roles"""
     bot.logger.info("Bot %d starting MSI-style controller" % bot.id)
-    
+
     # Boot sequence
     for _ in range(2):
         bot.set_led(100, 100, 100)
-        time.sleep(0.2)
+        bot.delay(200)
         bot.set_led(0, 0, 0)
-        time.sleep(0.2)
-    
-    # State variables (like MSI example)
-    current_dir = [0.0, 0.0]
-    current_led = [0, 0, 0]
-    
-    def message_handler(_, message):
-        """Handler for controller messages (leader only)"""
-        bot.logger.info("Leader received controller message")
-        dir_x, dir_y, led = decode_message(message)
-        copy_list([dir_x, dir_y], current_dir)
-        copy_list(led, current_led)
-        
-        # Leader sets its own LED immediately
-        bot.set_led(current_led[0], current_led[1], current_led[2])
-        bot.logger.info("Leader LED set to %s" % current_led)
-    
-    # Only leader registers for controller messages
+        bot.delay(200)
+
     if bot.id == LEADER_ID:
+        st = new_leader()
+
+        def message_handler(_, message):
+            """Handler for controller messages (leader only)"""
+            try:
+                if leader_apply(st, message):
+                    # Leader sets its own LED immediately
+                    bot.set_led(st["led"][0], st["led"][1], st["led"][2])
+                    bot.logger.info("Leader state %d: dir %s LED %s" % (st["seq"], st["dir"], st["led"]))
+            except Exception as e:
+                bot.logger.info("Leader message error: %s" % str(e))
+
+        # Only leader registers for controller messages
         bot.net.add_slot('speed_led', message_handler)
         bot.logger.info("Leader registered for controller messages")
-    
+    else:
+        st = new_follower(bot.id)
+
     # Main loop - different behavior for leader vs followers
     while True:
         if bot.id == LEADER_ID:
-            # LEADER: Broadcast current state to followers in radius
-            current_pos, _ = bot.get_pose_blocking(1.0)
-            try:
-                # Broadcast message to all bots in communication radius
-                bot.send_msg(struct.pack(MSG_FMT,
-                    bot.id, current_pos.x, current_pos.y,
-                    0, 0,  # No movement
-                    current_led[0], current_led[1], current_led[2]))
-                bot.logger.info("Leader broadcasting LED: %s" % current_led)
-            except Exception as e:
-                bot.logger.info("Leader broadcast error: %s" % str(e))
-                
+            # LEADER: broadcast the state to followers in radius when it changed / is due
+            pkt = leader_packet(st, bot.id, bot.get_clock())
+            if pkt is not None:
+                try:
+                    bot.send_msg(pkt)
+                except Exception as e:
+                    bot.logger.info("Leader broadcast error: %s" % str(e))
+
         else:
-            # FOLLOWER: Listen for leader broadcasts
+            # FOLLOWER: apply new leader states, drop everything else on the header,
+            # and pass the state on to robots the leader does not reach
+            now = bot.get_clock()
             try:
                 msgs = bot.recv_msg()
                 if msgs:
                     for msg_raw in msgs:
-                        if len(msg_raw) >= 32:  # Minimum message size
-                            try:
-                                message = struct.unpack(MSG_FMT, msg_raw[:32])
-                                # Only listen to leader
-                                if message[0] == LEADER_ID:
-                                    new_led = [message[5], message[6], message[7]]
-                                    copy_list(new_led, current_led)
-                                    bot.set_led(current_led[0], current_led[1], current_led[2])
-                                    bot.logger.info("Follower %d updated LED: %s" % (bot.id, current_led))
-                            except Exception as e:
-                                bot.logger.info("Follower message error: %s" % str(e))
+                        led = follower_msg(st, msg_raw, now)
+                        if led is not None:
+                            bot.set_led(led[0], led[1], led[2])
+                            bot.logger.info("Follower %d updated LED: %s" % (bot.id, led))
+                pkt = follower_packet(st, bot.id, now)
+                if pkt is not None:
+                    bot.send_msg(pkt)
             except Exception as e:
                 bot.logger.info("Follower receive error: %s" % str(e))
-        
-        time.sleep(0.1)
\ No newline at end of file
+
+        bot.delay(int(LOOP_DT * 1000))
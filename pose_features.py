@@ -0,0 +1,121 @@
+"""
+Pose features of the live classifier, pulled out of the frame loop so the
+benchmark / golden-output check (bench_features.py) runs the exact code the
+live loop does. Must match the features the model was trained on.
+
+A window is a (T, 99) array: 33 MediaPipe landmarks x (x, y, z) per frame,
+NaN where a landmark was not visible (or no pose was found).
+"""
+import numpy as np
+
+I = {
+    "left_shoulder":11, "right_shoulder":12,
+    "left_wrist":15, "right_wrist":16,
+    "left_hip":23, "right_hip":24,
+    "left_ankle":27, "right_ankle":28
+}
+RANGE_LMS = {"left_wrist":15,"right_wrist":16,"left_ankle":27,"right_ankle":28}
+
+def normalize_per_frame(A):
+    out = A.copy()
+    for t in range(out.shape[0]):
+        lhip = out[t, I["left_hip"]*3:I["left_hip"]*3+3]
+        rhip = out[t, I["right_hip"]*3:I["right_hip"]*3+3]
+        center = (lhip + rhip) / 2.0
+        scale = np.linalg.norm(lhip - rhip) or 1.0
+        for j in range(33):
+            s = j*3; e = s+3
+            out[t, s:e] = (out[t, s:e] - center) / scale
+    return out
+
+def joint_xy(A, idx):
+    return A[:, idx*3+0], A[:, idx*3+1]
+
+def start_end_xy(A, idx):
+    x, y = joint_xy(A, idx)
+    return x[0], y[0], x[-1], y[-1]
+
+def path_len(A, idx):
+    x, y = joint_xy(A, idx)
+    return float(np.sum(np.sqrt(np.diff(x)**2 + np.diff(y)**2)))
+
+def straightness(A, idx):
+    x0, y0, x1, y1 = start_end_xy(A, idx)
+    L = path_len(A, idx) + 1e-9
+    return float(np.hypot(x1 - x0, y1 - y0) / L)
+
+def compute_features(positions, dt):
+    # positions shape: (T, 99) after interpolation and normalization
+    vel  = np.gradient(positions, dt, axis=0)
+    acc  = np.gradient(vel,       dt, axis=0)
+    jerk = np.gradient(acc,       dt, axis=0)
+    vel_mag  = np.linalg.norm(vel,  axis=1)
+    acc_mag  = np.linalg.norm(acc,  axis=1)
+    jerk_mag = np.linalg.norm(jerk, axis=1)
+
+    feat = {
+        "mean_velocity": float(np.mean(vel_mag)),
+        "max_velocity":  float(np.max(vel_mag)),
+        "std_velocity":  float(np.std(vel_mag)),
+        "mean_acceleration": float(np.mean(acc_mag)),
+        "max_acceleration":  float(np.max(acc_mag)),
+        "std_acceleration":  float(np.std(acc_mag)),
+        "mean_jerk": float(np.mean(jerk_mag)),
+        "max_jerk":  float(np.max(jerk_mag)),
+        "std_jerk":  float(np.std(jerk_mag)),
+    }
+    for name, idx in RANGE_LMS.items():
+        x_vals = positions[:, idx*3+0]
+        y_vals = positions[:, idx*3+1]
+        feat[f"range_x_{name}"] = float(np.ptp(x_vals))
+        feat[f"range_y_{name}"] = float(np.ptp(y_vals))
+
+    # body reference levels
+    LSh_y = float(np.mean(positions[:, I["left_shoulder"]*3+1]))
+    RSh_y = float(np.mean(positions[:, I["right_shoulder"]*3+1]))
+    shoulder_y = 0.5*(LSh_y + RSh_y)
+    LH_y = float(np.mean(positions[:, I["left_hip"]*3+1]))
+    RH_y = float(np.mean(positions[:, I["right_hip"]*3+1]))
+    hip_y = 0.5*(LH_y + RH_y)
+    def rel_levels(y): return float(y - shoulder_y), float(y - hip_y)
+
+    for tag, jidx in [("lw", I["left_wrist"]), ("rw", I["right_wrist"]),
+                      ("la", I["left_ankle"]), ("ra", I["right_ankle"])]:
+        x0, y0, x1, y1 = start_end_xy(positions, jidx)
+        dx, dy = (x1 - x0), (y1 - y0)
+        y0_sh, y0_hip = rel_levels(y0)
+        y1_sh, y1_hip = rel_levels(y1)
+        L = path_len(positions, jidx)
+        St = straightness(positions, jidx)
+        feat[f"{tag}_x0"] = x0;  feat[f"{tag}_y0"] = y0
+        feat[f"{tag}_x1"] = x1;  feat[f"{tag}_y1"] = y1
+        feat[f"{tag}_dx"] = dx;  feat[f"{tag}_dy"] = dy
+        feat[f"{tag}_y0_minus_sh"]  = y0_sh
+        feat[f"{tag}_y0_minus_hip"] = y0_hip
+        feat[f"{tag}_y1_minus_sh"]  = y1_sh
+        feat[f"{tag}_y1_minus_hip"] = y1_hip
+        feat[f"{tag}_path_len"]     = L
+        feat[f"{tag}_straight"]     = St
+
+    feat["wrist_y_diff_start"] = float(positions[0, I["right_wrist"]*3+1] - positions[0, I["left_wrist"]*3+1])
+    feat["wrist_y_diff_end"]   = float(positions[-1, I["right_wrist"]*3+1] - positions[-1, I["left_wrist"]*3+1])
+    return feat
+
+
+def interpolate_nans(A):
+    """Fill NaNs per column by linear interpolation over the window (in place); all-NaN columns -> 0."""
+    for d in range(A.shape[1]):
+        s = A[:, d]
+        m = np.isnan(s)
+        if not np.all(m):
+            s[m] = np.interp(np.flatnonzero(m), np.flatnonzero(~m), s[~m])
+        A[:, d] = s
+    return np.nan_to_num(A, nan=0.0)
+
+
+def align_features(feat, cols):
+    """Feature values in model column order; columns the extractor lacks are added to feat as 0.0."""
+    for c in cols:
+        if c not in feat:
+            feat[c] = 0.0
+    return [feat[c] for c in cols]
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+# robot_lib.py
+#
+# Robot-side helpers shared by the usr_code_* behaviors. The behaviors do
+#
+#     from robot_lib import *
+#
+# and build_usr_code.py inlines only the parts each one uses into the file
+# that is actually uploaded (robots only get the one file from `cctl update`).
+# Behaviors must not redefine a name from here: the built file and the
+# imported version would then disagree about which value the helpers see.
+import math
+import os
+import struct
+import time
+
+# --- field bounds and dancer center (meters) ---
+X_MIN, X_MAX = -1.2, 1.0
+Y_MIN, Y_MAX = -1.4, 2.35
+CX, CY = (-0.1, 0.475)
+OBST_CX, OBST_CY = CX, CY
+
+# --- boundary softness ---
+SOFT_MARGIN     = 0.08
+CRIT_MARGIN     = 0.02
+SOFT_MAX_FORCE  = 0.35
+
+# --- drive / control (match sim) ---
+MAX_WHEEL = 35   # max speed is 50
+TURN_K    = 3.0
+FWD_FAST  = 0.8
+FWD_SLOW  = 0.30
+EPS       = 1e-3
+
+
+# --- helpers ---
+def clamp(v, lo, hi):
+    if v < lo:
+        return lo
+    if v > hi:
+        return hi
+    return v
+
+def wrap_angle(a):
+    while a >  math.pi:
+        a -= 2.0 * math.pi
+    while a <= -math.pi:
+        a += 2.0 * math.pi
+    return a
+
+def safe_pose(robot):
+    p = robot.get_pose()
+    if p and len(p) >= 3:
+        return float(p[0]), float(p[1]), float(p[2])
+    return None
+
+def get_vid(robot):
+    try:
+        return robot.virtual_id()
+    except:
+        return -1
+
+def soft_boundary_check(x, y):
+    # Return 0=ok, 1=warn, 2=critical based on margins.
+    if (x < X_MIN + CRIT_MARGIN or x > X_MAX - CRIT_MARGIN or
+        y < Y_MIN + CRIT_MARGIN or y > Y_MAX - CRIT_MARGIN):
+        return 2
+    elif (x < X_MIN + SOFT_MARGIN or x > X_MAX - SOFT_MARGIN or
+          y < Y_MIN + SOFT_MARGIN or y > Y_MAX - SOFT_MARGIN):
+        return 1
+    return 0
+
+def soft_boundary_force(x, y):
+    # Soft push back toward interior near walls.
+    fx = 0.0
+    fy = 0.0
+    if x < X_MIN + SOFT_MARGIN:
+        fx += SOFT_MAX_FORCE * (1.0 - (x - X_MIN) / SOFT_MARGIN)
+    elif x > X_MAX - SOFT_MARGIN:
+        fx -= SOFT_MAX_FORCE * (1.0 - (X_MAX - x) / SOFT_MARGIN)
+    if y < Y_MIN + SOFT_MARGIN:
+        fy += SOFT_MAX_FORCE * (1.0 - (y - Y_MIN) / SOFT_MARGIN)
+    elif y > Y_MAX - SOFT_MARGIN:
+        fy -= SOFT_MAX_FORCE * (1.0 - (Y_MAX - y) / SOFT_MARGIN)
+    return fx, fy
+
+def try_get_swarm_poses(robot):
+    # Try a few common API names for neighbor poses; return [] if none.
+    for nm in ('get_swarm_poses', 'get_all_poses', 'get_poses', 'swarm_poses'):
+        fn = getattr(robot, nm, None)
+        if callable(fn):
+            try:
+                poses = fn()
+                if poses:
+                    return poses
+            except:
+                pass
+    return []
+
+def split_neighbor(item):
+    # (id, x, y, th) or (x, y, th) -> (id or None, x, y)
+    if len(item) == 4:
+        return item[0], item[1], item[2]
+    return None, item[0], item[1]
+
+def neighbor_xy(item):
+    # x, y of a pose item, or None if it is not one
+    if not (isinstance(item, (list, tuple)) and len(item) >= 3):
+        return None
+    if len(item) == 4:
+        return item[1], item[2]
+    return item[0], item[1]
+
+def neighbor_grid(neighbors, cell):
+    # Bucket a pose snapshot into square cells: {(i, j): [pose item, ...]}.
+    # With cell >= the interaction radius, everything that can reach a robot
+    # is in its own cell or the 8 around it (see grid_near).
+    grid = {}
+    for item in neighbors:
+        xy = neighbor_xy(item)
+        if xy is None:
+            continue
+        key = (int(math.floor((xy[0] - X_MIN) / cell)), int(math.floor((xy[1] - Y_MIN) / cell)))
+        cell_items = grid.get(key)
+        if cell_items is None:
+            grid[key] = [item]
+        else:
+            cell_items.append(item)
+    return grid
+
+def grid_near(grid, x, y, cell):
+    # pose items in the 3x3 block of cells around (x, y)
+    ci = int(math.floor((x - X_MIN) / cell))
+    cj = int(math.floor((y - Y_MIN) / cell))
+    out = []
+    for i in (ci - 1, ci, ci + 1):
+        for j in (cj - 1, cj, cj + 1):
+            cell_items = grid.get((i, j))
+            if cell_items:
+                out.extend(cell_items)
+    return out
+
+# snapshot -> grid, shared by every query of the same pose list in this process
+_grid_cache = {"snapshot": None, "n": 0, "ends": None, "grid": None}
+
+def nearby_neighbors(neighbors, x, y, cell):
+    # Pose items that may be within `cell` of (x, y). Building a grid costs
+    # more than one scan of the snapshot, so the first query of a snapshot just
+    # gets the whole list (callers reject far items with a cheap box test);
+    # from the second query of the same snapshot on (robots stepped together
+    # in one process, or a pose API that hands out the same list until new
+    # poses arrive) the grid is built once and only the 3x3 cells are returned.
+    # The same list is only trusted if its length and end items are unchanged
+    # too, in case the API refills one list in place.
+    c = _grid_cache
+    if not neighbors:
+        return neighbors
+    ends = (neighbors[0], neighbors[-1])
+    old = c["ends"]
+    if (neighbors is not c["snapshot"] or len(neighbors) != c["n"]
+            or old is None or ends[0] is not old[0] or ends[1] is not old[1]):
+        c["snapshot"], c["n"], c["ends"], c["grid"] = neighbors, len(neighbors), ends, None
+        return neighbors
+    if c["grid"] is None:
+        c["grid"] = neighbor_grid(neighbors, cell)
+    return grid_near(c["grid"], x, y, cell)
+
+# --- evenly spaced slots on a ring (encircling) ---
+# Ring-mates agree on slots once instead of pushing off each other every tick:
+# sorted by how far they trail the lowest id (the leader) in the direction of
+# travel, the k-th of n takes the angle 2*pi*k/n behind the leader. Every
+# robot sorts the same pose snapshot, so they agree without talking. After
+# that a tick only needs the leader's current angle.
+SLOT_REASSIGN = 3.0   # s; re-sort this often anyway (near-ties at assignment, swapped robots)
+
+def new_slots(direction):
+    return {"dir": direction, "leader": None, "ahead": None, "idx": {}, "rank": 0, "count": 1,
+            "n_seen": -1, "t": None}
+
+def slots_stale(slots, neighbors, now):
+    # (re)assign on the first tick, when the snapshot size changes, and every SLOT_REASSIGN
+    return slots["t"] is None or len(neighbors) != slots["n_seen"] or now - slots["t"] > SLOT_REASSIGN
+
+def assign_slots(slots, rid, mates, n_seen, now):
+    # mates: [(id, ring angle)] of every robot on our ring, us included
+    leader, a_lead = min(mates, key=lambda m: m[0])
+    d = slots["dir"]
+    order = sorted(mates, key=lambda m: (((a_lead - m[1]) * d) % (2.0 * math.pi), m[0]))
+    ids = [str(m[0]) for m in order]
+    rank = ids.index(str(rid))
+    ahead = order[rank - 1][0] if rank > 0 else None   # the leader sets the pace, nobody is ahead of it
+    slots.update(leader=leader, ahead=ahead, rank=rank, count=len(ids), n_seen=n_seen, t=now)
+
+def slot_pose(slots, which, neighbors):
+    # Pose item of slots[which] ("leader" or "ahead"), or None if it is not in
+    # the snapshot. Its index is remembered, so this is O(1) while the
+    # snapshot order holds.
+    rid = slots[which]
+    if rid is None:
+        return None
+    idx = slots["idx"].get(which, -1)
+    if 0 <= idx < len(neighbors) and len(neighbors[idx]) == 4 and neighbors[idx][0] == rid:
+        return neighbors[idx]
+    for i, item in enumerate(neighbors):
+        if isinstance(item, (list, tuple)) and len(item) == 4 and item[0] == rid:
+            slots["idx"][which] = i
+            return item
+    return None
+
+def slot_angle(slots, neighbors):
+    # ring angle of our slot, from the leader's current pose (None without it)
+    item = slot_pose(slots, "leader", neighbors)
+    if item is None:
+        return None
+    a_lead = math.atan2(item[2] - OBST_CY, item[1] - OBST_CX)
+    return a_lead - slots["dir"] * 2.0 * math.pi * slots["rank"] / slots["count"]
+
+def ahead_distance(slots, neighbors, x, y):
+    # distance to the ring-mate in the slot ahead of ours (None without it)
+    item = slot_pose(slots, "ahead", neighbors)
+    if item is None:
+        return None
+    return math.hypot(item[1] - x, item[2] - y)
+
+# --- synchronized start (dispatcher side: clock_sync.py) ---
+SYNC_WAIT      = 3.0   # once pinged by the dispatcher, wait up to this long for its start instant
+START_MAX_WAIT = 8.0   # never wait longer than this after arming, whatever was sent
+
+def try_send_host(robot, slot, payload):
+    # Try a few API names for robot -> host signals; False if none.
+    net = getattr(getattr(robot, 'net', None), 'cctl', None)
+    for nm in ('signal', 'send'):
+        fn = getattr(net, nm, None)
+        if callable(fn):
+            try:
+                fn(slot, payload)
+                return True
+            except:
+                pass
+    return False
+
+def listen_for_sync(robot, sync):
+    # "ping <seq>"       -> ack with our clock (and whether we are armed)
+    # "at <id>=<t> ..."  -> shared start instant, already in our clock
+    # "in <sec>"         -> relative start, if no "at" for us came
+    def on_clock(_, payload):
+        try:
+            parts = payload.decode("utf-8").split()
+            if parts[0] == "ping":
+                sync["pinged"] = True
+                if sync["vid"] == -1:   # pinged during the warm-up, before usr() read it
+                    sync["vid"] = robot.virtual_id()
+                msg = "ack %s %s %.4f %d" % (parts[1], str(sync["vid"]), robot.get_clock(),
+                                             1 if sync["armed"] else 0)
+                try_send_host(robot, "clock_host", msg.encode("utf-8"))
+            elif parts[0] == "at":
+                for pair in parts[1:]:
+                    k, v = pair.split("=")
+                    if k == str(sync["vid"]):
+                        sync["start_at"] = float(v)
+                        sync["exact"] = True
+            elif parts[0] == "in" and not sync["exact"]:
+                sync["start_at"] = robot.get_clock() + float(parts[1])
+        except:
+            pass
+    try:
+        robot.net.cctl.add_slot("clock", on_clock)
+        return True
+    except:
+        return False
+
+# --- acknowledged mode delivery (dispatcher side: mode_delivery.py) ---
+def host_id(robot):
+    # our own id: robot.id if the API has one, else the virtual id. It need not be
+    # the cctl id the dispatcher addresses us by; the dispatcher learns the pairing
+    # from acks to direct signals, which name the cctl id they were sent to
+    rid = getattr(robot, 'id', None)
+    if rid is None:
+        return get_vid(robot)
+    return rid
+
+def parse_mode(payload):
+    # b"glitch", b"glitch <seq>" (broadcast) or b"glitch <seq> <cctl id>" (direct)
+    # -> ("glitch", seq or None, cctl id or None), as strings
+    parts = payload.decode("utf-8").strip().lower().split()
+    if not parts:
+        return "", None, None
+    return parts[0], (parts[1] if len(parts) > 1 else None), (parts[2] if len(parts) > 2 else None)
+
+def ack_mode(robot, seq, to=None):
+    msg = "ack %s %s" % (seq, str(host_id(robot)))
+    if to is not None:
+        msg += " " + to
+    return try_send_host(robot, "mode_ack", msg.encode("utf-8"))
+
+def new_sync():
+    return {"vid": -1, "pinged": False, "armed": False, "start_at": None, "exact": False}
+
+def start_instant(sync, t_armed, warm=False):
+    # The dispatcher's shared instant if it sent one; otherwise the old
+    # "1 s after the first pose" (right away on a warm start: the swarm is
+    # already up and moving), or a longer wait if one is on its way.
+    if sync["start_at"] is not None:
+        return min(sync["start_at"], t_armed + START_MAX_WAIT)
+    if sync["pinged"]:
+        return t_armed + SYNC_WAIT
+    if warm:
+        return t_armed
+    return t_armed + 1.0
+
+# --- experiment_log.txt lines ---
+# Every line starts with the robot clock and id, so logs from several robots
+# (or one file several robots appended to) can be told apart and put back in
+# time order by trajectory_store.py.
+def log_stamp(robot, rid):
+    return "%.3f %s " % (robot.get_clock(), str(rid))
+
+# --- warm start between behaviors ---
+# Each behavior leaves a small per-robot record next to experiment_log.txt
+# (pose, mode, ring, last wheel command, wall time). The next behavior started
+# on the same robot within WARM_FRESH seconds, about where the record says the
+# robot is, skips the boot warm-up and ramps from the old wheel command
+# instead of starting from a stop.
+WARM_FILE        = "robot_state_%s.txt"   # % robot id (one directory per robot, or a shared one in sim)
+WARM_FRESH       = 10.0   # s; older records mean a cold start
+WARM_MOVED       = 0.25   # m; further than this from the recorded pose (moved by hand) = cold start
+WARM_DELAY_MS    = 200    # warm-up kept on a warm start (slot registration, first poses)
+WARM_SAVE_PERIOD = 0.5    # s between record writes while running
+WARM_BLEND       = 1.0    # s to ramp from the recorded wheel command (behaviors without smoothing)
+
+def load_warm(vid):
+    # The previous behavior's record for this robot, or None (no record, unreadable or stale).
+    try:
+        f = open(WARM_FILE % str(vid))
+        try:
+            rec = dict(kv.split("=", 1) for kv in f.read().split())
+        finally:
+            f.close()
+        warm = {"t": float(rec["t"]), "mode": rec["mode"], "x": float(rec["x"]), "y": float(rec["y"]),
+                "th": float(rec["th"]), "ring": float(rec["ring"]), "dir": int(rec["dir"]),
+                "left": int(rec["left"]), "right": int(rec["right"])}
+    except:
+        return None
+    if not (0.0 <= time.time() - warm["t"] < WARM_FRESH):
+        return None
+    return warm
+
+def warm_here(warm, x, y):
+    # the record still holds once the pose is known: the robot was not moved
+    return warm is not None and math.hypot(x - warm["x"], y - warm["y"]) < WARM_MOVED
+
+def save_warm(vid, mode, x, y, th, left, right, ring=0.0, direction=0):
+    # write-then-rename, so the next behavior never reads half a record
+    path = WARM_FILE % str(vid)
+    try:
+        f = open(path + ".tmp", "w")
+        try:
+            f.write("t=%.3f mode=%s x=%.4f y=%.4f th=%.4f ring=%.3f dir=%d left=%d right=%d\n" %
+                    (time.time(), mode, x, y, th, ring, direction, left, right))
+        finally:
+            f.close()
+        os.rename(path + ".tmp", path)
+    except:
+        pass
+
+def warm_blend(warm, elapsed, left, right):
+    # ramp from the recorded wheel command to (left, right) over WARM_BLEND
+    if warm is None or elapsed >= WARM_BLEND:
+        return left, right
+    a = elapsed / WARM_BLEND
+    return int(a * left + (1.0 - a) * warm["left"]), int(a * right + (1.0 - a) * warm["right"])
+
+# --- compact mode / LED packets (msi_format_controller_script.py -> leader -> followers) ---
+# A 4-byte header, then the body:
+#   byte 0    PROTO_VERSION << 4 | packet type
+#   byte 1    sender (robot id, PROTO_HOST for the controller)
+#   byte 2-3  sequence number (uint16), bumped on every change of state
+# Receivers filter on the header bytes alone: a packet from another sender, of
+# another type or version, or repeating the sequence number already applied
+# (keepalives) is dropped without being unpacked.
+PROTO_VERSION = 1
+PKT_STATE     = 1     # body: dx, dy (int16, mm/s), led r, g, b (uint8, robot scale 0-100)
+PKT_RELAY     = 2     # a PKT_STATE packet passed on by another robot (sender = the relaying robot)
+PROTO_HOST    = 255
+STATE_FMT     = ">BBHhhBBB"
+STATE_SIZE    = 11    # struct.calcsize(STATE_FMT)
+
+def packet_header(ptype, sender):
+    # first two header bytes, to compare received packets against
+    return struct.pack(">BB", (PROTO_VERSION << 4) | ptype, sender)
+
+def pack_state(sender, seq, dx, dy, led):
+    return struct.pack(STATE_FMT, (PROTO_VERSION << 4) | PKT_STATE, sender, seq & 0xFFFF,
+                       int(round(dx * 1000)), int(round(dy * 1000)), led[0], led[1], led[2])
+
+def relay_of(msg, sender):
+    # the same state, re-sent by `sender` (only the two header bytes change)
+    return packet_header(PKT_RELAY, sender) + msg[2:STATE_SIZE]
+
+def seq_newer(a, b):
+    # a is a later uint16 sequence number than b (serial-number arithmetic, wraps)
+    return 0 < ((a - b) & 0xFFFF) < 0x8000
+
+def unpack_state(msg):
+    # (seq, dx, dy, [r, g, b]) of a state packet (header already checked)
+    _, _, seq, dx, dy, r, g, b = struct.unpack(STATE_FMT, msg[:STATE_SIZE])
+    return seq, dx / 1000.0, dy / 1000.0, [r, g, b]
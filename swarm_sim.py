@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Headless swarm simulator for the usr_code_* behaviors.
+
+Runs usr(robot) from any behavior file (source or build/) for N robots on a
+virtual clock: robot.delay() returns as soon as every other robot has caught
+up, so a 55 s behavior takes well under a second. Robots are differential
+drive; all of them are advanced together (numpy arrays) each time the clock
+moves. Each robot's usr() runs in its own thread, but only one runs at a time
+and the order is fixed, so a run is repeatable for a given --seed.
+
+    python3 swarm_sim.py usr_code_glitch.py --robots 10
+    python3 swarm_sim.py usr_code_encircling.py --robots 16 --layout near --seconds 60
+    python3 swarm_sim.py build/usr_code_bundle.py --robots 10 --mode 0:encircling --mode 20:glitch
+
+Robot API: get_pose, set_vel, set_led, delay, get_clock, virtual_id,
+get_swarm_poses (neighbor poses), send_msg / recv_msg (broadcast within
+COMM_RADIUS, each delivery lost with probability COMM_LOSS), net.cctl.add_slot (host signals, see --mode) and
+net.cctl.signal (robot -> host, counted), logger, id.
+
+Reported: collisions (robot bodies overlapping; robots pass through each
+other, nothing is blocked), boundary criticals (inside CRIT_MARGIN of the
+field edge, robot_lib.soft_boundary_check() == 2) and dancer-disk
+violations, as events (entries) and robot-seconds spent there, plus any
+exception a usr() raised. The wheel model (WHEEL_SPEED, AXLE) is a guess at
+the Coachbot's, not a measurement.
+
+Each run writes sim_logs/<timestamp>_<behavior>/ (report.json, the behaviors'
+experiment_log.txt, and trace.csv with --trace).
+"""
+import argparse
+import heapq
+import importlib.util
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from build_usr_code import TARGETS
+from robot_lib import CRIT_MARGIN, OBST_CX, OBST_CY, X_MAX, X_MIN, Y_MAX, Y_MIN
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+WHEEL_SPEED    = 0.0045   # m/s per set_vel unit (35 -> ~0.16 m/s)
+AXLE           = 0.10     # m between the wheels
+WHEEL_LIMIT    = 100      # set_vel clamp
+ROBOT_RADIUS   = 0.05     # m; two robots closer than 2x this collide
+COMM_RADIUS    = float("inf")   # send_msg range (m)
+COMM_LOSS      = 0.0      # chance that one send_msg delivery is lost
+DANCER_RADIUS  = 0.5 * 0.3048   # default no-go disk, the behaviors' OBST_RADIUS if they define one
+TRACE_DT       = 0.1      # s between trace.csv rows
+SCRATCH_DIR    = "/dev/shm"   # RAM-backed cwd for the behaviors while they run, if it exists
+
+
+class SimStop(BaseException):
+    """Raised out of robot.delay() when the run ends (a BaseException, so `except Exception` in usr() lets it by)."""
+
+
+def _gate():
+    # A held lock used as a one-shot signal: release() lets the waiter's
+    # acquire() through. Much cheaper than threading.Semaphore (pure Python).
+    lock = threading.Lock()
+    lock.acquire()
+    return lock
+
+
+class _Cctl:
+    def __init__(self, sim, i):
+        self.sim, self.i = sim, i
+
+    def add_slot(self, name, handler):
+        self.sim.slots[self.i][name] = handler
+
+    def signal(self, name, payload):
+        self.sim.host_msgs.append((self.sim.t_us / 1e6, self.sim.ids[self.i], name, payload))
+
+    send = signal
+
+
+class _Net:
+    def __init__(self, sim, i):
+        self.cctl = _Cctl(sim, i)
+        self.add_slot = self.cctl.add_slot
+
+
+class SimRobot:
+    """What usr(robot) gets. Poses come from the swarm's arrays, always current."""
+
+    def __init__(self, sim, i, vid):
+        self.sim, self.i, self.id = sim, i, vid
+        self.net = _Net(sim, i)
+        self.logger = logging.getLogger("swarm_sim.robot%s" % vid)
+        self.go = _gate()
+        self.inbox = []
+        self.led = (0, 0, 0)
+        self.delays = 0
+        self.cpu = 0.0           # wall time spent inside usr() between delays
+        self._resumed = None
+
+    def get_pose(self):
+        s, i = self.sim, self.i
+        return (s.xl[i], s.yl[i], s.thl[i])
+
+    def get_swarm_poses(self):
+        return self.sim.snapshot()
+
+    def set_vel(self, left, right):
+        self.sim.vl[self.i] = max(-WHEEL_LIMIT, min(WHEEL_LIMIT, left))
+        self.sim.vr[self.i] = max(-WHEEL_LIMIT, min(WHEEL_LIMIT, right))
+
+    def set_led(self, r, g, b):
+        self.led = (r, g, b)
+
+    def get_clock(self):
+        return self.sim.t_us / 1e6
+
+    def virtual_id(self):
+        return self.id
+
+    def send_msg(self, payload):
+        self.sim.broadcast(self.i, payload)
+
+    def recv_msg(self):
+        msgs, self.inbox = self.inbox, []
+        return msgs
+
+    def delay(self, ms):
+        t = time.perf_counter()
+        if self._resumed is not None:
+            self.cpu += t - self._resumed
+        self.delays += 1
+        self.sim.wait(self.i, int(round(ms * 1000)))
+        self._resumed = time.perf_counter()
+
+
+class Swarm:
+    def __init__(self, poses, ids=None, dancer_radius=DANCER_RADIUS):
+        n = len(poses)
+        self.ids = list(ids) if ids is not None else list(range(1, n + 1))
+        self.x = np.array([p[0] for p in poses], dtype=float)
+        self.y = np.array([p[1] for p in poses], dtype=float)
+        self.th = np.array([p[2] for p in poses], dtype=float)
+        self.vl = np.zeros(n)
+        self.vr = np.zeros(n)
+        self.dancer_radius = dancer_radius
+        self.robots = [SimRobot(self, i, vid) for i, vid in enumerate(self.ids)]
+        self.slots = [{} for _ in range(n)]
+        self.t_us = 0
+        self.end_us = 0
+        self.queue = []          # (wake time in µs, robot index)
+        self.signals = []        # (time in µs, slot, payload) host -> robot signals still to send
+        self.host_msgs = []      # (t, id, slot, payload) robot -> host
+        self.done = _gate()
+        self.stopping = False
+        self.errors = []
+        self.sent = self.delivered = self.lost = 0
+        self.comm_rng = random.Random(n)   # message loss draws, repeatable
+        self._snap = None
+        self._sync_lists()
+        # violation state: inside now?, entries, robot-seconds
+        self._in_boundary = np.zeros(n, dtype=bool)
+        self._in_dancer = np.zeros(n, dtype=bool)
+        self._pi, self._pj = np.triu_indices(n, 1)   # every pair once
+        self._touching = np.zeros(len(self._pi), dtype=bool)
+        # inside the field by more than CRIT_MARGIN: |x - cx| <= hx and |y - cy| <= hy
+        self._field_cx, self._field_hx = (X_MIN + X_MAX) / 2.0, (X_MAX - X_MIN) / 2.0 - CRIT_MARGIN
+        self._field_cy, self._field_hy = (Y_MIN + Y_MAX) / 2.0, (Y_MAX - Y_MIN) / 2.0 - CRIT_MARGIN
+        self.counts = {"collisions": 0, "boundary_critical": 0, "dancer_disk": 0}
+        self.seconds_in = {"collision": 0.0, "boundary_critical": 0.0, "dancer_disk": 0.0}
+        self.trace = None
+        self._next_trace_us = 0
+        self._check(0.0)
+
+    # --- state shared with the robots ---
+    def _sync_lists(self):
+        self.xl = self.x.tolist()
+        self.yl = self.y.tolist()
+        self.thl = self.th.tolist()
+        self._snap = None
+
+    def snapshot(self):
+        # one pose list per instant, shared by every robot that asks
+        if self._snap is None:
+            self._snap = list(zip(self.ids, self.xl, self.yl, self.thl))
+        return self._snap
+
+    def broadcast(self, i, payload):
+        self.sent += 1
+        for j, r in enumerate(self.robots):
+            if j == i:
+                continue
+            if COMM_RADIUS != float("inf") and math.hypot(self.xl[j] - self.xl[i], self.yl[j] - self.yl[i]) > COMM_RADIUS:
+                continue
+            if COMM_LOSS and self.comm_rng.random() < COMM_LOSS:
+                self.lost += 1
+                continue
+            r.inbox.append(payload)
+            self.delivered += 1
+
+    def signal_at(self, t, slot, payload):
+        """Host signal to every robot (like the dispatcher's net.signal) at virtual time t (s)."""
+        heapq.heappush(self.signals, (int(round(t * 1e6)), len(self.signals), slot, payload))
+
+    # --- kinematics and checks ---
+    def _advance(self, t_us):
+        while self.trace is not None and self._next_trace_us <= t_us:
+            # trace rows at exact multiples of TRACE_DT
+            self._step_to(self._next_trace_us)
+            self._trace_row()
+            self._next_trace_us += int(TRACE_DT * 1e6)
+        self._step_to(t_us)
+        self._sync_lists()
+
+    def _step_to(self, t_us):
+        if t_us > self.t_us:
+            self._step((t_us - self.t_us) / 1e6)
+            self.t_us = t_us
+
+    def _step(self, dt):
+        # exact arc for constant wheel speeds: a chord of length v*dt*sinc(w*dt/2)
+        # along the mid-turn heading (straight lines included, no branch)
+        half = (self.vr - self.vl) * (0.5 * WHEEL_SPEED / AXLE * dt)   # half the turn
+        sinc = np.divide(np.sin(half), half, out=np.ones_like(half), where=half != 0.0)
+        chord = (self.vl + self.vr) * (0.5 * WHEEL_SPEED * dt) * sinc
+        mid = self.th + half
+        self.x += chord * np.cos(mid)
+        self.y += chord * np.sin(mid)
+        self.th = (mid + half + np.pi) % (2.0 * np.pi) - np.pi
+        self._check(dt)
+
+    def _check(self, dt):
+        x, y = self.x, self.y
+        # time already spent in a state counts toward it, then the new state is taken
+        cnt = np.count_nonzero
+        self.seconds_in["boundary_critical"] += dt * cnt(self._in_boundary)
+        self.seconds_in["dancer_disk"] += dt * cnt(self._in_dancer)
+        self.seconds_in["collision"] += dt * cnt(self._touching)
+        out = (np.abs(x - self._field_cx) > self._field_hx) | (np.abs(y - self._field_cy) > self._field_hy)
+        self.counts["boundary_critical"] += cnt(out > self._in_boundary)
+        self._in_boundary = out
+        dancer = np.hypot(x - OBST_CX, y - OBST_CY) < self.dancer_radius
+        self.counts["dancer_disk"] += cnt(dancer > self._in_dancer)
+        self._in_dancer = dancer
+        touching = np.hypot(x[self._pi] - x[self._pj], y[self._pi] - y[self._pj]) < 2.0 * ROBOT_RADIUS
+        self.counts["collisions"] += cnt(touching > self._touching)
+        self._touching = touching
+
+    def _trace_row(self):
+        t = self.t_us / 1e6
+        for i, r in enumerate(self.robots):
+            self.trace.append((round(t, 3), r.id, round(float(self.x[i]), 4), round(float(self.y[i]), 4),
+                               round(float(self.th[i]), 4), float(self.vl[i]), float(self.vr[i])) + tuple(r.led))
+
+    # --- scheduling: exactly one robot thread runs at a time ---
+    def _next(self):
+        """Move the clock to the earliest wake-up and return that robot's index (None: run is over)."""
+        while True:
+            t_sig = self.signals[0][0] if self.signals else None
+            wake = self.queue[0][0] if self.queue else None
+            # robots due at the same instant run first (a signal at t=0 finds their slots registered)
+            if t_sig is not None and (wake is None or t_sig < wake) and t_sig <= self.end_us:
+                t_us, _, slot, payload = heapq.heappop(self.signals)
+                if t_us > self.t_us:
+                    self._advance(t_us)
+                for i, handlers in enumerate(self.slots):
+                    fn = handlers.get(slot)
+                    if fn is not None:
+                        try:
+                            fn(slot, payload)
+                        except Exception as e:
+                            self.errors.append("robot %s slot %s: %r" % (self.ids[i], slot, e))
+                continue
+            if wake is None or wake > self.end_us:
+                if self.end_us > self.t_us:
+                    self._advance(self.end_us)
+                return None
+            _, i = heapq.heappop(self.queue)
+            if wake > self.t_us:
+                self._advance(wake)
+            return i
+
+    def _hand_off(self, i):
+        """Called by robot i's thread when it yields: run whoever is next, then block."""
+        j = self._next()
+        if j == i:
+            return
+        if j is None:
+            self.done.release()
+        else:
+            self.robots[j].go.release()
+
+    def wait(self, i, dt_us):
+        heapq.heappush(self.queue, (self.t_us + dt_us, i))
+        j = self._next()
+        if j != i:
+            if j is None:
+                self.done.release()
+            else:
+                self.robots[j].go.release()
+            self.robots[i].go.acquire()
+        if self.stopping:
+            raise SimStop()
+
+    def run(self, usr, seconds, trace=False):
+        """Run usr(robot) on every robot for `seconds` of virtual time; returns the report."""
+        self.end_us = int(round(seconds * 1e6))
+        self.trace = [] if trace else None
+        finished = set()
+
+        def body(i):
+            robot = self.robots[i]
+            robot.go.acquire()
+            try:
+                if not self.stopping:
+                    usr(robot)
+            except SimStop:
+                pass
+            except Exception as e:
+                self.errors.append("robot %s: %s: %s" % (robot.id, type(e).__name__, e))
+            finally:
+                finished.add(i)
+                if self.stopping:
+                    self.done.release()
+                else:
+                    self._hand_off(i)   # usr() returned: let the others carry on
+
+        threads = [threading.Thread(target=body, args=(i,), daemon=True) for i in range(len(self.robots))]
+        for th in threads:
+            th.start()
+        t0 = time.perf_counter()
+        for i in range(len(self.robots)):
+            heapq.heappush(self.queue, (0, i))
+        j = self._next()
+        if j is not None:
+            self.robots[j].go.release()
+            self.done.acquire()
+        wall = time.perf_counter() - t0
+        self.stopping = True
+        for i in range(len(self.robots)):
+            if i not in finished:
+                self.robots[i].go.release()
+                self.done.acquire()
+        for th in threads:
+            th.join()
+        return self.report(seconds, wall)
+
+    def report(self, seconds, wall):
+        ticks = sum(r.delays for r in self.robots)
+        return {
+            "robots": len(self.robots), "seconds": seconds, "wall_s": round(wall, 4),
+            "speedup": round(seconds / wall, 1) if wall > 0 else None,
+            "robot_ticks": ticks,
+            "usr_us_per_tick": round(1e6 * sum(r.cpu for r in self.robots) / max(1, ticks), 1),
+            "collisions": int(self.counts["collisions"]),
+            "collision_s": round(float(self.seconds_in["collision"]), 3),
+            "boundary_critical": int(self.counts["boundary_critical"]),
+            "boundary_critical_s": round(float(self.seconds_in["boundary_critical"]), 3),
+            "dancer_disk": int(self.counts["dancer_disk"]),
+            "dancer_disk_s": round(float(self.seconds_in["dancer_disk"]), 3),
+            "dancer_radius": self.dancer_radius,
+            "messages_sent": self.sent, "messages_delivered": self.delivered, "messages_lost": self.lost,
+            "host_messages": len(self.host_msgs),
+            "errors": self.errors,
+        }
+
+
+def start_poses(n, layout, rng, dancer_radius=DANCER_RADIUS):
+    """Random start poses. "field": anywhere on the field; "near": scattered around the dancer."""
+    poses = []
+    while len(poses) < n:
+        if layout == "near":
+            a = rng.uniform(-math.pi, math.pi)
+            r = rng.uniform(dancer_radius + 0.11, dancer_radius + 0.75)
+            x, y = OBST_CX + r * math.cos(a), OBST_CY + r * math.sin(a)
+        else:
+            x = rng.uniform(X_MIN + 0.15, X_MAX - 0.15)
+            y = rng.uniform(Y_MIN + 0.15, Y_MAX - 0.15)
+        if math.hypot(x - OBST_CX, y - OBST_CY) < dancer_radius + 0.05:
+            continue
+        if any(math.hypot(x - px, y - py) < 3.0 * ROBOT_RADIUS for px, py, _ in poses):
+            continue
+        poses.append((x, y, rng.uniform(-math.pi, math.pi)))
+    return poses
+
+
+def load_behavior(path):
+    """Import a usr_code_* file (source or build/) as a fresh module."""
+    path = os.path.abspath(path)
+    name = "sim_" + os.path.splitext(os.path.basename(path))[0]
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)   # source files import robot_lib
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def behavior_dancer_radius(path, module):
+    """The behavior's OBST_RADIUS; built files have it folded away, so read it from their source."""
+    if hasattr(module, "OBST_RADIUS"):
+        return module.OBST_RADIUS
+    target = TARGETS.get(os.path.basename(path))
+    if target is not None:
+        return getattr(load_behavior(os.path.join(HERE, target[0])), "OBST_RADIUS", DANCER_RADIUS)
+    return DANCER_RADIUS
+
+
+def simulate(path, n, seconds, layout="field", seed=1, modes=(), trace=False, out_dir=None,
+             dancer_radius=None):
+    """Load a behavior, run it on n robots and return (report, swarm). Logs go to out_dir."""
+    module = load_behavior(path)
+    if dancer_radius is None:
+        dancer_radius = behavior_dancer_radius(path, module)
+    swarm = Swarm(start_poses(n, layout, random.Random(seed), dancer_radius), dancer_radius=dancer_radius)
+    for t, mode in modes:
+        swarm.signal_at(t, "mode", mode.encode("utf-8"))
+    # The behaviors append to ./experiment_log.txt and fsync every line; run
+    # them in a RAM scratch dir where that is free, and keep the log after.
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="swarm_sim_", dir=SCRATCH_DIR if os.path.isdir(SCRATCH_DIR) else None)
+    os.chdir(scratch)
+    try:
+        report = swarm.run(module.usr, seconds, trace=trace)
+    finally:
+        os.chdir(cwd)
+        if out_dir and os.path.exists(os.path.join(scratch, "experiment_log.txt")):
+            os.makedirs(out_dir, exist_ok=True)
+            shutil.move(os.path.join(scratch, "experiment_log.txt"), os.path.join(out_dir, "experiment_log.txt"))
+        shutil.rmtree(scratch, ignore_errors=True)
+    report.update(behavior=os.path.relpath(os.path.abspath(path), HERE), layout=layout, seed=seed)
+    return report, swarm
+
+
+def new_run_dir(root, behavior):
+    """A fresh <root>/<timestamp>_<behavior>[_<k>]; runs started in the same second get their own."""
+    os.makedirs(root, exist_ok=True)
+    name = "%s_%s" % (time.strftime("%Y-%m-%d_%H-%M-%S"), os.path.splitext(os.path.basename(behavior))[0])
+    for k in range(1, 1000):
+        path = os.path.join(root, name if k == 1 else "%s_%d" % (name, k))
+        try:
+            os.mkdir(path)   # atomic: two processes never get the same directory
+            return path
+        except FileExistsError:
+            continue
+    return tempfile.mkdtemp(prefix=name + "_", dir=root)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("behavior", help="usr_code_*.py file (source or build/)")
+    ap.add_argument("--robots", type=int, default=10)
+    ap.add_argument("--seconds", type=float, default=55.0, help="virtual seconds to run")
+    ap.add_argument("--layout", default="field", choices=["field", "near"], help="start positions")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--mode", action="append", default=[], metavar="T:MODE",
+                    help="send MODE on the 'mode' slot at T seconds (bundle), repeatable")
+    ap.add_argument("--dancer-radius", type=float, help="no-go disk to check (default: the behavior's OBST_RADIUS)")
+    ap.add_argument("--comm-radius", type=float, help="send_msg range in m (default: unlimited)")
+    ap.add_argument("--comm-loss", type=float, default=0.0, help="chance a send_msg delivery is lost")
+    ap.add_argument("--trace", action="store_true", help="write trace.csv (poses, wheels, LEDs every %.1f s)" % TRACE_DT)
+    args = ap.parse_args()
+    global COMM_RADIUS, COMM_LOSS
+    if args.comm_radius is not None:
+        COMM_RADIUS = args.comm_radius
+    COMM_LOSS = args.comm_loss
+
+    modes = []
+    for m in args.mode:
+        t, _, name = m.partition(":")
+        modes.append((float(t), name))
+    out_dir = new_run_dir(os.path.join(HERE, "sim_logs"), args.behavior)
+    report, swarm = simulate(args.behavior, args.robots, args.seconds, args.layout, args.seed,
+                             modes, args.trace, out_dir, args.dancer_radius)
+    with open(os.path.join(out_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    if swarm.trace is not None:
+        with open(os.path.join(out_dir, "trace.csv"), "w") as f:
+            f.write("t,id,x,y,th,left,right,led_r,led_g,led_b\n")
+            for row in swarm.trace:
+                f.write(",".join(str(v) for v in row) + "\n")
+
+    print(f"[SIM] {report['behavior']}: {report['robots']} robots, {report['seconds']:.0f} s virtual "
+          f"in {report['wall_s']:.2f} s ({report['speedup']:.0f}x real time, {report['robot_ticks']} robot ticks, "
+          f"{report['usr_us_per_tick']:.0f} µs of usr() per tick)")
+    print(f"[SIM] collisions: {report['collisions']} ({report['collision_s']:.1f} pair-s)   "
+          f"boundary criticals: {report['boundary_critical']} ({report['boundary_critical_s']:.1f} robot-s)   "
+          f"dancer disk: {report['dancer_disk']} ({report['dancer_disk_s']:.1f} robot-s, r={report['dancer_radius']:.3f} m)")
+    for e in report["errors"]:
+        print("[SIM] error:", e)
+    print("[SIM] results:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Offline tuning of the live event logic.
+
+Replays every recorded session (<session>/probs.csv + hand-labeled
+<session>/labels.csv with t_start,t_end,label rows) through the event state
+machine for every combination of the given parameter values and ranks the
+combinations by misses, false triggers and mean event latency.
+
+    python3 sweep_events.py live_stream_logs \
+        --on 0.5:0.8:0.05 --off 0.4:0.6:0.05 --min-event 0.2,0.4,0.6 \
+        --cooldown 0.6 --alpha 0.2:0.6:0.1 --pause 15 --jobs 4
+
+Single session replay with the live defaults:
+
+    python3 sweep_events.py live_stream_logs/2025-10-20_14-13-57 --replay
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from event_logic import (DEFAULT_PARAMS, PARAM_NAMES, EventParams, load_stream,
+                         load_timeline, replay, replay_grid, score_events, score_grid)
+
+STREAM_NAME = "probs.csv"
+LABELS_NAME = "labels.csv"
+
+W_MISS  = 5.0   # ranking weight per missed gesture
+W_FALSE = 2.0   # ranking weight per false trigger
+W_LAT   = 1.0   # ranking weight per second of mean latency
+
+
+def parse_values(spec):
+    """'0.5,0.6' -> [0.5, 0.6];  '0.5:0.8:0.1' -> [0.5, 0.6, 0.7, 0.8]."""
+    if ":" in spec:
+        lo, hi, step = (float(v) for v in spec.split(":"))
+        n = int(round((hi - lo) / step)) + 1
+        return [round(lo + i * step, 6) for i in range(n)]
+    return [float(v) for v in spec.split(",") if v.strip()]
+
+
+def find_sessions(root):
+    if os.path.isfile(os.path.join(root, STREAM_NAME)):
+        return [root]
+    out = []
+    for name in sorted(os.listdir(root)):
+        d = os.path.join(root, name)
+        if os.path.isfile(os.path.join(d, STREAM_NAME)) and os.path.isfile(os.path.join(d, LABELS_NAME)):
+            out.append(d)
+    return out
+
+
+def sweep_session(session, grid, match_slack):
+    classes, t_first, t_last, probs = load_stream(os.path.join(session, STREAM_NAME))
+    timeline = load_timeline(os.path.join(session, LABELS_NAME))
+    events = replay_grid(t_first, t_last, probs, grid)
+    return score_grid(classes, events, timeline, len(grid), match_slack)
+
+
+def run_replay(session, match_slack):
+    classes, t_first, t_last, probs = load_stream(os.path.join(session, STREAM_NAME))
+    events = replay(classes, t_first, t_last, probs, DEFAULT_PARAMS)
+    for ev in events:
+        print(f"[EVENT] {ev.label:10s} {ev.t_start:.2f}–{ev.t_end:.2f}  peak≈{ev.peak_prob:.2f}")
+    labels = os.path.join(session, LABELS_NAME)
+    if os.path.isfile(labels):
+        hits, misses, false_t, lats = score_events(events, load_timeline(labels), match_slack)
+        mean_lat = (sum(lats) / len(lats)) if lats else float("nan")
+        print(f"hits={hits} misses={misses} false={false_t} mean_latency={mean_lat:.2f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("root", help="live_stream_logs folder or a single session folder")
+    ap.add_argument("--replay", action="store_true", help="replay one session with the live defaults")
+    ap.add_argument("--on",        default=str(DEFAULT_PARAMS.on_thresh))
+    ap.add_argument("--off",       default=str(DEFAULT_PARAMS.off_thresh))
+    ap.add_argument("--min-event", default=str(DEFAULT_PARAMS.min_event_sec))
+    ap.add_argument("--cooldown",  default=str(DEFAULT_PARAMS.cooldown_sec))
+    ap.add_argument("--alpha",     default=str(DEFAULT_PARAMS.ema_alpha))
+    ap.add_argument("--pause",     default=str(DEFAULT_PARAMS.pause_after_event_sec))
+    ap.add_argument("--slack", type=float, default=1.0, help="seconds an event may lag the labeled end")
+    ap.add_argument("--jobs", type=int, default=1, help="worker processes (one session per task)")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--out", help="write the full ranking to this CSV")
+    args = ap.parse_args()
+
+    if args.replay:
+        run_replay(args.root, args.slack)
+        return
+
+    axes = [parse_values(s) for s in (args.on, args.off, args.min_event,
+                                      args.cooldown, args.alpha, args.pause)]
+    grid = np.array([c for c in itertools.product(*axes) if c[1] <= c[0]], dtype=float)
+    sessions = find_sessions(args.root)
+    if not sessions or not len(grid):
+        print("[sweep] nothing to do: sessions=%d combos=%d" % (len(sessions), len(grid)))
+        return
+    print(f"[sweep] {len(grid)} combos x {len(sessions)} sessions")
+
+    t0 = time.time()
+    P = len(grid)
+    hits = np.zeros(P, int); misses = np.zeros(P, int)
+    false_t = np.zeros(P, int); lat_sum = np.zeros(P)
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            results = list(ex.map(sweep_session, sessions, [grid] * len(sessions),
+                                  [args.slack] * len(sessions)))
+    else:
+        results = [sweep_session(s, grid, args.slack) for s in sessions]
+    for h, m, f, l in results:
+        hits += h; misses += m; false_t += f; lat_sum += l
+    print(f"[sweep] done in {time.time() - t0:.2f}s")
+
+    mean_lat = np.where(hits > 0, lat_sum / np.maximum(hits, 1), np.inf)
+    score = W_MISS * misses + W_FALSE * false_t + W_LAT * np.where(hits > 0, mean_lat, 0.0)
+    order = np.lexsort((mean_lat, score))
+
+    head = PARAM_NAMES + ["hits", "misses", "false", "mean_latency", "score"]
+    print("  ".join(f"{h[:12]:>12s}" for h in head))
+    for k in order[:args.top]:
+        vals = list(grid[k]) + [hits[k], misses[k], false_t[k], mean_lat[k], score[k]]
+        print("  ".join(f"{v:12.3f}" if isinstance(v, float) else f"{v:12d}" for v in map(_py, vals)))
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(head)
+            for k in order:
+                w.writerow(list(grid[k]) + [hits[k], misses[k], false_t[k], mean_lat[k], score[k]])
+        print("[sweep] wrote", args.out)
+
+    best = EventParams(*grid[order[0]])
+    print("[sweep] best:", ", ".join(f"{n}={v:g}" for n, v in best._asdict().items()))
+
+
+def _py(v):
+    return int(v) if isinstance(v, (np.integer,)) else float(v)
+
+
+if __name__ == "__main__":
+    main()
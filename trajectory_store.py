@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Robot experiment logs -> columnar trajectory store.
+
+The behaviors append free-text lines to experiment_log.txt, each starting
+with the robot clock and id (robot_lib.log_stamp), e.g.
+
+    12.300 4 Robot 4 pos [0.512, -0.210]
+
+After a run, `ingest` parses a session's logs (one file per robot as pulled
+from the robots, or one file several robots appended to, as swarm_sim.py
+writes it) and stores them column by column under trajectories/<session>/:
+
+    robot.npy  int16     robot id
+    t.npy      float64   robot clock (s)
+    x.npy      float32   pose, NaN on lines without one
+    y.npy      float32
+    mode.npy   uint8     index into the session's "modes" (carried forward per robot)
+    event.npy  uint8     index into EVENTS (pos, boundary, mode, finish, ...)
+
+Rows are sorted by robot, then time, so one robot's trajectory is a slice
+(its offsets are in the index). trajectories/index.json lists the sessions
+with row counts, robots, time span and the mode table. `load()` maps the
+columns read-only (np.load mmap_mode="r"), so loading a show is a few file
+opens regardless of its length.
+
+    python3 trajectory_store.py ingest sim_logs/<ts>/experiment_log.txt --session show1
+    python3 trajectory_store.py ingest robot_logs/show1/ --session show1 --mode glitch
+    python3 trajectory_store.py pull show1 --robots 1-10 \\
+        --cmd "scp pi@192.168.1.%(robot)d:experiment_log.txt %(dest)s"
+    python3 trajectory_store.py list
+    python3 trajectory_store.py load show1
+
+cctl has no file transfer, so `pull` runs the given command once per robot
+(in parallel) into robot_logs/<session>/robot_<id>.txt and ingests those.
+Lines from before the clock/id prefix still parse: the id comes from the
+"Robot <id>" text and t counts that robot's pose lines (logged at 1 Hz);
+lines that name no robot are dropped and counted.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+STORE_DIR = os.environ.get("TRAJ_STORE", os.path.join(HERE, "trajectories"))
+RAW_DIR = os.path.join(HERE, "robot_logs")
+INDEX_FILE = "index.json"
+
+COLUMNS = {"robot": np.int16, "t": np.float64, "x": np.float32, "y": np.float32,
+           "mode": np.uint8, "event": np.uint8}
+EVENTS = ["other", "pos", "boundary", "dancer", "obstacle", "start", "finish",
+          "mode", "warm", "assigned", "slot", "error"]
+LINE_W   = 128       # bytes of a line that are looked at (a pose is well inside)
+FIELD_W  = 16        # longest number parsed
+KEY_W    = 40        # bytes from the start and from the end of a message its event type is decided on
+CHUNK    = 1 << 18   # lines parsed at a time (LINE_W bytes each)
+LEGACY_ID_RE = re.compile(r"[Rr]obot (\d+)")
+MODE_RE = re.compile(r" mode -> (\S+)")
+PULL_WORKERS = 16
+
+_NUM_CHARS = np.zeros(256, dtype=bool)
+_NUM_CHARS[[ord(c) for c in "0123456789.-eE+"]] = True
+_NUM_CHARS[0] = True   # padding
+
+
+# Parsing works on the raw bytes with numpy: the lines of a chunk become a
+# (lines x LINE_W) byte grid, the positions of the separators are found per
+# row with argmax, and numbers are cut out as fixed-width byte strings that
+# numpy converts in C. Event types are decided once per distinct message
+# shape (start and end, digits masked), not once per line; regexes only run on the few
+# "mode ->" lines and on lines from before the clock/id prefix.
+def _rows(a, starts, width):
+    """a[s:s + width] for every s, as a (len(starts) x width) copy (a must extend width past them)."""
+    return sliding_window_view(a, width)[starts]
+
+
+def _first(grid, ch, after):
+    """Column of the first `ch` at or after `after` in every row (grid width if none)."""
+    w = grid.shape[1]
+    m = (grid == ch) & (np.arange(w, dtype=np.int16) >= after.astype(np.int16)[:, None])
+    return np.where(m.any(axis=1), m.argmax(axis=1), w)
+
+
+def _cut(grid, lo, hi, width):
+    """Bytes [lo, hi) of every row as a NUL-padded S<width> array."""
+    n, w = grid.shape
+    flat = np.concatenate((grid.ravel(), np.zeros(width, dtype=np.uint8)))
+    lo = np.minimum(lo, w)
+    out = _rows(flat, np.arange(n) * w + lo, width)
+    out = out * (np.arange(width, dtype=np.int16) < (np.minimum(hi, w) - lo).astype(np.int16)[:, None])
+    return np.ascontiguousarray(out, dtype=np.uint8).view("S%d" % width).ravel()
+
+
+def _to_float(field):
+    """S-array -> float64, NaN where it is not a number."""
+    raw = field.view(np.uint8).reshape(len(field), -1)
+    ok = _NUM_CHARS[raw].all(axis=1) & (raw[:, 0] != 0)
+    out = np.full(len(field), np.nan)
+    try:
+        out[ok] = field[ok].astype(np.float64)
+    except ValueError:   # "1.2.3", "-": one by one
+        for i in np.flatnonzero(ok):
+            try:
+                out[i] = float(field[i])
+            except ValueError:
+                pass
+    return out
+
+
+def event_of(msg):
+    """EVENTS index of one message."""
+    if msg.startswith("CRITICAL"):
+        for name in ("boundary", "dancer", "obstacle"):
+            if name in msg:
+                return EVENTS.index(name)
+        return 0
+    if " pos [" in msg or " pos[" in msg:
+        return EVENTS.index("pos")
+    if " mode -> " in msg:
+        return EVENTS.index("mode")
+    if "warm start" in msg:
+        return EVENTS.index("warm")
+    if "finished" in msg or msg.endswith("completed mission"):
+        return EVENTS.index("finish")
+    if (msg.startswith("I am robot") or msg.endswith(" start") or msg.endswith(" started")
+            or msg.endswith(" bundle ready")):
+        return EVENTS.index("start")
+    if " assigned " in msg:
+        return EVENTS.index("assigned")
+    if " slot " in msg:
+        return EVENTS.index("slot")
+    if msg.startswith("ERROR"):
+        return EVENTS.index("error")
+    return 0
+
+
+def _parse_chunk(buf, starts, ends):
+    """One chunk of lines -> dict of columns (robot NaN = unattributed), plus mode names."""
+    n = len(starts)
+    length = np.minimum(ends - starts, LINE_W)
+    w = int(length.max()) if n else 1
+    a = np.concatenate((np.frombuffer(buf, dtype=np.uint8), np.zeros(w, dtype=np.uint8)))
+    grid = _rows(a, starts, w)
+    grid = grid * (np.arange(w, dtype=np.int16) < length.astype(np.int16)[:, None])
+
+    zero = np.zeros(n, dtype=np.int64)
+    s1 = _first(grid, ord(" "), zero)
+    s2 = _first(grid, ord(" "), s1 + 1)
+    t = _to_float(_cut(grid, zero, s1, FIELD_W))
+    rid = _to_float(_cut(grid, s1 + 1, s2, FIELD_W))
+    legacy = np.isnan(t) | np.isnan(rid) | (s2 >= length)
+    msg0 = np.where(legacy, 0, s2 + 1)
+
+    # "... [x, y] ..."
+    br = _first(grid, ord("["), msg0)
+    comma = _first(grid, ord(","), br)
+    close = _first(grid, ord("]"), comma)
+    x = _to_float(_cut(grid, br + 1, comma, FIELD_W))
+    y = _to_float(_cut(grid, comma + 2, close, FIELD_W))
+
+    # event type per distinct message prefix (digits masked so ids / values don't split them)
+    masked = np.where((grid >= ord("0")) & (grid <= ord("9")), ord("#"), grid).astype(np.uint8)
+    # the prefix alone can miss a keyword near the end ("... completed mission"),
+    # so the key is the first KEY_W bytes plus the last KEY_W bytes of the message
+    head = _cut(masked, msg0, length, KEY_W).view(np.uint8).reshape(n, KEY_W)
+    tail = _cut(masked, np.maximum(msg0, length - KEY_W), length, KEY_W).view(np.uint8).reshape(n, KEY_W)
+    key = np.ascontiguousarray(np.hstack([head, tail]))
+    words = key.view(np.uint64)   # (n x 2*KEY_W/8): hash the key into one word (sorting the bytes is slow)
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(words.shape[1]):
+        h = (h ^ words[:, j]) * np.uint64(0x100000001B3)
+    _, first, inv = np.unique(h, return_index=True, return_inverse=True)
+    codes = np.array([event_of(_key_text(key[i].tobytes())) for i in first], dtype=np.uint8)
+    event = codes[inv.ravel()]
+
+    mode_name = {}
+    for i in np.flatnonzero(event == EVENTS.index("mode")):
+        m = MODE_RE.search(buf[starts[i]:ends[i]].decode("utf-8", "replace"))
+        if m:
+            mode_name[i] = m.group(1)
+    for i in np.flatnonzero(legacy):
+        line = buf[starts[i]:ends[i]].decode("utf-8", "replace")
+        m = LEGACY_ID_RE.search(line)
+        rid[i] = float(m.group(1)) if m else np.nan
+        t[i] = np.nan
+    return {"robot": rid, "t": t, "x": x, "y": y, "event": event, "legacy": legacy}, mode_name
+
+
+def _key_text(key):
+    # enough of a message for event_of(): its start and its end, a line apart
+    key = key.ljust(2 * KEY_W, b"\0")
+    return (key[:KEY_W].rstrip(b"\0") + b"\n" + key[KEY_W:].rstrip(b"\0")).decode("utf-8", "replace")
+
+
+def parse(buf, default_mode=""):
+    """Log bytes -> (columns sorted by robot, t; mode table; lines; lines dropped)."""
+    a = np.frombuffer(buf, dtype=np.uint8)
+    if not len(a):
+        a = np.frombuffer(b"\n", dtype=np.uint8)
+    ends = np.flatnonzero(a == ord("\n"))
+    if len(a) and a[-1] != ord("\n"):
+        ends = np.append(ends, len(a))
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+    ends = ends.astype(np.int64)
+    ends = ends - ((ends > starts) & (a[np.maximum(ends - 1, 0)] == ord("\r")))   # CRLF
+    nonempty = ends > starts
+    starts, ends = starts[nonempty], ends[nonempty]
+    n_lines = len(starts)
+
+    parts, names = [], {}
+    for k in range(0, n_lines, CHUNK):
+        cols, mode_name = _parse_chunk(buf, starts[k:k + CHUNK], ends[k:k + CHUNK])
+        parts.append(cols)
+        names.update({k + i: v for i, v in mode_name.items()})
+    if parts:
+        cols = {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+    else:
+        cols = {c: np.zeros(0) for c in ("robot", "t", "x", "y", "event", "legacy")}
+
+    keep = ~np.isnan(cols["robot"])
+    dropped = int(n_lines - keep.sum())
+    mode_of_line = np.full(n_lines, -1, dtype=np.int64)
+    modes, codes = [default_mode], {default_mode: 0}
+    for i, name in sorted(names.items()):
+        if name not in codes:
+            codes[name] = len(modes)
+            modes.append(name)
+        mode_of_line[i] = codes[name]
+    cols = {c: v[keep] for c, v in cols.items()}
+    mode_of_line = mode_of_line[keep]
+    robot = cols["robot"].astype(np.int64)
+    order = np.arange(len(robot))
+
+    # old lines have no clock: one pose line per second of the robot's run (file order)
+    legacy = cols["legacy"]
+    if legacy.any():
+        by_robot = np.argsort(robot, kind="stable")
+        pos = (cols["event"][by_robot] == EVENTS.index("pos")).astype(float)
+        cum = np.cumsum(pos)
+        first = np.r_[True, robot[by_robot][1:] != robot[by_robot][:-1]]
+        base = np.maximum.accumulate(np.where(first, np.arange(len(cum)), 0))
+        t_leg = np.empty(len(cum))
+        t_leg[by_robot] = cum - cum[base] + pos[base]
+        cols["t"] = np.where(legacy, t_leg, cols["t"])
+
+    # several writers in one file: back into per-robot time order (stable, so
+    # lines with the same clock keep the order they were written in)
+    idx = np.lexsort((order, cols["t"], robot))
+    cols = {c: v[idx] for c, v in cols.items()}
+    robot, mode_of_line = robot[idx], mode_of_line[idx]
+
+    # mode carried forward per robot from its last "mode ->" line
+    first = np.r_[True, robot[1:] != robot[:-1]] if len(robot) else np.zeros(0, dtype=bool)
+    mark = np.where((mode_of_line >= 0) | first, np.arange(len(robot)), 0)
+    src = np.maximum.accumulate(mark) if len(mark) else mark
+    mode = np.maximum(mode_of_line[src], 0)
+
+    out = {"robot": robot, "t": cols["t"], "x": cols["x"], "y": cols["y"], "mode": mode, "event": cols["event"]}
+    return out, modes, n_lines, dropped
+
+
+def ingest(paths, session, root=STORE_DIR, default_mode=""):
+    """Parse the session's log files and (re)write its columns and index entry."""
+    t0 = time.perf_counter()
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith(".txt"))
+        else:
+            files.append(p)
+    chunks = []
+    for path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        chunks.append(data if data.endswith(b"\n") or not data else data + b"\n")
+    cols, modes, n_lines, dropped = parse(b"".join(chunks), default_mode)
+
+    out = os.path.join(root, session)
+    tmp = out + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for col, dtype in COLUMNS.items():
+        np.save(os.path.join(tmp, col + ".npy"), cols[col].astype(dtype))
+    if os.path.isdir(out):
+        for f in os.listdir(out):
+            os.remove(os.path.join(out, f))
+        os.rmdir(out)
+    os.replace(tmp, out)
+
+    robots = cols["robot"]
+    ids, starts = np.unique(robots, return_index=True)
+    ends = list(starts[1:]) + [len(robots)]
+    rows = len(robots)
+    entry = {
+        "rows": int(rows), "lines": int(n_lines), "dropped": dropped,
+        "robots": [int(r) for r in ids],
+        "offsets": {str(int(r)): [int(a), int(b)] for r, a, b in zip(ids, starts, ends)},
+        "t_min": float(np.nanmin(cols["t"])) if rows else None,
+        "t_max": float(np.nanmax(cols["t"])) if rows else None,
+        "modes": modes, "sources": [os.path.relpath(f, HERE) for f in files],
+        "ingested": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    index = sessions(root)
+    index[session] = entry
+    _write_index(root, index)
+    ms = 1000 * (time.perf_counter() - t0)
+    print(f"[TRAJ] {session}: {n_lines} lines from {len(files)} file(s) -> {rows} rows, "
+          f"{len(ids)} robots ({dropped} unattributed lines dropped) in {ms:.0f} ms")
+    return entry
+
+
+def sessions(root=STORE_DIR):
+    """The index: session -> {rows, robots, offsets, t_min, t_max, modes, ...}."""
+    try:
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(root, index):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, INDEX_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def load(session, root=STORE_DIR, robot=None):
+    """A session's columns (read-only memory maps), optionally one robot's slice.
+
+    Returns {column: array, "modes": [names], "events": EVENTS}.
+    """
+    entry = sessions(root)[session]
+    data = {col: np.load(os.path.join(root, session, col + ".npy"), mmap_mode="r") for col in COLUMNS}
+    if robot is not None:
+        a, b = entry["offsets"][str(robot)]
+        data = {col: arr[a:b] for col, arr in data.items()}
+    data["modes"] = entry["modes"]
+    data["events"] = EVENTS
+    return data
+
+
+def pull(session, robots, cmd, raw_dir=RAW_DIR):
+    """Run `cmd` (%(robot)d, %(dest)s) per robot into raw_dir/<session>/; returns the directory."""
+    dest_dir = os.path.join(raw_dir, session)
+    os.makedirs(dest_dir, exist_ok=True)
+
+    def one(r):
+        dest = os.path.join(dest_dir, "robot_%d.txt" % r)
+        res = subprocess.run(cmd % {"robot": r, "dest": dest}, shell=True,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return r, res.returncode, res.stderr.decode("utf-8", "replace").strip()
+
+    with ThreadPoolExecutor(max_workers=PULL_WORKERS) as pool:
+        failed = [(r, err) for r, rc, err in pool.map(one, robots) if rc != 0]
+    print(f"[TRAJ] pulled {len(robots) - len(failed)}/{len(robots)} robot logs into {dest_dir}")
+    for r, err in failed:
+        print(f"[WARN] robot {r}: {err or 'pull failed'}")
+    return dest_dir
+
+
+def parse_robots(spec):
+    """"1-5,8" -> [1, 2, 3, 4, 5, 8]"""
+    out = []
+    for part in spec.split(","):
+        a, _, b = part.partition("-")
+        out.extend(range(int(a), int(b or a) + 1))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest", help="parse log files / directories into a session")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--session", required=True)
+    p.add_argument("--mode", default="", help="mode of lines before any 'mode ->' line (single-behavior runs)")
+    p = sub.add_parser("pull", help="fetch every robot's log, then ingest")
+    p.add_argument("session")
+    p.add_argument("--robots", required=True, help='e.g. "1-10,12"')
+    p.add_argument("--cmd", required=True, help="shell command, %%(robot)d and %%(dest)s are filled in")
+    p.add_argument("--mode", default="")
+    sub.add_parser("list", help="sessions in the store")
+    p = sub.add_parser("load", help="load a session and report timing")
+    p.add_argument("session")
+    args = ap.parse_args()
+
+    if args.cmd == "ingest":
+        ingest(args.paths, args.session, default_mode=args.mode)
+    elif args.cmd == "pull":
+        ingest([pull(args.session, parse_robots(args.robots), args.cmd)], args.session, default_mode=args.mode)
+    elif args.cmd == "list":
+        for name, e in sorted(sessions().items()):
+            span = (e["t_max"] - e["t_min"]) if e["rows"] else 0.0
+            print(f"{name:24s} {e['rows']:9d} rows {len(e['robots']):4d} robots {span:8.1f} s  "
+                  f"modes {','.join(m for m in e['modes'] if m) or '-'}  ({e['ingested']})")
+    else:
+        t0 = time.perf_counter()
+        data = load(args.session)
+        # touch every column so the pages are really read
+        for col in COLUMNS:
+            np.nansum(data[col])
+        ms = 1000 * (time.perf_counter() - t0)
+        events = np.bincount(data["event"], minlength=len(EVENTS))
+        print(f"[TRAJ] {args.session}: {len(data['t'])} rows loaded and read in {ms:.1f} ms "
+              f"({sum(a.nbytes for c, a in data.items() if c in COLUMNS) / 1e6:.1f} MB)")
+        print("[TRAJ] events:", ", ".join(f"{n}={c}" for n, c in zip(EVENTS, events) if c))
+
+
+if __name__ == "__main__":
+    main()
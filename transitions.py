@@ -0,0 +1,143 @@
+"""
+Latest-wins scheduler for mode transitions.
+
+Mode requests are coalesced: while a transition is running, only the newest
+request is kept, and the running transition is told it has been superseded
+the next time it reaches a safe point (Transition.checkpoint), e.g. before
+it starts robots on a mode nobody wants any more. Every transition ends as
+"applied", "superseded" or "failed", with its timings recorded.
+"""
+import asyncio
+import csv
+import os
+import time
+from collections import deque
+
+APPLIED    = "applied"
+SUPERSEDED = "superseded"
+FAILED     = "failed"
+
+
+class Superseded(Exception):
+    """Raised at a safe point when a newer mode request is waiting."""
+
+
+class Transition:
+    def __init__(self, mode, ts, scheduler):
+        self.mode = mode
+        self.ts = ts
+        self.requested_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.outcome = None
+        self.error = None
+        self._scheduler = scheduler
+
+    @property
+    def superseded(self):
+        return self._scheduler.pending is not None
+
+    def checkpoint(self, where=""):
+        """Safe point: abort here if a newer request arrived."""
+        if self.superseded:
+            raise Superseded(where)
+
+    def timings(self):
+        queued = (self.started_at or self.finished_at) - self.requested_at
+        ran = (self.finished_at - self.started_at) if self.started_at else 0.0
+        return queued, ran
+
+
+class TransitionScheduler:
+    """
+    apply_fn(transition) is awaited for each transition that gets to run; it
+    should call transition.checkpoint() between steps and raise on failure.
+    """
+
+    def __init__(self, apply_fn, retry_failed_after=1.0, log_path=None, history=200, on_finish=None,
+                 on_submit=None):
+        self.apply_fn = apply_fn
+        self.on_finish = on_finish   # called with each finished Transition
+        self.on_submit = on_submit   # called with each new request, before the worker wakes
+        self.retry_failed_after = retry_failed_after
+        self.log_path = log_path
+        self.pending = None          # newest request not started yet
+        self.current = None          # transition in flight
+        self.history = deque(maxlen=history)
+        self._wake = asyncio.Event()
+
+    def submit(self, mode, ts):
+        """Queue a mode request; replaces (supersedes) any request not yet started."""
+        if self.pending is not None:
+            self._finish(self.pending, SUPERSEDED)
+        self.pending = Transition(mode, ts, self)
+        if self.on_submit is not None:
+            self.on_submit(self.pending)
+        self._wake.set()
+        return self.pending
+
+    @property
+    def busy(self):
+        return self.current is not None or self.pending is not None
+
+    @property
+    def backlog(self):
+        return int(self.current is not None) + int(self.pending is not None)
+
+    async def run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self.pending is not None:
+                tr, self.pending = self.pending, None
+                self.current = tr
+                tr.started_at = time.time()
+                try:
+                    await self.apply_fn(tr)
+                except Superseded as e:
+                    self._finish(tr, SUPERSEDED, e)
+                except asyncio.CancelledError:
+                    self._finish(tr, FAILED, "cancelled")
+                    raise
+                except Exception as e:
+                    self._finish(tr, FAILED, e)
+                    if self.pending is None and self.retry_failed_after is not None:
+                        # nothing newer: try the same request again shortly
+                        await asyncio.sleep(self.retry_failed_after)
+                        if self.pending is None:
+                            self.pending = Transition(tr.mode, tr.ts, self)
+                else:
+                    self._finish(tr, APPLIED)
+                finally:
+                    self.current = None
+
+    def _finish(self, tr, outcome, error=None):
+        tr.finished_at = time.time()
+        tr.outcome = outcome
+        tr.error = error
+        self.history.append(tr)
+        queued, ran = tr.timings()
+        msg = f"[TRANSITION] {tr.mode} {outcome} (queued {queued:.2f}s, ran {ran:.2f}s)"
+        if error:
+            msg += f": {error}"
+        print(msg)
+        if self.log_path:
+            self._log(tr, queued, ran)
+        if self.on_finish is not None:
+            self.on_finish(tr)
+
+    def _log(self, tr, queued, ran):
+        new = not os.path.exists(self.log_path)
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", newline="") as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(["requested_at", "mode", "config_ts", "outcome", "queued_sec", "run_sec", "error"])
+            w.writerow([f"{tr.requested_at:.3f}", tr.mode, tr.ts, tr.outcome,
+                        f"{queued:.3f}", f"{ran:.3f}", str(tr.error or "")])
+
+    def counts(self):
+        out = {APPLIED: 0, SUPERSEDED: 0, FAILED: 0}
+        for tr in self.history:
+            out[tr.outcome] += 1
+        return out
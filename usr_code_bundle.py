@@ -0,0 +1,675 @@
+# -*- coding: utf-8 -*-
+# usr_code_bundle.py
+#
+# All choreography behaviors in one robot program. Upload once, start once,
+# then switch behavior by sending the mode name on the "mode" network slot
+# (same slot as usr_code_mode_echo.py / color_usr_code.py):
+#
+#     net.signal("mode", b"glitch")
+#
+# The new mode is picked up at the next control tick; the boot warm-up only
+# happens once (and is cut short by a fresh robot_lib warm-start record). A
+# mode switch hands the new behavior the same kind of record in memory.
+from __future__ import division
+import math
+import os
+import random
+import time
+from robot_lib import *
+
+# --- dancer no-go circle (meters) ---
+FEET = 0.3048
+OBST_DIAM_FT = 1.0
+OBST_RADIUS  = 0.5 * OBST_DIAM_FT * FEET
+OBST_MARGIN  = 0.03
+SAFE_BUBBLE  = OBST_RADIUS + OBST_MARGIN
+
+# glitch keeps its own (larger) disk, as in usr_code_glitch.py
+GLITCH_OBST_RADIUS = 0.5 * OBST_DIAM_FT * 0.6048
+GLITCH_SAFE_BUBBLE = GLITCH_OBST_RADIUS + OBST_MARGIN
+
+# --- drive / control (match sim) ---
+CMD_SMOOTH = 0.25   # 0=no smoothing, 1=hold last
+
+# --- encircling ---
+R_INNER   = SAFE_BUBBLE + 0.24
+R_OUTER   = SAFE_BUBBLE + 0.42
+DIR_INNER = +1   # +1 = CCW
+DIR_OUTER = -1   # -1 = CW
+ASSIGN_MODE = "by_id"  # "by_id" or "by_initial_radius"
+V_TANGENT_BASE = 0.26
+K_R            = 1.2
+RADIAL_CLAMP   = 0.10
+SPACING        = "slots"  # "slots" (robot_lib.assign_slots, O(1) per tick) or "repulsion" (pairwise)
+K_PACE         = 0.8      # slots: forward pace change per rad of slot error
+PACE_MIN       = 0.5
+PACE_MAX       = 1.3
+ANG_REP_GAIN   = 0.24
+ANG_REP_POW    = 1.2
+ANG_REP_CUTOFF = 1.2
+MIN_LINEAR_SEP = 0.18
+ENC_FWD_MIN    = 0.40
+
+# --- glitch ---
+REPULSE_RADIUS  = 0.75
+REPULSE_GAIN    = 0.12
+HARD_REP_RADIUS = 0.18
+HARD_REP_GAIN   = 0.28
+NOISE_GAIN      = 0.12
+NOISE_SIDE_FRAC = 0.7
+FWD_GAIN        = 0.95
+LEFT_BIAS_VX    = 0.00
+GLITCH_FWD_MIN  = 0.35
+GRID_CELL       = REPULSE_RADIUS   # neighbor grid cell (robot_lib.nearby_neighbors): one cell = influence radius
+
+# --- shift (move_left / move_right / filler) ---
+BASE_SHIFT_RATE = 0.18
+STOP_MARGIN     = 0.08
+KX = 1.2
+KY = 2.0
+KR = 2.6
+
+# --- timing ---
+BOOT_DELAY_MS = 2000
+PRINT_PERIOD  = 2.0
+MAX_RUNTIME   = 55.0     # glitch / shift behaviors stop after this long
+LOOP_DT_MS    = 40
+
+# mode name (swarm_config.json "mode") -> behavior state
+MODE_TO_STATE = {
+    "float":             "filler",
+    "glide":             "filler",
+    "punch":             "filler",
+    "slash":             "filler",
+    "glitch":            "glitch",
+    "directional_left":  "move_left",
+    "directional_right": "move_right",
+    "encircling":        "encircling",
+    "idle":              "idle",
+}
+
+
+# --- helpers ---
+def wheels_toward(vx, vy, th, fwd_scale=1.0, slow=FWD_SLOW, fwd_min=0.0, warn=False, warn_k=0.7):
+    # Heading control: map a desired (vx, vy) to wheel commands.
+    err = wrap_angle(math.atan2(vy, vx) - th)
+    ae = abs(err)
+    if ae < 0.5:
+        fwd = FWD_FAST * fwd_scale
+    elif ae < 1.2:
+        fwd = FWD_FAST * 0.7 * fwd_scale
+    else:
+        fwd = slow * fwd_scale
+    if warn:
+        fwd *= warn_k
+    if fwd < fwd_min:
+        fwd = fwd_min
+    turn = clamp(TURN_K * err, -1.5, 1.5)
+    left  = clamp(int(MAX_WHEEL * 0.9 * (fwd - 0.8 * turn)), -MAX_WHEEL, MAX_WHEEL)
+    right = clamp(int(MAX_WHEEL * 0.9 * (fwd + 0.8 * turn)), -MAX_WHEEL, MAX_WHEEL)
+    return left, right
+
+
+def neighbor_ring(nid, nr):
+    # encircling ring a neighbor is on, by the same rule as our own assignment
+    if ASSIGN_MODE == "by_id" and nid is not None:
+        return R_INNER if (int(nid) % 2 == 0) else R_OUTER
+    return R_INNER if abs(nr - R_INNER) <= abs(nr - R_OUTER) else R_OUTER
+
+
+def ring_mates(neighbors, rid, ring_R, theta):
+    # [(id, ring angle)] of the robots on our ring, us included; None if the
+    # poses carry no ids (no leader to agree on)
+    mates = [(rid, theta)]
+    for item in neighbors:
+        if not (isinstance(item, (list, tuple)) and len(item) >= 3):
+            continue
+        if len(item) != 4:
+            return None
+        nid, nx, ny = item[0], item[1], item[2]
+        if str(nid) == str(rid):
+            continue
+        dxn = nx - OBST_CX
+        dyn = ny - OBST_CY
+        if abs(neighbor_ring(nid, math.hypot(dxn, dyn)) - ring_R) < abs(R_OUTER - R_INNER) / 2.0:
+            mates.append((nid, math.atan2(dyn, dxn)))
+    return mates
+
+
+def neighbor_force(x, y, vid, candidates):
+    # Neighbor repulsion (1/r^2) + hard-core 1/r^3 anti-clump from pose items.
+    me = str(vid)
+    r = REPULSE_RADIUS
+    vx = 0.0
+    vy = 0.0
+    for item in candidates:
+        if not isinstance(item, (list, tuple)):
+            continue
+        k = len(item)
+        if k == 4:
+            dxn = x - item[1]
+            dyn = y - item[2]
+        elif k >= 3:
+            dxn = x - item[0]
+            dyn = y - item[1]
+        else:
+            continue
+        if dxn >= r or dxn <= -r or dyn >= r or dyn <= -r:
+            continue    # outside the influence box: no sqrt / division needed
+        d2 = dxn * dxn + dyn * dyn
+        if d2 < 1e-12 or d2 >= r * r:
+            continue
+        if k == 4 and str(item[0]) == me:
+            continue
+        s = REPULSE_GAIN / d2
+        vx += s * dxn
+        vy += s * dyn
+        if d2 < (HARD_REP_RADIUS * HARD_REP_RADIUS):
+            d = math.sqrt(d2)
+            s_hard = HARD_REP_GAIN / (d2 * d + 1e-9)
+            vx += s_hard * dxn
+            vy += s_hard * dyn
+    return vx, vy
+
+
+# --- behaviors ---
+# Each behavior is entered with the current pose and stepped once per tick.
+# step() returns False when the behavior is over (the robot then idles).
+class Idle(object):
+    name = "idle"
+    dt_ms = LOOP_DT_MS
+
+    def __init__(self, ctx, x, y, th):
+        ctx.drive(0, 0)
+
+    def step(self, ctx, x, y, th):
+        ctx.drive(0, 0)
+        return True
+
+
+class Encircling(object):
+    name = "encircling"
+    dt_ms = LOOP_DT_MS
+
+    def __init__(self, ctx, x, y, th):
+        rid = ctx.rid
+        warm = ctx.warm
+        if warm and warm["mode"] == "encircling" and warm["ring"] > 0.0:
+            # keep the ring we were on (by_initial_radius would re-pick from where we are now)
+            self.R, self.dir = warm["ring"], warm["dir"]
+        elif ASSIGN_MODE == "by_id":
+            if (rid % 2) == 0:
+                self.R, self.dir = R_INNER, DIR_INNER
+            else:
+                self.R, self.dir = R_OUTER, DIR_OUTER
+        else:
+            r = math.hypot(x - OBST_CX, y - OBST_CY)
+            self.R = R_INNER if abs(r - R_INNER) <= abs(r - R_OUTER) else R_OUTER
+            self.dir = DIR_INNER if self.R == R_INNER else DIR_OUTER
+        self.last_left = ctx.last_left
+        self.last_right = ctx.last_right
+        self.last_log = ctx.robot.get_clock()
+        self.told_no_api = False
+        self.slots = new_slots(self.dir)
+        self.slot_seen = None
+        ctx.logw("Robot %s assigned R=%.2f dir=%s" % (str(rid), self.R, ("CCW" if self.dir > 0 else "CW")))
+
+    def step(self, ctx, x, y, th):
+        robot, rid = ctx.robot, ctx.rid
+        dxo = x - OBST_CX
+        dyo = y - OBST_CY
+        r = math.hypot(dxo, dyo)
+        if r < OBST_RADIUS:
+            ctx.logw("CRITICAL: robot %s inside dancer disk [%.3f, %.3f]" % (str(rid), x, y))
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+            return True
+
+        bstat = soft_boundary_check(x, y)
+        if bstat == 2:
+            ctx.logw("CRITICAL: robot %s at boundary [%.3f, %.3f]" % (str(rid), x, y))
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+            return True
+        elif bstat == 1:
+            robot.set_led(255, 150, 0)
+        else:
+            robot.set_led(0, 180, 180)
+
+        # polar basis around obstacle center
+        if r < 1e-6:
+            urx, ury = 1.0, 0.0
+        else:
+            urx, ury = dxo / r, dyo / r
+        utx, uty = -ury, urx
+        if self.dir < 0:
+            utx, uty = -utx, -uty
+
+        vx = V_TANGENT_BASE * utx
+        vy = V_TANGENT_BASE * uty
+        radial = clamp(K_R * (self.R - r), -RADIAL_CLAMP, RADIAL_CLAMP)
+        vx += radial * urx
+        vy += radial * ury
+
+        bfx, bfy = soft_boundary_force(x, y)
+        b_norm = bfx * urx + bfy * ury
+        vx += b_norm * urx
+        vy += b_norm * ury
+
+        # angular spacing with ring-mates
+        pace = 1.0
+        neighbors = try_get_swarm_poses(robot)
+        if neighbors:
+            theta = math.atan2(dyo, dxo)
+            target = None
+            if SPACING == "slots":
+                now = robot.get_clock()
+                if slots_stale(self.slots, neighbors, now):
+                    mates = ring_mates(neighbors, rid, self.R, theta)
+                    if mates:
+                        assign_slots(self.slots, rid, mates, len(neighbors), now)
+                        if (self.slots["rank"], self.slots["count"]) != self.slot_seen:
+                            self.slot_seen = (self.slots["rank"], self.slots["count"])
+                            ctx.logw("Robot %s slot %d/%d behind robot %s" % (
+                                str(rid), self.slots["rank"], self.slots["count"], str(self.slots["leader"])))
+                    else:
+                        self.slots.update(n_seen=len(neighbors), t=now)
+                target = slot_angle(self.slots, neighbors)
+            if target is not None:
+                # track our slot: speed up when behind it, ease off when ahead
+                pace = clamp(1.0 + K_PACE * self.dir * wrap_angle(target - theta), PACE_MIN, PACE_MAX)
+                gap = ahead_distance(self.slots, neighbors, x, y)
+                if gap is not None and gap < MIN_LINEAR_SEP:
+                    pace = PACE_MIN   # too close behind the next robot on the ring: hold back
+            else:
+                # SPACING = "repulsion", or poses without ids: pairwise push-off
+                for item in neighbors:
+                    if not (isinstance(item, (list, tuple)) and len(item) >= 3):
+                        continue
+                    nid, nx, ny = split_neighbor(item)
+                    if nid is not None and str(nid) == str(rid):
+                        continue
+                    if ASSIGN_MODE == "by_id" and nid is not None:
+                        nR = (R_INNER if (int(nid) % 2 == 0) else R_OUTER)
+                    else:
+                        nr = math.hypot(nx - OBST_CX, ny - OBST_CY)
+                        nR = R_INNER if abs(nr - R_INNER) <= abs(nr - R_OUTER) else R_OUTER
+                    if abs(nR - self.R) < abs(R_OUTER - R_INNER) / 2.0:
+                        ddx = x - nx
+                        ddy = y - ny
+                        d2 = ddx * ddx + ddy * ddy
+                        if d2 < MIN_LINEAR_SEP * MIN_LINEAR_SEP:
+                            s = ((MIN_LINEAR_SEP * MIN_LINEAR_SEP) - d2) / (MIN_LINEAR_SEP * MIN_LINEAR_SEP)
+                            vx += s * urx
+                            vy += s * ury
+                        ntheta = math.atan2(ny - OBST_CY, nx - OBST_CX)
+                        dtheta = wrap_angle(theta - ntheta)
+                        ad = abs(dtheta)
+                        if 1e-3 < ad <= ANG_REP_CUTOFF:
+                            strength = ANG_REP_GAIN / (ad ** ANG_REP_POW)
+                            tang_push = strength * (1.0 if dtheta > 0.0 else -1.0)
+                            vx += tang_push * utx
+                            vy += tang_push * uty
+        elif not self.told_no_api:
+            ctx.logw("Robot %s: no swarm pose API; angular spacing limited" % str(rid))
+            self.told_no_api = True
+
+        spd = math.hypot(vx, vy)
+        if spd < EPS:
+            vx += 0.08 * utx
+            vy += 0.08 * uty
+            spd = math.hypot(vx, vy)
+
+        left_cmd, right_cmd = wheels_toward(vx, vy, th, fwd_scale=pace, fwd_min=ENC_FWD_MIN,
+                                            warn=abs(b_norm) > 1e-6, warn_k=0.85)
+        left  = int((1.0 - CMD_SMOOTH) * left_cmd  + CMD_SMOOTH * self.last_left)
+        right = int((1.0 - CMD_SMOOTH) * right_cmd + CMD_SMOOTH * self.last_right)
+        self.last_left, self.last_right = left, right
+        ctx.drive(left, right)
+
+        now = robot.get_clock()
+        if now - self.last_log > PRINT_PERIOD:
+            ctx.logw("Robot %s R*=%.2f r=%.3f pos[%.3f, %.3f] spd=%.3f" % (str(rid), self.R, r, x, y, spd))
+            self.last_log = now
+        return True
+
+
+class Glitch(object):
+    name = "glitch"
+    dt_ms = LOOP_DT_MS
+
+    def __init__(self, ctx, x, y, th):
+        try:
+            seed = int((ctx.rid if ctx.rid is not None else 0) * 73856093) & 0xFFFFFFFF
+        except:
+            seed = 0
+        random.seed(seed)
+        self.start = ctx.robot.get_clock()
+        self.last_left = ctx.last_left
+        self.last_right = ctx.last_right
+        self.last_log_sec = -1
+        self.told_no_api = False
+
+    def step(self, ctx, x, y, th):
+        robot, vid = ctx.robot, ctx.rid
+        now = robot.get_clock()
+        if now - self.start >= MAX_RUNTIME:
+            return False
+
+        bstat = soft_boundary_check(x, y)
+        if bstat == 2:
+            ctx.logw("CRITICAL: Robot %s at boundary [%.3f, %.3f]" % (str(vid), x, y))
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+            return False
+        elif bstat == 1:
+            robot.set_led(255, 150, 0)
+        else:
+            robot.set_led(0, 180, 180)
+
+        dxo = x - OBST_CX
+        dyo = y - OBST_CY
+        r = math.hypot(dxo, dyo)
+        if r < GLITCH_OBST_RADIUS:
+            ctx.logw("CRITICAL: Robot %s inside obstacle [%.3f, %.3f]" % (str(vid), x, y))
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+            return True
+
+        bfx, bfy = soft_boundary_force(x, y)
+        vx = bfx + LEFT_BIAS_VX
+        vy = bfy
+
+        # soft obstacle repulsion
+        buffer_width = 0.10
+        if r < GLITCH_SAFE_BUBBLE + buffer_width:
+            if r < 1e-6:
+                vx += 0.6
+            else:
+                s = 0.6 * max(0.0, (GLITCH_SAFE_BUBBLE + buffer_width - r) / buffer_width)
+                vx += s * (dxo / r)
+                vy += s * (dyo / r)
+
+        # neighbor repulsion, nearby robots only
+        neighbors = try_get_swarm_poses(robot)
+        if neighbors:
+            nfx, nfy = neighbor_force(x, y, vid, nearby_neighbors(neighbors, x, y, GRID_CELL))
+            vx += nfx
+            vy += nfy
+        elif not self.told_no_api:
+            ctx.logw("Robot %s: no swarm pose API; using jitter fallback" % str(vid))
+            self.told_no_api = True
+
+        spd_tmp = math.hypot(vx, vy)
+        if spd_tmp > 1e-6:
+            ux = vx / spd_tmp
+            uy = vy / spd_tmp
+            tx = -uy
+            ty = ux
+        else:
+            ux, uy, tx, ty = 1.0, 0.0, 0.0, 1.0
+
+        a1 = random.uniform(-math.pi, math.pi)
+        a2 = random.uniform(-math.pi, math.pi)
+        noise_side = (NOISE_GAIN * math.cos(a1) + 0.6 * NOISE_GAIN * math.cos(a2))
+        noise_fwd  = (NOISE_GAIN * math.sin(a1) + 0.6 * NOISE_GAIN * math.sin(a2))
+        vx += NOISE_SIDE_FRAC * noise_side * tx + (1.0 - NOISE_SIDE_FRAC) * noise_fwd * ux
+        vy += NOISE_SIDE_FRAC * noise_side * ty + (1.0 - NOISE_SIDE_FRAC) * noise_fwd * uy
+
+        if abs(vx) + abs(vy) < EPS:
+            vx += 0.04 * tx
+            vy += 0.04 * ty
+
+        left_cmd, right_cmd = wheels_toward(vx, vy, th, fwd_scale=FWD_GAIN, slow=FWD_SLOW * 0.6,
+                                            fwd_min=GLITCH_FWD_MIN, warn=(bstat == 1))
+        left  = int((1.0 - CMD_SMOOTH) * left_cmd  + CMD_SMOOTH * self.last_left)
+        right = int((1.0 - CMD_SMOOTH) * right_cmd + CMD_SMOOTH * self.last_right)
+        self.last_left, self.last_right = left, right
+        ctx.drive(left, right)
+
+        if int(now) != self.last_log_sec and (now - self.start) % PRINT_PERIOD < 0.2:
+            ctx.logw("Robot %s pos [%.3f, %.3f]" % (str(vid), x, y))
+            self.last_log_sec = int(now)
+        return True
+
+
+class Shift(object):
+    # Translate the formation left (-1) or right (+1); filler is the left shift.
+    dt_ms = 20
+
+    def __init__(self, ctx, x, y, th, move_dir, name):
+        self.name = name
+        self.move_dir = move_dir
+        self.start = ctx.robot.get_clock()
+        self.rel_off = (x - CX, y - CY)
+        self.R_form = math.hypot(self.rel_off[0], self.rel_off[1])
+
+        safety_buffer = 0.05
+        if move_dir < 0:
+            s_wall = max(0.0, CX - (X_MIN + STOP_MARGIN + safety_buffer + self.R_form))
+        else:
+            s_wall = max(0.0, (X_MAX - STOP_MARGIN - safety_buffer - self.R_form) - CX)
+        s_obst = max(0.0, self.R_form - SAFE_BUBBLE)
+        self.s_stop = min(s_wall, s_obst)
+
+        self.t_armed = ctx.robot.get_clock()
+        ctx.sync["armed"] = True
+        self.started = False
+        self.warm = ctx.warm
+        self.blend_from = None
+        ctx.logw("Robot %s: R=%.3f, s_stop=%.3f, rate=%.3f" % (str(ctx.rid), self.R_form, self.s_stop, BASE_SHIFT_RATE))
+        if self.s_stop <= 0.0:
+            ctx.logw("Robot %s: s_stop=0, no safe translation; holding position" % str(ctx.rid))
+        ctx.robot.set_led(255, 200, 0)
+
+    def step(self, ctx, x, y, th):
+        robot, vid = ctx.robot, ctx.rid
+        now = robot.get_clock()
+        if now - self.start >= MAX_RUNTIME:
+            return False
+
+        bstat = soft_boundary_check(x, y)
+        if bstat == 2:
+            ctx.logw("CRITICAL: Robot %s at boundary [%.3f, %.3f]" % (str(vid), x, y))
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+            return False
+
+        # wait for synchronized start (the dispatcher's shared instant when it sends one)
+        if not self.started:
+            self.t0 = start_instant(ctx.sync, self.t_armed, self.warm is not None)
+            if now < self.t0:
+                robot.set_vel(0, 0)
+                return True
+            self.started = True
+            if self.t0 <= self.t_armed:
+                self.blend_from = self.warm   # started without stopping: ramp from the old command
+            robot.set_led(0, 200, 0)
+            ctx.logw("Robot %s started" % str(vid))
+            try_send_host(robot, "clock_host", ("started %s %.4f" % (str(vid), now)).encode("utf-8"))
+
+        if bstat == 1:
+            robot.set_led(255, 150, 0)
+        else:
+            robot.set_led(0, 180, 180)
+
+        s = min(max(0.0, (now - self.t0) * BASE_SHIFT_RATE), self.s_stop)
+        Cx = CX + self.move_dir * s
+        Cy = CY
+        Cx = max(X_MIN + self.R_form + 0.08, min(X_MAX - self.R_form - 0.08, Cx))
+        Cy = max(Y_MIN + self.R_form + 0.08, min(Y_MAX - self.R_form - 0.08, Cy))
+
+        tx = Cx + self.rel_off[0]
+        ty = Cy + self.rel_off[1]
+        ex = tx - x
+        ey = ty - y
+
+        if (abs(self.s_stop - s) < 1e-6) and (math.hypot(ex, ey) < 0.02):
+            robot.set_vel(0, 0)
+            robot.set_led(0, 80, 255)
+            ctx.logw("Robot %s completed mission" % str(vid))
+            return False
+
+        vx = KX * ex + self.move_dir * BASE_SHIFT_RATE + KR * (self.rel_off[0] - (x - Cx))
+        vy = KY * ey + KR * (self.rel_off[1] - (y - Cy))
+        if abs(vx) + abs(vy) > EPS:
+            left, right = wheels_toward(vx, vy, th, warn=(bstat == 1))
+        else:
+            left = right = 0
+        ctx.drive(*warm_blend(self.blend_from, now - self.t0, left, right))
+        return True
+
+
+def make_state(name, ctx, x, y, th):
+    if name == "encircling":
+        return Encircling(ctx, x, y, th)
+    if name == "glitch":
+        return Glitch(ctx, x, y, th)
+    if name == "move_left":
+        return Shift(ctx, x, y, th, -1, name)
+    if name == "move_right":
+        return Shift(ctx, x, y, th, +1, name)
+    if name == "filler":
+        return Shift(ctx, x, y, th, -1, name)
+    return Idle(ctx, x, y, th)
+
+
+class Context(object):
+    # Per-robot state shared by all behaviors.
+    def __init__(self, robot, rid, logw):
+        self.robot = robot
+        self.rid = rid
+        self.logw = logw
+        self.pending = None      # mode name received on the "mode" slot
+        self.mode_seen = None    # (mode, seq) last acted on, so retransmits do not restart it
+        self.sync = new_sync()   # clock pings / start instant for the current mode
+        self.sync["vid"] = rid
+        self.last_left = 0
+        self.last_right = 0
+        self.warm = None         # warm-start record the next behavior starts from (robot_lib.load_warm)
+
+    def drive(self, left, right):
+        self.last_left, self.last_right = left, right
+        self.robot.set_vel(left, right)
+
+    def record(self, state, x, y, th):
+        # what save_warm would write for the running behavior, as load_warm returns it
+        return {"t": time.time(), "mode": state.name, "x": x, "y": y, "th": th,
+                "ring": getattr(state, "R", 0.0), "dir": getattr(state, "dir", 0),
+                "left": self.last_left, "right": self.last_right}
+
+
+def listen_for_modes(robot, ctx):
+    def on_mode(_, payload):
+        try:
+            mode, seq, to = parse_mode(payload)
+            if seq is not None:
+                # acked delivery (mode_delivery.py): ack every copy, act on the first
+                ack_mode(robot, seq, to)
+                if (mode, seq) == ctx.mode_seen:
+                    return
+                ctx.mode_seen = (mode, seq)
+            ctx.pending = mode
+            # a new mode gets its own start instant
+            ctx.sync.update(pinged=False, armed=False, start_at=None, exact=False)
+        except Exception:
+            pass
+    listen_for_sync(robot, ctx.sync)
+    try:
+        robot.net.cctl.add_slot("mode", on_mode)
+        return True
+    except Exception:
+        return False
+
+
+# --- main user entrypoint ---
+def usr(robot):
+    log_main = open("experiment_log.txt", "a")
+    def logw(s):
+        if not s.endswith("\n"):
+            s += "\n"
+        log_main.write(log_stamp(robot, rid) + s)
+        log_main.flush()
+        try:
+            os.fsync(log_main.fileno())
+        except:
+            pass
+
+    rid = get_vid(robot)
+
+    ctx = Context(robot, rid, logw)
+    # register before the warm-up so an early mode signal is not lost
+    if not listen_for_modes(robot, ctx):
+        logw("Robot %s: no 'mode' slot API; staying idle" % str(rid))
+    ctx.warm = load_warm(rid)
+    robot.delay(WARM_DELAY_MS if ctx.warm else BOOT_DELAY_MS)
+    logw("Robot %s bundle ready" % str(rid))
+
+    state = None
+    last_save = None
+    try:
+        while True:
+            pose = safe_pose(robot)
+            if pose is None:
+                robot.set_vel(0, 0)
+                robot.delay(20)
+                continue
+            x, y, th = pose
+
+            if state is None:
+                if warm_here(ctx.warm, x, y):
+                    logw("Robot %s warm start after %s (%.1fs ago)" % (
+                        str(rid), ctx.warm["mode"], time.time() - ctx.warm["t"]))
+                else:
+                    ctx.warm = None
+                last_save = robot.get_clock() - WARM_SAVE_PERIOD
+
+            # hot switch: a new mode takes effect at this tick
+            if state is None or ctx.pending is not None:
+                # the next behavior starts from the running one (in-process handoff), or
+                # from the previous program's record while we only idled since boot
+                if state is not None and not (state.name == "idle" and ctx.warm
+                                              and time.time() - ctx.warm["t"] < WARM_FRESH):
+                    ctx.warm = ctx.record(state, x, y, th)
+                if ctx.warm:
+                    ctx.last_left, ctx.last_right = ctx.warm["left"], ctx.warm["right"]
+                mode, ctx.pending = ctx.pending, None
+                name = MODE_TO_STATE.get(mode, "idle")
+                logw("Robot %s mode -> %s (%s)" % (str(rid), str(mode), name))
+                state = make_state(name, ctx, x, y, th)
+                if name != "idle":
+                    ctx.warm = None   # used up by the behavior it started
+
+            if not state.step(ctx, x, y, th):
+                logw("Robot %s %s finished at [%.3f, %.3f]" % (str(rid), state.name, x, y))
+                state = Idle(ctx, x, y, th)
+
+            now = robot.get_clock()
+            if now - last_save >= WARM_SAVE_PERIOD:
+                rec = ctx.record(state, x, y, th)
+                save_warm(rid, rec["mode"], x, y, th, rec["left"], rec["right"], rec["ring"], rec["dir"])
+                last_save = now
+
+            robot.delay(state.dt_ms)
+
+    except Exception as e:
+        try:
+            robot.set_vel(0, 0)
+            robot.set_led(255, 0, 0)
+        except:
+            pass
+        logw("ERROR: %s" % str(e))
+        raise
+    finally:
+        try:
+            robot.set_vel(0, 0)
+        except:
+            pass
+        if state is not None:
+            rec = ctx.record(state, x, y, th)
+            save_warm(rid, rec["mode"], x, y, th, 0, 0, rec["ring"], rec["dir"])   # stopped
+        logw("Robot %s finished" % str(rid))
+        try:
+            log_main.close()
+        except:
+            pass
@@ -3,10 +3,8 @@ from __future__ import division
 import math
 import os
 import random
-
-# --- field bounds (meters) ---
-X_MIN, X_MAX = -1.2, 1.0
-Y_MIN, Y_MAX = -1.4, 2.35
+import time
+from robot_lib import *
 
 # --- dancer no-go circle (meters) ---
 FEET = 0.3048
@@ -14,7 +12,6 @@ OBST_DIAM_FT = 1.0
 OBST_RADIUS  = 0.5 * OBST_DIAM_FT * FEET
 OBST_MARGIN  = 0.03
 SAFE_BUBBLE  = OBST_RADIUS + OBST_MARGIN
-OBST_CX, OBST_CY = (-0.1, 0.475)
 
 # --- dual-ring parameters ---
 R_INNER   = SAFE_BUBBLE + 0.24
@@ -29,23 +26,17 @@ K_R            = 1.2
 RADIAL_CLAMP   = 0.10
 
 # --- angular spacing within a ring ---
+SPACING        = "slots"  # "slots" (robot_lib.assign_slots, O(1) per tick) or "repulsion" (pairwise)
+K_PACE         = 0.8      # slots: forward pace change per rad of slot error
+PACE_MIN       = 0.5
+PACE_MAX       = 1.3
 ANG_REP_GAIN   = 0.24
 ANG_REP_POW    = 1.2
 ANG_REP_CUTOFF = 1.2
 MIN_LINEAR_SEP = 0.18
 
-# --- boundary softness ---
-SOFT_MARGIN     = 0.08
-CRIT_MARGIN     = 0.02
-SOFT_MAX_FORCE  = 0.35
-
 # --- drive / control (match sim) ---
-MAX_WHEEL = 35 #max speed is 50 
-TURN_K    = 3.0
-FWD_FAST  = 0.8
-FWD_SLOW  = 0.30
 FWD_MIN   = 0.40
-EPS       = 1e-3
 
 # --- command smoothing for real robots ---
 CMD_SMOOTH  = 0.25   # 0=no smoothing, 1=hold last
@@ -53,69 +44,6 @@ PRINT_PERIOD = 2.0
 LOOP_DT_MS   = 40
 
 # --- helpers ---
-def clamp(v, lo, hi):
-    if v < lo:
-        return lo
-    if v > hi:
-        return hi
-    return v
-
-def wrap_angle(a):
-    while a >  math.pi:
-        a -= 2.0 * math.pi
-    while a <= -math.pi:
-        a += 2.0 * math.pi
-    return a
-
-def safe_pose(robot):
-    p = robot.get_pose()
-    if p and len(p) >= 3:
-        return float(p[0]), float(p[1]), float(p[2])
-    return None
-
-def soft_boundary_check(x, y):
-    # Return 0=ok, 1=warn, 2=critical based on margins.
-    if (x < X_MIN + CRIT_MARGIN or x > X_MAX - CRIT_MARGIN or
-        y < Y_MIN + CRIT_MARGIN or y > Y_MAX - CRIT_MARGIN):
-        return 2
-    elif (x < X_MIN + SOFT_MARGIN or x > X_MAX - SOFT_MARGIN or
-          y < Y_MIN + SOFT_MARGIN or y > Y_MAX - SOFT_MARGIN):
-        return 1
-    return 0
-
-def soft_boundary_force(x, y):
-    # Soft push back toward interior near walls.
-    fx = 0.0
-    fy = 0.0
-    if x < X_MIN + SOFT_MARGIN:
-        fx += SOFT_MAX_FORCE * (1.0 - (x - X_MIN) / SOFT_MARGIN)
-    elif x > X_MAX - SOFT_MARGIN:
-        fx -= SOFT_MAX_FORCE * (1.0 - (X_MAX - x) / SOFT_MARGIN)
-    if y < Y_MIN + SOFT_MARGIN:
-        fy += SOFT_MAX_FORCE * (1.0 - (y - Y_MIN) / SOFT_MARGIN)
-    elif y > Y_MAX - SOFT_MARGIN:
-        fy -= SOFT_MAX_FORCE * (1.0 - (Y_MAX - y) / SOFT_MARGIN)
-    return fx, fy
-
-def try_get_swarm_poses(robot):
-    # Try a few common API names for neighbor poses; return [] if none.
-    for nm in ('get_swarm_poses', 'get_all_poses', 'get_poses', 'swarm_poses'):
-        fn = getattr(robot, nm, None)
-        if callable(fn):
-            try:
-                poses = fn()
-                if poses:
-                    return poses
-            except:
-                pass
-    return []
-
-def get_vid(robot):
-    try:
-        return robot.virtual_id()
-    except:
-        return -1
-
 def nearest_ring_radius(r):
     if abs(r - R_INNER) <= abs(r - R_OUTER):
         return R_INNER
@@ -126,28 +54,50 @@ def ring_dir(ring_R):
         return DIR_INNER
     return DIR_OUTER
 
+def neighbor_ring(nid, nr):
+    # ring a neighbor is on, by the same rule as our own assignment
+    if ASSIGN_MODE == "by_id" and nid is not None:
+        return R_INNER if (int(nid) % 2 == 0) else R_OUTER
+    return nearest_ring_radius(nr)
+
+def ring_mates(neighbors, rid, ring_R, theta):
+    # [(id, ring angle)] of the robots on our ring, us included; None if the
+    # poses carry no ids (no leader to agree on)
+    mates = [(rid, theta)]
+    for item in neighbors:
+        if not (isinstance(item, (list, tuple)) and len(item) >= 3):
+            continue
+        if len(item) != 4:
+            return None
+        nid, nx, ny = item[0], item[1], item[2]
+        if str(nid) == str(rid):
+            continue
+        dxn = nx - OBST_CX
+        dyn = ny - OBST_CY
+        if abs(neighbor_ring(nid, math.hypot(dxn, dyn)) - ring_R) < abs(R_OUTER - R_INNER) / 2.0:
+            mates.append((nid, math.atan2(dyn, dxn)))
+    return mates
+
 # --- main user entrypoint ---
 def usr(robot):
-    robot.delay(2000)
+    # id first: it names the warm-start record, which decides the warm-up
+    rid = get_vid(robot)
+    warm = load_warm(rid)
+    robot.delay(WARM_DELAY_MS if warm else 2000)
 
     # open shared log file and define a safe writer
     log_main = open("experiment_log.txt", "a")
     def logw(s):
         if not s.endswith("\n"):
             s += "\n"
-        log_main.write(s)
+        log_main.write(log_stamp(robot, rid) + s)
         log_main.flush()
         try:
             os.fsync(log_main.fileno())
         except:
             pass
 
-    # basic id and per-robot seed
-    try:
-        rid = robot.virtual_id()
-    except:
-        rid = -1
-
+    # per-robot seed
     try:
         rnd_seed = int((rid if rid is not None else 0) * 73856093) & 0xFFFFFFFF
     except:
@@ -164,11 +114,15 @@ def usr(robot):
     assigned_R = None
     assigned_dir = None
     init_done = False
+    slots = None
+    slot_seen = None
 
     last_log_time = robot.get_clock()
     last_left = 0
     last_right = 0
     told_no_api = False
+    last_save = None
+    last_pose = None
 
     logw("Robot %s start" % str(rid))
 
@@ -181,6 +135,7 @@ def usr(robot):
                 continue
 
             x, y, th = pose
+            last_pose = (x, y, th)
 
             # safety around obstacle center
             dxo = x - OBST_CX
@@ -208,7 +163,18 @@ def usr(robot):
 
             # one-time ring assignment
             if not init_done:
-                if ASSIGN_MODE == "by_id":
+                if not warm_here(warm, x, y):
+                    warm = None
+                if warm:
+                    # carry on from the previous behavior's wheel command
+                    last_left, last_right = warm["left"], warm["right"]
+                    logw("Robot %s warm start after %s (%.1fs ago)" % (str(rid), warm["mode"], time.time() - warm["t"]))
+                last_save = robot.get_clock() - WARM_SAVE_PERIOD
+                if warm and warm["mode"] == "encircling" and warm["ring"] > 0.0:
+                    # keep the ring we were on (by_initial_radius would re-pick from where we are now)
+                    assigned_R = warm["ring"]
+                    assigned_dir = warm["dir"]
+                elif ASSIGN_MODE == "by_id":
                     if (rid % 2) == 0:
                         assigned_R = R_INNER
                         assigned_dir = DIR_INNER
@@ -218,6 +184,7 @@ def usr(robot):
                 else:
                     assigned_R = nearest_ring_radius(r)
                     assigned_dir = ring_dir(assigned_R)
+                slots = new_slots(assigned_dir)
                 init_done = True
                 logw("Robot %s assigned R=%.2f dir=%s" % (str(rid), assigned_R,
                                                           ("CCW" if assigned_dir > 0 else "CW")))
@@ -247,46 +214,69 @@ def usr(robot):
             vy += b_norm * ury
 
             # angular spacing with ring-mates
+            pace = 1.0
             neighbors = try_get_swarm_poses(robot)
             if neighbors:
                 theta = math.atan2(dyo, dxo)
-                for item in neighbors:
-                    if isinstance(item, (list, tuple)) and len(item) >= 3:
-                        if len(item) == 4:
-                            nid, nx, ny, nth = item
-                        else:
-                            nx, ny, nth = item[0], item[1], item[2]
-                            nid = None
-
-                        if nid is not None and str(nid) == str(rid):
-                            continue
-
-                        nr = math.hypot(nx - OBST_CX, ny - OBST_CY)
-                        if ASSIGN_MODE == "by_id" and len(item) == 4 and nid is not None:
-                            nR = (R_INNER if (int(nid) % 2 == 0) else R_OUTER)
+                target = None
+                if SPACING == "slots":
+                    now = robot.get_clock()
+                    if slots_stale(slots, neighbors, now):
+                        mates = ring_mates(neighbors, rid, assigned_R, theta)
+                        if mates:
+                            assign_slots(slots, rid, mates, len(neighbors), now)
+                            if (slots["rank"], slots["count"]) != slot_seen:
+                                slot_seen = (slots["rank"], slots["count"])
+                                logw("Robot %s slot %d/%d behind robot %s" %
+                                     (str(rid), slots["rank"], slots["count"], str(slots["leader"])))
                         else:
-                            nR = nearest_ring_radius(nr)
-
-                        # only interact tangentially with neighbors on the same ring
-                        if abs(nR - assigned_R) < abs(R_OUTER - R_INNER) / 2.0:
-                            ddx = x - nx
-                            ddy = y - ny
-                            d2 = ddx * ddx + ddy * ddy
-
-                            # keep a minimum linear separation with a small radial push
-                            if d2 < MIN_LINEAR_SEP * MIN_LINEAR_SEP:
-                                s = ((MIN_LINEAR_SEP * MIN_LINEAR_SEP) - d2) / (MIN_LINEAR_SEP * MIN_LINEAR_SEP)
-                                vx += s * urx
-                                vy += s * ury
-
-                            ntheta = math.atan2(ny - OBST_CY, nx - OBST_CX)
-                            dtheta = wrap_angle(theta - ntheta)
-                            ad = abs(dtheta)
-                            if 1e-3 < ad <= ANG_REP_CUTOFF:
-                                strength = ANG_REP_GAIN / (ad ** ANG_REP_POW)
-                                tang_push = strength * (1.0 if dtheta > 0.0 else -1.0)
-                                vx += tang_push * utx
-                                vy += tang_push * uty
+                            slots.update(n_seen=len(neighbors), t=now)
+                    target = slot_angle(slots, neighbors)
+                if target is not None:
+                    # track our slot: speed up when behind it, ease off when ahead
+                    pace = clamp(1.0 + K_PACE * assigned_dir * wrap_angle(target - theta), PACE_MIN, PACE_MAX)
+                    gap = ahead_distance(slots, neighbors, x, y)
+                    if gap is not None and gap < MIN_LINEAR_SEP:
+                        pace = PACE_MIN   # too close behind the next robot on the ring: hold back
+                else:
+                    # SPACING = "repulsion", or poses without ids: pairwise push-off
+                    for item in neighbors:
+                        if isinstance(item, (list, tuple)) and len(item) >= 3:
+                            if len(item) == 4:
+                                nid, nx, ny, nth = item
+                            else:
+                                nx, ny, nth = item[0], item[1], item[2]
+                                nid = None
+
+                            if nid is not None and str(nid) == str(rid):
+                                continue
+
+                            nr = math.hypot(nx - OBST_CX, ny - OBST_CY)
+                            if ASSIGN_MODE == "by_id" and len(item) == 4 and nid is not None:
+                                nR = (R_INNER if (int(nid) % 2 == 0) else R_OUTER)
+                            else:
+                                nR = nearest_ring_radius(nr)
+
+                            # only interact tangentially with neighbors on the same ring
+                            if abs(nR - assigned_R) < abs(R_OUTER - R_INNER) / 2.0:
+                                ddx = x - nx
+                                ddy = y - ny
+                                d2 = ddx * ddx + ddy * ddy
+
+                                # keep a minimum linear separation with a small radial push
+                                if d2 < MIN_LINEAR_SEP * MIN_LINEAR_SEP:
+                                    s = ((MIN_LINEAR_SEP * MIN_LINEAR_SEP) - d2) / (MIN_LINEAR_SEP * MIN_LINEAR_SEP)
+                                    vx += s * urx
+                                    vy += s * ury
+
+                                ntheta = math.atan2(ny - OBST_CY, nx - OBST_CX)
+                                dtheta = wrap_angle(theta - ntheta)
+                                ad = abs(dtheta)
+                                if 1e-3 < ad <= ANG_REP_CUTOFF:
+                                    strength = ANG_REP_GAIN / (ad ** ANG_REP_POW)
+                                    tang_push = strength * (1.0 if dtheta > 0.0 else -1.0)
+                                    vx += tang_push * utx
+                                    vy += tang_push * uty
             else:
                 if not told_no_api:
                     logw("Robot %s: no swarm pose API; angular spacing limited" % str(rid))
@@ -314,6 +304,7 @@ def usr(robot):
             if abs(b_norm) > 1e-6:
                 fwd *= 0.85
 
+            fwd *= pace
             if fwd < FWD_MIN:
                 fwd = FWD_MIN
 
@@ -328,8 +319,12 @@ def usr(robot):
 
             robot.set_vel(left, right)
 
-            # periodic logging
             now = robot.get_clock()
+            if now - last_save >= WARM_SAVE_PERIOD:
+                save_warm(rid, "encircling", x, y, th, left, right, assigned_R, assigned_dir)
+                last_save = now
+
+            # periodic logging
             if now - last_log_time > PRINT_PERIOD:
                 logw("Robot %s R*=%.2f r=%.3f pos[%.3f, %.3f] spd=%.3f" %
                      (str(rid), assigned_R, r, x, y, spd))
@@ -351,6 +346,8 @@ def usr(robot):
             robot.set_vel(0, 0)
         except:
             pass
+        if last_pose and assigned_R is not None:
+            save_warm(rid, "encircling", last_pose[0], last_pose[1], last_pose[2], 0, 0, assigned_R, assigned_dir)
         logw("Robot %s finished" % str(rid))
         try:
             log_main.close()
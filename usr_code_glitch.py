@@ -2,10 +2,8 @@
 import math
 import os
 import random
-
-# --- field bounds (meters) ---
-X_MIN, X_MAX = -1.2, 1.0
-Y_MIN, Y_MAX = -1.4, 2.35
+import time
+from robot_lib import *
 
 # --- dancer no-go circle (meters) ---
 FEET = 0.6048             # keep consistent with your other scripts
@@ -13,24 +11,13 @@ OBST_DIAM_FT = 1.0
 OBST_RADIUS  = 0.5 * OBST_DIAM_FT * FEET   # ~0.1524
 OBST_MARGIN  = 0.03
 SAFE_BUBBLE  = OBST_RADIUS + OBST_MARGIN
-OBST_CX, OBST_CY = (-0.1, 0.475)
 
 # --- drive / control (match sim) ---
-MAX_WHEEL = 35
-TURN_K    = 3.0
-FWD_FAST  = 0.8
-FWD_SLOW  = 0.30
 FWD_MIN   = 0.35         # forward floor to avoid spin-stall
-EPS       = 1e-3
 
 # --- command smoothing for real robots ---
 CMD_SMOOTH  = 0.25       # 0=no smoothing, 1=hold last
 
-# --- boundary softness ---
-SOFT_MARGIN     = 0.08
-CRIT_MARGIN     = 0.02
-SOFT_MAX_FORCE  = 0.35
-
 # --- "glitch" field params ---
 REPULSE_RADIUS  = 0.75   # neighbor influence radius
 REPULSE_GAIN    = 0.12   # 1/r^2 repulsion
@@ -40,56 +27,13 @@ NOISE_GAIN      = 0.12
 NOISE_SIDE_FRAC = 0.7    # project most noise sideways to current motion
 FWD_GAIN        = 0.95
 LEFT_BIAS_VX    = 0.00   # e.g., -0.06 for slow collective left drift
+GRID_CELL       = REPULSE_RADIUS   # neighbor grid cell (robot_lib.nearby_neighbors): one cell = influence radius
 
 # --- timing / runtime ---
 PRINT_PERIOD = 2.0
 MAX_RUNTIME  = 55.0
 LOOP_DT_MS   = 40        # 25 Hz
 
-def clamp(v, lo, hi):
-    if v < lo: return lo
-    if v > hi: return hi
-    return v
-
-def wrap_angle(a):
-    while a >  math.pi:
-        a -= 2.0*math.pi
-    while a <= -math.pi:
-        a += 2.0*math.pi
-    return a
-
-def safe_pose(robot):
-    p = robot.get_pose()
-    if p and len(p) >= 3:
-        return float(p[0]), float(p[1]), float(p[2])
-    return None
-
-def soft_boundary_check(x, y):
-    """Return 0=ok, 1=warn, 2=critical based on margins."""
-    warning_margin  = SOFT_MARGIN
-    critical_margin = CRIT_MARGIN
-    if (x < X_MIN + critical_margin or x > X_MAX - critical_margin or
-        y < Y_MIN + critical_margin or y > Y_MAX - critical_margin):
-        return 2
-    elif (x < X_MIN + warning_margin or x > X_MAX - warning_margin or
-          y < Y_MIN + warning_margin or y > Y_MAX - warning_margin):
-        return 1
-    return 0
-
-def soft_boundary_force(x, y):
-    """Soft push back toward interior near walls."""
-    fx = 0.0
-    fy = 0.0
-    if x < X_MIN + SOFT_MARGIN:
-        fx += SOFT_MAX_FORCE * (1.0 - (x - X_MIN)/SOFT_MARGIN)
-    elif x > X_MAX - SOFT_MARGIN:
-        fx -= SOFT_MAX_FORCE * (1.0 - (X_MAX - x)/SOFT_MARGIN)
-    if y < Y_MIN + SOFT_MARGIN:
-        fy += SOFT_MAX_FORCE * (1.0 - (y - Y_MIN)/SOFT_MARGIN)
-    elif y > Y_MAX - SOFT_MARGIN:
-        fy -= SOFT_MAX_FORCE * (1.0 - (Y_MAX - y)/SOFT_MARGIN)
-    return fx, fy
-
 def soft_obstacle_force(x, y, max_force=0.6, buffer_width=0.10):
     """Soft radial push away from dancer disk within buffer ring."""
     dx = x - OBST_CX
@@ -109,19 +53,42 @@ def is_critical_obstacle(x, y, critical_margin=0.0):
     r  = math.hypot(dx, dy)
     return r < (OBST_RADIUS + critical_margin)
 
-def try_get_swarm_poses(robot):
-    """Try a few common API names for neighbor poses; return [] if none."""
-    names = ('get_swarm_poses', 'get_all_poses', 'get_poses', 'swarm_poses')
-    for nm in names:
-        fn = getattr(robot, nm, None)
-        if callable(fn):
-            try:
-                poses = fn()
-                if poses:
-                    return poses
-            except:
-                pass
-    return []
+def neighbor_force(x, y, vid, candidates):
+    """Neighbor repulsion (1/r^2) + hard-core 1/r^3 anti-clump from pose items."""
+    me = str(vid)
+    r = REPULSE_RADIUS
+    vx = 0.0
+    vy = 0.0
+    for item in candidates:
+        if not isinstance(item, (list, tuple)):
+            continue
+        k = len(item)
+        if k == 4:
+            dxn = x - item[1]
+            dyn = y - item[2]
+        elif k >= 3:
+            dxn = x - item[0]
+            dyn = y - item[1]
+        else:
+            continue
+        if dxn >= r or dxn <= -r or dyn >= r or dyn <= -r:
+            continue    # outside the influence box: no sqrt / division needed
+        d2 = dxn*dxn + dyn*dyn
+        if d2 < 1e-12 or d2 >= r*r:
+            continue
+        if k == 4 and str(item[0]) == me:
+            continue
+        # regular 1/r^2
+        s = REPULSE_GAIN / d2
+        vx += s * dxn
+        vy += s * dyn
+        # hard-core 1/r^3 close up
+        if d2 < (HARD_REP_RADIUS*HARD_REP_RADIUS):
+            d = math.sqrt(d2)
+            s_hard = HARD_REP_GAIN / (d2 * d + 1e-9)
+            vx += s_hard * dxn
+            vy += s_hard * dyn
+    return vx, vy
 
 def get_id(robot):
     vid_attr = getattr(robot, "virtual_id", None)
@@ -131,19 +98,16 @@ def get_id(robot):
         return -1
 
 def usr(robot):
-    robot.delay(3000)
-
-    # get id first so we can use a per-robot log
-    try:
-        vid = robot.virtual_id()
-    except:
-        vid = -1
+    # id first: it names the warm-start record, which decides the warm-up
+    vid = get_vid(robot)
+    warm = load_warm(vid)
+    robot.delay(WARM_DELAY_MS if warm else 3000)
 
     log_main = open("experiment_log.txt", "a")
     def logw(s):
         if not s.endswith("\n"):
             s += "\n"
-        log_main.write(s)
+        log_main.write(log_stamp(robot, vid) + s)
         log_main.flush()
         try:
             os.fsync(log_main.fileno())
@@ -166,6 +130,7 @@ def usr(robot):
         told_no_swarm_api = False
         last_left = 0
         last_right = 0
+        last_save = None
 
         start_time = robot.get_clock()
 
@@ -178,7 +143,14 @@ def usr(robot):
                 continue
 
             x, y, th = pose
-            last_pose = (x, y)
+            last_pose = (x, y, th)
+
+            # warm start: carry on from the previous behavior's wheel command
+            if last_save is None:
+                if warm_here(warm, x, y):
+                    last_left, last_right = warm["left"], warm["right"]
+                    logw("Robot %s warm start after %s (%.1fs ago)" % (str(vid), warm["mode"], time.time() - warm["t"]))
+                last_save = start_time - WARM_SAVE_PERIOD
 
             # boundary light + protection
             bstat = soft_boundary_check(x, y)
@@ -210,34 +182,12 @@ def usr(robot):
             vx += obx
             vy += oby
 
-            # neighbor repulsion (1/r^2) + hard-core 1/r^3 anti-clump
+            # neighbor repulsion (1/r^2) + hard-core 1/r^3 anti-clump, nearby robots only
             neighbors = try_get_swarm_poses(robot)
             if neighbors:
-                for item in neighbors:
-                    if isinstance(item, (list, tuple)) and len(item) >= 3:
-                        if len(item) == 4:
-                            nid, nx, ny, nth = item
-                        else:
-                            nx, ny, nth = item[0], item[1], item[2]
-                            nid = None
-                        if (nid is not None) and (str(nid) == str(vid)):
-                            continue
-                        dxn = x - nx
-                        dyn = y - ny
-                        d2  = dxn*dxn + dyn*dyn
-                        if d2 < 1e-12:
-                            continue
-                        # regular 1/r^2
-                        if d2 < (REPULSE_RADIUS*REPULSE_RADIUS):
-                            s = REPULSE_GAIN / d2
-                            vx += s * dxn
-                            vy += s * dyn
-                        # hard-core 1/r^3 close up
-                        d = math.sqrt(d2)
-                        if d < HARD_REP_RADIUS:
-                            s_hard = HARD_REP_GAIN / (d2 * d + 1e-9)
-                            vx += s_hard * dxn
-                            vy += s_hard * dyn
+                nfx, nfy = neighbor_force(x, y, vid, nearby_neighbors(neighbors, x, y, GRID_CELL))
+                vx += nfx
+                vy += nfy
             else:
                 if not told_no_swarm_api:
                     logw("Robot %s: no swarm pose API; using jitter fallback" % str(vid))
@@ -296,8 +246,12 @@ def usr(robot):
 
             robot.set_vel(left, right)
 
-            # periodic log (not too chatty)
             now = robot.get_clock()
+            if now - last_save >= WARM_SAVE_PERIOD:
+                save_warm(vid, "glitch", x, y, th, left, right)
+                last_save = now
+
+            # periodic log (not too chatty)
             if int(now) != last_log_sec and (now - start_time) % PRINT_PERIOD < 0.2:
                 logw("Robot %s pos [%.3f, %.3f]" % (str(vid), x, y))
                 last_log_sec = int(now)
@@ -317,7 +271,7 @@ def usr(robot):
         # final log line with last pose and elapsed time
         final_time = robot.get_clock()
         if last_pose:
-            lx, ly = last_pose
+            lx, ly = last_pose[0], last_pose[1]
         else:
             lx = float('nan')
             ly = float('nan')
@@ -325,5 +279,7 @@ def usr(robot):
             robot.set_vel(0, 0)
         except:
             pass
+        if last_pose:
+            save_warm(vid, "glitch", lx, ly, last_pose[2], 0, 0)   # stopped
         logw("Robot %s finished at [%.3f, %.3f] after %.1fs" % (str(vid), lx, ly, final_time - start_time))
         log_main.close()
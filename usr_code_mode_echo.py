@@ -3,7 +3,7 @@ def usr(bot):
     current = b""
     def on_mode(_, payload: bytes):
         nonlocal current
-        current = payload.strip() or b""
+        current = (payload.split() or [b""])[0]   # "<mode> <seq>" from mode_delivery.py
         bot.logger.info(f"MODE={current!r}")
 
     # listen for PC signals named "mode"
@@ -1,10 +1,13 @@
+# -*- coding: utf-8 -*-
+# usr_code_shift.py
+#
+# Translate the formation left or right around the dancer. This one source
+# is built (build_usr_code.py) into usr_code_move_left.py, usr_code_move_right.py
+# and usr_code_filler.py, which only differ in MOVE_DIR.
 import math
 import os
-
-# --- field and ring center ---
-X_MIN, X_MAX = -1.2, 1.0
-Y_MIN, Y_MAX = -1.4, 2.35
-CX, CY = (-0.1, 0.475)
+import time
+from robot_lib import *
 
 # --- Dancer no-go circle (meters) ---
 FEET = 0.3048
@@ -14,48 +17,30 @@ OBST_MARGIN  = 0.03
 SAFE_BUBBLE  = OBST_RADIUS + OBST_MARGIN
 
 # --- Motion & control (MATCH SIM) ---
-MOVE_DIR        = -1          # <- LEFT
+MOVE_DIR        = -1         # -1 = LEFT, +1 = RIGHT (set per build target)
 BASE_SHIFT_RATE = 0.18
 STOP_MARGIN     = 0.08
-MAX_WHEEL = 35
-TURN_K    = 3.0
-FWD_FAST  = 0.8
-FWD_SLOW  = 0.30
-EPS       = 1e-3
 KX = 1.2
 KY = 2.0
 KR = 2.6
 
-def clamp(v, lo, hi): 
-    return max(lo, min(v, hi))
-
-def wrap_angle(a):
-    while a > math.pi: 
-        a -= 2.0*math.pi
-    while a <= -math.pi: 
-        a += 2.0*math.pi
-    return a
-
-def safe_pose(robot):
-    p = robot.get_pose()
-    if p and len(p) >= 3:
-        return float(p[0]), float(p[1]), float(p[2])
-    return None
-
 def usr(robot):
-    robot.delay(3000)
+    # listen for the dispatcher's clock pings / start instant before the warm-up
+    sync = new_sync()
+    listen_for_sync(robot, sync)
 
-    # get id first so we can use a per-robot log
-    try:
-        vid = robot.virtual_id()
-    except:
-        vid = -1
+    # id first: it names the warm-start record, which decides the warm-up
+    vid = get_vid(robot)
+    sync["vid"] = vid
+    warm = load_warm(vid)
+    robot.delay(WARM_DELAY_MS if warm else 3000)
+    mode = "move_left" if MOVE_DIR < 0 else "move_right"
 
     log_main = open("experiment_log.txt", "a")
     def logw(s):
         if not s.endswith("\n"):
             s += "\n"
-        log_main.write(s)
+        log_main.write(log_stamp(robot, vid) + s)
         log_main.flush()
         try:
             os.fsync(log_main.fileno())
@@ -65,17 +50,6 @@ def usr(robot):
     try:
         logw("I am robot %s" % str(vid))
 
-        def soft_boundary_check(x, y):
-            warning_margin = 0.08
-            critical_margin = 0.02
-            if (x < X_MIN + critical_margin or x > X_MAX - critical_margin or
-                y < Y_MIN + critical_margin or y > Y_MAX - critical_margin):
-                return 2
-            elif (x < X_MIN + warning_margin or x > X_MAX - warning_margin or
-                  y < Y_MIN + warning_margin or y > Y_MAX - warning_margin):
-                return 1
-            return 0
-
         # State
         rel_off = None
         R_form = None
@@ -84,6 +58,8 @@ def usr(robot):
         started = False
         last_log_sec = -1
         last_pose = None  # for final log
+        last_save = None
+        blend_from = None  # warm record to ramp the wheels from after the start
 
         start_time = robot.get_clock()
         max_runtime = 55.0
@@ -96,7 +72,7 @@ def usr(robot):
                 continue
 
             x, y, th = pose
-            last_pose = (x, y)
+            last_pose = (x, y, th)
 
             # Boundary light + protection
             bstat = soft_boundary_check(x, y)
@@ -124,21 +100,31 @@ def usr(robot):
                 s_obst = max(0.0, R_form - SAFE_BUBBLE)
                 s_stop = min(s_wall, s_obst)
 
-                t0 = robot.get_clock() + 1.0
+                if not warm_here(warm, x, y):
+                    warm = None
+                else:
+                    logw("Robot %s warm start after %s (%.1fs ago)" % (str(vid), warm["mode"], time.time() - warm["t"]))
+                t_armed = robot.get_clock()
+                last_save = t_armed - WARM_SAVE_PERIOD
+                sync["armed"] = True
                 logw("Robot %s: R=%.3f, s_stop=%.3f, rate=%.3f" % (str(vid), R_form, s_stop, BASE_SHIFT_RATE))
                 if s_stop <= 0.0:
                     logw("Robot %s: s_stop=0, no safe translation; holding position" % str(vid))
                 robot.set_led(255, 200, 0)
 
-            # Wait for synchronized start
+            # Wait for synchronized start (the dispatcher's shared instant when it sends one)
             if not started:
+                t0 = start_instant(sync, t_armed, warm is not None)
                 if robot.get_clock() < t0:
                     robot.set_vel(0, 0)
                     robot.delay(10)
                     continue
                 started = True
+                if t0 <= t_armed:
+                    blend_from = warm   # started without stopping: ramp from the old command
                 robot.set_led(0, 200, 0)
                 logw("Robot %s started" % str(vid))
+                try_send_host(robot, "clock_host", ("started %s %.4f" % (str(vid), robot.get_clock())).encode("utf-8"))
 
             # Compute center shift along -x
             s = max(0.0, (robot.get_clock() - t0) * BASE_SHIFT_RATE)
@@ -189,9 +175,15 @@ def usr(robot):
 
                 left  = clamp(int(MAX_WHEEL * 0.9 * (fwd - 0.8 * turn)), -MAX_WHEEL,  MAX_WHEEL)
                 right = clamp(int(MAX_WHEEL * 0.9 * (fwd + 0.8 * turn)), -MAX_WHEEL,  MAX_WHEEL)
-                robot.set_vel(left, right)
             else:
-                robot.set_vel(0, 0)
+                left = right = 0
+            left, right = warm_blend(blend_from, robot.get_clock() - t0, left, right)
+            robot.set_vel(left, right)
+
+            now = robot.get_clock()
+            if now - last_save >= WARM_SAVE_PERIOD:
+                save_warm(vid, mode, x, y, th, left, right)
+                last_save = now
 
             robot.delay(20)
 
@@ -206,13 +198,15 @@ def usr(robot):
     finally:
         final_time = robot.get_clock()
         if last_pose:
-            lx, ly = last_pose
+            lx, ly = last_pose[0], last_pose[1]
         else:
             lx = ly = float('nan')
         try:
             robot.set_vel(0, 0)
         except:
             pass
+        if last_pose:
+            save_warm(vid, mode, lx, ly, last_pose[2], 0, 0)   # stopped
         logw("Robot %s finished at [%.3f, %.3f] after %.1fs" % (str(vid), lx, ly, final_time - start_time))
         log_main.close()
 
@@ -1,8 +1,13 @@
 #!/usr/bin/python3.8
-import json, subprocess, time, os, sys
+import json, time, os, sys
 from datetime import datetime
 
-CONFIG_JSON = os.path.join(os.path.dirname(__file__), "swarm_config.json")
+from build_usr_code import BUILD_DIR, BuildError, build_all
+from cctl_client import SyncCctlClient
+from deploy_cache import DeployCache
+from dispatch_metrics import DispatchMetrics
+
+CONFIG_JSON = os.environ.get("SWARM_CONFIG", os.path.join(os.path.dirname(__file__), "swarm_config.json"))
 
 MODE_TO_FILE = {
     "float": "usr_code_filler.py",
@@ -15,12 +20,24 @@ MODE_TO_FILE = {
     "encircling": "usr_code_encircling.py",
 }
 
-ROBOTS = ["34", "35", "36"]
+ROBOTS = os.environ.get("ROBOTS", "34 35 36").split()
+LOG_DIR = os.environ.get("DISPATCH_LOGS", os.path.join(os.path.dirname(__file__), "dispatch_logs"))
+METRICS_SUMMARY = os.path.join(LOG_DIR, "metrics_summary_watch.txt")
+
+# per-command / per-robot latency histograms and error counts (Prometheus text)
+metrics = DispatchMetrics()
+# one in-process cctl session for the whole run (no `cctl` process per command)
+client = SyncCctlClient(metrics=metrics)
+# per-robot hash of the last deployed script; skips re-uploading what the robots hold
+cache = DeployCache()
+backlog = 0   # 1 while a mode is being applied (this watcher applies one at a time)
+metrics.gauge("transition_backlog", lambda: backlog, "mode transitions running")
+metrics.gauge("deploy_cache_total", lambda: {"hit": cache.hits, "miss": cache.misses},
+              "deploys skipped (hit) or uploaded (miss)", kind="counter", label="result")
 
-def sh(*args, timeout=None):
-    """Helper to run CLI commands and print timestamped logs."""
+def log_cmd(*args):
+    """Print a timestamped log line for a cctl command."""
     print(f"[{datetime.now().strftime('%H:%M:%S')}] +", " ".join(args))
-    subprocess.run(args, check=True, timeout=timeout)
 
 def read_json():
     """Safely read JSON, returning dict or empty."""
@@ -31,7 +48,7 @@ def read_json():
         return {}
 
 def apply_mode(mode):
-    script = MODE_TO_FILE.get(mode)
+    script = MODE_TO_FILE.get(mode) and os.path.join(BUILD_DIR, MODE_TO_FILE[mode])
     if not script or not os.path.isfile(script):
         print(f"[WARN] No script for mode '{mode}' or file missing.")
         return
@@ -39,16 +56,46 @@ def apply_mode(mode):
     abs_script = os.path.abspath(script)
     print(f"[{datetime.now().strftime('%H:%M:%S')}] Applying mode '{mode}' using {abs_script}")
 
-    # power on
-    sh("cctl", "on", *ROBOTS)
+    # power on (skipped for robots this session already turned on)
+    log_cmd("cctl", "on", *ROBOTS)
+    if not client.on(ROBOTS):
+        print("  (already on, skipped)")
 
-    # update code
-    sh("cctl", "update", abs_script, timeout=60)
+    # update code (skipped if every robot already holds this exact script)
+    if cache.check(ROBOTS, abs_script):
+        print(f"  (robots already hold {os.path.basename(abs_script)}, update skipped; {cache.summary()})")
+    else:
+        log_cmd("cctl", "update", abs_script)
+        try:
+            client.update(abs_script, timeout=60)
+        except Exception:
+            cache.invalidate(ROBOTS)
+            raise
+        cache.record(ROBOTS, abs_script)
 
     # start bots
-    sh("cctl", "start", *ROBOTS, timeout=30)
+    log_cmd("cctl", "start", *ROBOTS)
+    client.start(ROBOTS, timeout=30)
+
+def apply_timed(mode):
+    global backlog
+    backlog = 1
+    t0 = time.time()
+    outcome = "failed"
+    try:
+        apply_mode(mode)
+        outcome = "applied"
+    finally:
+        backlog = 0
+        metrics.observe_transition(outcome, time.time() - t0)
+        metrics.write()
 
 def main():
+    try:
+        build_all(quiet=True)   # robot programs → build/
+    except BuildError as e:
+        raise SystemExit(f"[ERROR] {e}")
+    metrics.serve()
     print(f"[watch] Watching {CONFIG_JSON} for mode changes...")
     last_mode, last_ts = None, None
 
@@ -58,10 +105,14 @@ def main():
 
         if mode and (mode != last_mode or ts != last_ts):
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Change detected: {last_mode} → {mode}")
-            apply_mode(mode)
+            apply_timed(mode)
             last_mode, last_ts = mode, ts
 
         time.sleep(1)  # poll once per second
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        client.close()
+        metrics.shutdown(METRICS_SUMMARY)
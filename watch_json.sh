@@ -7,18 +7,21 @@ SLEEP_SEC="${SLEEP_SEC:-1}"
 UPDATE_TIMEOUT="${UPDATE_TIMEOUT:-120s}"
 
 declare -A MODE_TO_FILE=(
-  ["float"]="usr_code_filler.py"
-  ["glide"]="usr_code_filler.py"
-  ["glitch"]="usr_code_glitch.py"
-  ["directional_left"]="usr_code_move_left.py"
-  ["directional_right"]="usr_code_move_right.py"
-  ["punch"]="usr_code_filler.py"
-  ["slash"]="usr_code_filler.py"
-  ["encircling"]="usr_code_encircling.py"
+  ["float"]="build/usr_code_filler.py"
+  ["glide"]="build/usr_code_filler.py"
+  ["glitch"]="build/usr_code_glitch.py"
+  ["directional_left"]="build/usr_code_move_left.py"
+  ["directional_right"]="build/usr_code_move_right.py"
+  ["punch"]="build/usr_code_filler.py"
+  ["slash"]="build/usr_code_filler.py"
+  ["encircling"]="build/usr_code_encircling.py"
 )
 
 ts(){ date +"%Y-%m-%d %H:%M:%S"; }
 
+# robot programs are uploaded from build/ (see build_usr_code.py)
+python3 build_usr_code.py >/dev/null || { echo "[$(ts)] [watch] ERROR: build_usr_code.py failed"; exit 1; }
+
 read_field() {
   local field="$1"
   python3 - "$JSON" <<PY 2>/dev/null || true
@@ -7,14 +7,14 @@ ROBOTS="${ROBOTS:-34 35 36}"
 SLEEP_SEC="${SLEEP_SEC:-1}"
 
 declare -A MODE_TO_FILE=(
-  ["float"]="usr_code_filler.py"
-  ["glide"]="usr_code_filler.py"
-  ["glitch"]="usr_code_glitch.py"
-  ["directional_left"]="usr_code_move_left.py"
-  ["directional_right"]="usr_code_move_right.py"
-  ["punch"]="usr_code_filler.py"
-  ["slash"]="usr_code_filler.py"
-  ["encircling"]="usr_code_encircling.py"
+  ["float"]="build/usr_code_filler.py"
+  ["glide"]="build/usr_code_filler.py"
+  ["glitch"]="build/usr_code_glitch.py"
+  ["directional_left"]="build/usr_code_move_left.py"
+  ["directional_right"]="build/usr_code_move_right.py"
+  ["punch"]="build/usr_code_filler.py"
+  ["slash"]="build/usr_code_filler.py"
+  ["encircling"]="build/usr_code_encircling.py"
 )
 
 CCTL_ARGS="${CCTL_ARGS:-}"
@@ -45,6 +45,9 @@ fi
 
 ts() { date +"%Y-%m-%d %H:%M:%S"; }
 
+# robot programs are uploaded from build/ (see build_usr_code.py)
+python3 build_usr_code.py >/dev/null || { echo "[$(ts)] [watch] ERROR: build_usr_code.py failed"; exit 1; }
+
 # ---- JSON readers using python (no jq needed) ----
 read_mode() {
   python3 - "$CONFIG_JSON" <<'PY' 2>/dev/null || true